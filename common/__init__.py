@@ -0,0 +1,5 @@
+"""
+Code shared by the calculi. Every calculus is run from its own directory,
+so its 'syntax' module puts the repository root on 'sys.path' before
+importing from here.
+"""
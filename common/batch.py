@@ -0,0 +1,98 @@
+"""
+Batch checking.
+
+'run' type checks and evaluates many files with a pool of worker
+processes, so a batch pays the interpreter startup and the parser
+construction once per worker instead of once per file. Every worker
+builds its parser when it starts and uses it for all the files it is
+given.
+
+The output of every file is collected in the worker and written in the
+order of the files, after a header with the file name and the time the
+file took. A file that fails is reported after the output it produced
+and does not stop the others.
+"""
+
+import concurrent.futures
+import contextlib
+import functools
+import glob
+import io
+import os
+import sys
+import time
+
+# the parser of the worker process
+_parser = None
+
+def _init_worker(make_parser):
+    global _parser
+    _parser = make_parser()
+
+def _check(process, filename):
+    out = io.StringIO()
+    error = None
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(out):
+            process(filename, _parser)
+    except Exception as e:
+        error = "%s: %s" % (type(e).__name__, e)
+    return (out.getvalue(), error, time.perf_counter() - start)
+
+def add_arguments(arg_parser):
+    """Command line options of the calculi for batch checking"""
+    arg_parser.add_argument(
+        "files", nargs="+", metavar="file",
+        help="Input file or glob pattern, '-' for the standard input")
+    arg_parser.add_argument(
+        "--jobs", type=int,
+        help="Check the files with this many worker processes, by "
+             "default one per CPU when there are several files")
+
+def expand(patterns):
+    """File names of 'patterns', each glob pattern expanded in sorted order"""
+    files = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            files.extend(sorted(glob.glob(pattern, recursive=True)))
+        else:
+            files.append(pattern)
+    return files
+
+def requested(args):
+    """Whether the options of 'add_arguments' ask for a batch"""
+    return (
+        args.jobs is not None or len(args.files) > 1
+        or glob.has_magic(args.files[0]))
+
+def run(process, patterns, make_parser, jobs=None, out=None):
+    """
+    Call 'process(filename, parser)' for the files of 'patterns' in
+    'jobs' worker processes, each with the parser built by 'make_parser'.
+    Returns the number of files that failed
+    """
+    out = sys.stdout if out is None else out
+    files = expand(patterns)
+    jobs = jobs or os.cpu_count() or 1
+    # a few chunks per worker: small files are not sent one by one, and
+    # the pool stays balanced when their sizes differ
+    chunksize = max(1, len(files) // (4 * jobs))
+    failed = 0
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker,
+            initargs=(make_parser,)) as executor:
+        results = executor.map(
+            functools.partial(_check, process), files, chunksize=chunksize)
+        for (filename, (output, error, elapsed)) in zip(files, results):
+            out.write("==> %s: %.1f ms\n" % (filename, elapsed * 1e3))
+            out.write(output)
+            if error is not None:
+                failed += 1
+                out.write("error: %s\n" % error)
+            out.flush()
+    print("%d files, %d failed, %.1f ms" % (
+        len(files), failed, (time.perf_counter() - start) * 1e3),
+        file=sys.stderr)
+    return failed
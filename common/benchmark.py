@@ -0,0 +1,162 @@
+"""
+Benchmark suite.
+
+Every calculus lists scalable workloads in its bench.py as 'WORKLOADS',
+a name mapped to a generator and the sizes it is run at by default. A
+generator takes a size, builds the input (parsing is not measured) and
+returns a function that runs the workload once and returns the number of
+steps it performed: reduction steps, or the unit the workload counts
+when it does not evaluate (constraints, typing rules).
+
+'run_suite' measures every workload at every size:
+
+  - 'seconds', the best of 'repeat' runs, and 'steps_per_second',
+  - 'nodes', the term and type nodes built, counted in a separate run
+    by wrapping the constructors of the syntax module (an interned type
+    counts every time it is asked for),
+  - 'peak_bytes', the peak of the memory allocated, from a separate run
+    under 'tracemalloc'.
+
+Results are kept as JSON with the commit they were measured at, and
+'report' shows them next to an earlier result file, so that regressions
+can be found between commits:
+
+    python bench.py suite --json after.json --compare before.json
+"""
+
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+def add_arguments(arg_parser):
+    """Command line options of the benchmark suite"""
+    arg_parser.add_argument(
+        "--json", metavar="FILE", help="Write the suite results to FILE")
+    arg_parser.add_argument(
+        "--compare", metavar="FILE",
+        help="Show the suite results next to the ones saved in FILE")
+
+def node_classes(syntax):
+    """Classes of the term and type nodes of a syntax module"""
+    return [
+        cls for (name, cls) in vars(syntax).items()
+        if name[:2] in ("Tm", "Ty") and isinstance(cls, type)
+        and issubclass(cls, tuple)]
+
+@contextmanager
+def counting(classes):
+    """Count the instances built of 'classes', yields the count as a list"""
+    count = [0]
+    originals = [(cls, cls.__dict__["__new__"]) for cls in classes]
+
+    def wrap(new):
+        def __new__(cls, *args, **kwargs):
+            count[0] += 1
+            return new(cls, *args, **kwargs)
+        return __new__
+
+    try:
+        for (cls, new) in originals:
+            cls.__new__ = wrap(new.__func__)
+        yield count
+    finally:
+        for (cls, new) in originals:
+            cls.__new__ = new
+
+def measure(classes, run, repeat):
+    """Measurements of one workload, see the module documentation"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        steps = run()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    with counting(classes) as count:
+        run()
+    tracemalloc.start()
+    try:
+        run()
+        (_, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "steps": steps,
+        "seconds": best,
+        "steps_per_second": steps / best if best else None,
+        "nodes": count[0],
+        "peak_bytes": peak,
+    }
+
+def commit():
+    """Commit of the working tree, None outside of a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(calculus, syntax, workloads, sizes=None, repeat=3):
+    """
+    Measure 'workloads' at their default sizes, or at 'sizes' when
+    given. Returns the results in the form saved as JSON
+    """
+    classes = node_classes(syntax)
+    results = []
+    for (name, (generator, default_sizes)) in workloads.items():
+        for size in sizes or default_sizes:
+            result = {"workload": name, "size": size}
+            result.update(measure(classes, generator(size), repeat))
+            results.append(result)
+    return {
+        "calculus": calculus,
+        "commit": commit(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+def save(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def report(results, baseline=None):
+    """
+    Print 'results', with the time ratio to the same workload and size
+    in 'baseline' when there is one
+    """
+    before = {}
+    if baseline is not None:
+        print("compared with %s" % baseline["commit"])
+        for result in baseline["results"]:
+            before[(result["workload"], result["size"])] = result
+    for result in results["results"]:
+        line = "%s %d: %d steps, %.2f ms, %.0f steps/s, %d nodes, %.1f KiB" % (
+            result["workload"], result["size"], result["steps"],
+            result["seconds"] * 1e3, result["steps_per_second"] or 0,
+            result["nodes"], result["peak_bytes"] / 1024)
+        old = before.get((result["workload"], result["size"]))
+        if old is not None and old["seconds"]:
+            line += " (%.2fx time, %+d nodes)" % (
+                result["seconds"] / old["seconds"],
+                result["nodes"] - old["nodes"])
+        print(line)
+
+def main(calculus, syntax, workloads, args):
+    """Run the suite as requested by the options of 'add_arguments'"""
+    results = run_suite(
+        calculus, syntax, workloads,
+        sizes=[args.size] if args.size else None,
+        repeat=args.number or 3)
+    baseline = load(args.compare) if args.compare else None
+    report(results, baseline)
+    if args.json:
+        save(results, args.json)
@@ -0,0 +1,242 @@
+"""
+Closure-conversion backend.
+
+A type-checked term is turned once into nested Python closures,
+one per node, each taking the runtime environment (a linked list of
+values built from (value, next) pairs) and returning a value. Constant
+values ('TmTrue', 'TmUnit', ...) are the nodes that produced them, records
+become 'Record' objects and abstractions become 'Function' objects, so
+running the program involves no visitor dispatch and no substitution.
+The resulting value is read back into a term for printing.
+
+A 'Compiler' is built over the syntax module of a calculus and the
+names of the nodes it compiles, those the substitution-based evaluator
+of the calculus evaluates: by default 'FORMS', at most 'ALL_FORMS'.
+Anything else raises 'NotCompilable' and 'Compiler.evaluate' falls back
+to the substitution-based evaluator. Types are never looked at.
+
+The environment of a program ends with a 'TopLevel', the values of the
+abbreviations of the context, which are compiled and run the first time
+the program reads them. Reading a variable of the context without a
+value raises 'NotCompilable' as well, and read back keeps the names of
+the variables of the context.
+"""
+
+# constant terms, their own values
+CONSTANTS = ("TmTrue", "TmFalse", "TmUnit", "TmString", "TmFloat", "TmZero")
+
+FORMS = (
+    "TmVar", "TmAbs", "TmApp", "TmIf", "TmRecord", "TmProj",
+    "TmTrue", "TmFalse")
+ALL_FORMS = FORMS + ("TmLet",) + CONSTANTS[2:]
+
+class NotCompilable(RuntimeError):
+    pass
+
+
+class Function:
+
+    __slots__ = ("term", "env", "body")
+
+    def __init__(self, term, env, body):
+        self.term = term
+        self.env = env
+        self.body = body
+
+    def __call__(self, arg):
+        return self.body((arg, self.env))
+
+
+class Record:
+
+    __slots__ = ("term", "values", "positions")
+
+    def __init__(self, term, values, positions):
+        self.term = term
+        # in the order of 'term.fields'
+        self.values = values
+        # label -> position in 'values', the index of 'term.fields'
+        self.positions = positions
+
+
+class TopLevel:
+    """Values of the abbreviations of 'ctx', by index"""
+
+    def __init__(self, compiler, ctx, prepare=None):
+        self.compiler = compiler
+        self.ctx = ctx
+        # applied to the term of an abbreviation before it is compiled
+        self.prepare = prepare
+        self.values = {}
+
+    def value(self, index):
+        try:
+            return self.values[index]
+        except KeyError:
+            pass
+        syntax = self.compiler.syntax
+        (_, binding) = syntax.get_ctx_item(self.ctx, index)
+        if type(binding).__name__ != "TmAbbBind":
+            raise NotCompilable("variable without a value", index)
+        # shifted into the context, so it runs in this top level too
+        term = syntax.getbinding(self.ctx, index).term
+        if self.prepare is not None:
+            term = self.prepare(term)
+        value = self.values[index] = self.compiler.compile(term)(self)
+        return value
+
+
+def compile_var(index):
+    if index == 0:
+        return lambda env: env[0]
+    elif index == 1:
+        return lambda env: env[1][0]
+
+    def var(env):
+        for _ in range(index):
+            env = env[1]
+        return env[0]
+    return var
+
+
+class Compiler:
+
+    def __init__(self, syntax, fallback, forms=FORMS):
+        self.syntax = syntax
+        self.fallback = fallback
+        self.forms = frozenset(forms)
+        self.constants = tuple(
+            getattr(syntax, name) for name in CONSTANTS if name in forms)
+
+    # ------------------------------------------------------------------
+    # Compilation
+
+    def compile(self, term, depth=0):
+        """Compile 'term' placed under 'depth' binders"""
+        name = term.__class__.__name__
+        if name not in self.forms:
+            raise NotCompilable(term)
+        method = getattr(self, 'compile_' + name)
+        return method(term, depth)
+
+    def compile_TmVar(self, term, depth):
+        if term.index >= depth:
+            index = term.index - depth
+
+            def toplevel(env):
+                for _ in range(depth):
+                    env = env[1]
+                return env.value(index)
+            return toplevel
+        return compile_var(term.index)
+
+    def compile_TmAbs(self, term, depth):
+        body = self.compile(term.term, depth + 1)
+        return lambda env: Function(term, env, body)
+
+    def compile_TmApp(self, term, depth):
+        left = self.compile(term.left, depth)
+        right = self.compile(term.right, depth)
+        return lambda env: left(env)(right(env))
+
+    def compile_TmLet(self, term, depth):
+        bound = self.compile(term.let_term, depth)
+        body = self.compile(term.in_term, depth + 1)
+        return lambda env: body((bound(env), env))
+
+    def compile_TmTrue(self, term, depth):
+        return lambda env: term
+
+    compile_TmFalse = compile_TmTrue
+    compile_TmUnit = compile_TmTrue
+    compile_TmString = compile_TmTrue
+    compile_TmFloat = compile_TmTrue
+    compile_TmZero = compile_TmTrue
+
+    def compile_TmIf(self, term, depth):
+        TmTrue = self.syntax.TmTrue
+        cond = self.compile(term.term_condition, depth)
+        then = self.compile(term.term_then, depth)
+        else_ = self.compile(term.term_else, depth)
+        return lambda env: \
+            then(env) if type(cond(env)) is TmTrue else else_(env)
+
+    def compile_TmRecord(self, term, depth):
+        # fields are stored right to left but evaluated left to right
+        fields = [self.compile(ti, depth) for _, ti in reversed(term.fields)]
+        positions = term.fields.slots
+
+        def record(env):
+            values = [ti(env) for ti in fields]
+            values.reverse()
+            return Record(term, values, positions)
+        return record
+
+    def compile_TmProj(self, term, depth):
+        record = self.compile(term.term, depth)
+        name = term.name
+        if isinstance(name, int):
+            return lambda env: record(env).values[-name]
+
+        def proj(env):
+            r = record(env)
+            return r.values[r.positions[name]]
+        return proj
+
+    # ------------------------------------------------------------------
+    # Read back
+
+    def readback(self, ctxlength, value):
+        """Term for a runtime value, valid in a context of 'ctxlength' names"""
+        syntax = self.syntax
+        ty_v = type(value)
+        if ty_v is Function:
+            return self.readback_closure(ctxlength, value.term, value.env)
+        elif ty_v is Record:
+            return syntax.TmRecord(value.term.info, value.term.fields.replace([
+                self.readback(ctxlength, vi) for vi in value.values]))
+        elif ty_v in self.constants:
+            return value
+        raise NotCompilable(value)
+
+    def shift(self, d, term):
+        """'termShift' that leaves the types in 'term' as they are"""
+        TmVar = self.syntax.TmVar
+        return self.syntax.tmmap(
+            lambda info, c, x, n:
+                TmVar(info, x+d, n+d) if x >= c else TmVar(info, x, n+d),
+            0, term)
+
+    def readback_closure(self, ctxlength, term, env):
+        syntax = self.syntax
+
+        def onvar(info, c, x, n):
+            if x < c:
+                return syntax.TmVar(info, x, ctxlength + c)
+            e = env
+            x -= c
+            while x and type(e) is tuple:
+                e = e[1]
+                x -= 1
+            if type(e) is not tuple:
+                # a variable of the context
+                return syntax.TmVar(info, x + c, ctxlength + c)
+            return self.shift(c, self.readback(ctxlength, e[0]))
+        return syntax.tmmap(onvar, 0, term)
+
+    # ------------------------------------------------------------------
+    # Evaluation
+
+    def run(self, ctx, term, prepare=None):
+        """
+        Value of 'term' in the top level of 'ctx' read back, 'prepare' is
+        applied to the terms of the abbreviations before they are compiled
+        """
+        code = self.compile(term)
+        return self.readback(len(ctx), code(TopLevel(self, ctx, prepare)))
+
+    def evaluate(self, ctx, term):
+        try:
+            return self.run(ctx, term)
+        except NotCompilable:
+            return self.fallback(ctx, term)
@@ -0,0 +1,115 @@
+"""
+Naming contexts.
+
+A context is a stack of (name, binding) pairs with the innermost binding
+last, so the de Bruijn index of a variable counts positions down from
+the top of the stack. 'Context' keeps the pairs in a list together with
+an index from every name to the positions it is bound at, innermost
+last. Pushing and popping a binding update the index in constant time,
+a shadowed binding becomes visible again as soon as the one hiding it is
+popped, and 'isnamebound', 'name2index' and 'freshname' look names up
+instead of scanning the context.
+
+Values derived from a binding, such as the expansion of a type
+abbreviation shifted to the current depth, can be memoized with 'memo'.
+The memo of a binding is dropped when the binding is popped, and a
+binding pushed at the same position starts with an empty one.
+
+For reading, a context behaves as the list of its pairs ('len',
+positional indexing, iteration), so code written against plain lists
+keeps working with it.
+"""
+
+class Context:
+
+    __slots__ = ("_bindings", "_positions", "_memos")
+
+    def __init__(self, bindings=()):
+        self._bindings = []
+        self._positions = {}
+        self._memos = []
+        for binding in bindings:
+            self.append(binding)
+
+    def __len__(self):
+        return len(self._bindings)
+
+    def __getitem__(self, position):
+        return self._bindings[position]
+
+    def __iter__(self):
+        return iter(self._bindings)
+
+    def __reversed__(self):
+        return reversed(self._bindings)
+
+    def __repr__(self):
+        return "Context(%r)" % (self._bindings,)
+
+    def append(self, binding):
+        """Push a (name, binding) pair"""
+        name = binding[0]
+        positions = self._positions.get(name)
+        if positions is None:
+            self._positions[name] = [len(self._bindings)]
+        else:
+            positions.append(len(self._bindings))
+        self._bindings.append(binding)
+        self._memos.append(None)
+
+    def pop(self):
+        """Remove and return the innermost (name, binding) pair"""
+        binding = self._bindings.pop()
+        self._memos.pop()
+        positions = self._positions[binding[0]]
+        positions.pop()
+        if not positions:
+            del self._positions[binding[0]]
+        return binding
+
+    def copy(self):
+        return Context(self._bindings)
+
+    def isnamebound(self, name):
+        return name in self._positions
+
+    def name2index(self, name):
+        """de Bruijn index of the innermost binding of 'name'"""
+        try:
+            position = self._positions[name][-1]
+        except KeyError:
+            raise ValueError("Identifier '%s' is unbound" % name) from None
+        return len(self._bindings) - position - 1
+
+    def index2name(self, index):
+        return self._bindings[-1 - index][0]
+
+    def memo(self, index):
+        """Dict of values memoized for the binding at de Bruijn 'index'"""
+        memo = self._memos[-1 - index]
+        if memo is None:
+            memo = self._memos[-1 - index] = {}
+        return memo
+
+    def freshname(self, name):
+        """'name' primed until it is not bound in the context"""
+        new_name = str(name)
+        while new_name in self._positions:
+            new_name += "'"
+        return new_name
+
+
+def binding_memo(ctx, index):
+    """
+    The memo of the binding at 'index' in 'ctx', a fresh dict when 'ctx'
+    is a plain list
+    """
+    if isinstance(ctx, Context):
+        return ctx.memo(index)
+    return {}
+
+def as_context(ctx):
+    """'ctx' itself if it is a 'Context', else a 'Context' of its pairs"""
+    if isinstance(ctx, Context):
+        return ctx
+    return Context(ctx)
@@ -0,0 +1,110 @@
+"""
+Type erasure.
+
+Evaluation never looks at types, yet the substitution-based evaluators
+carry them along: every shift rebuilds the annotations and a type
+application maps the type over the whole body. Once a term is type
+checked its types can be dropped instead. 'Erasure.erase' turns it into
+an untyped term of the same syntax:
+
+  - abstractions lose their annotation ('TmAbs.type' is None),
+  - ascriptions and packages are replaced by the term they hold,
+  - a type abstraction becomes an abstraction of a 'unit' argument and
+    a type application the application to 'unit', so no binder goes
+    away and the de Bruijn indices stay as they are,
+  - an unpacking becomes the application of an abstraction over the
+    type and the term variable to 'unit' and the package.
+
+The untyped term is run by the closure compiler ('common.compiler'), so
+the running time does not depend on the size of the annotations. The
+result is an untyped term too, its abstractions are printed without a
+type. The abbreviations of the context the term refers to are erased
+and compiled as well. A term that can not be erased or compiled is
+evaluated as it is by the fallback evaluator.
+"""
+
+from common.compiler import NotCompilable
+
+class NotErasable(RuntimeError):
+    pass
+
+
+class Erasure:
+
+    def __init__(self, syntax, compiler):
+        self.syntax = syntax
+        self.compiler = compiler
+
+    def erase(self, term):
+        method = getattr(self, 'erase_' + term.__class__.__name__, None)
+        if method is None:
+            raise NotErasable(term)
+        return method(term)
+
+    def erase_TmVar(self, term):
+        return term
+
+    erase_TmTrue = erase_TmVar
+    erase_TmFalse = erase_TmVar
+    erase_TmUnit = erase_TmVar
+    erase_TmString = erase_TmVar
+    erase_TmFloat = erase_TmVar
+    erase_TmZero = erase_TmVar
+
+    def erase_TmAbs(self, term):
+        return term._replace(type=None, term=self.erase(term.term))
+
+    def erase_TmApp(self, term):
+        return term._replace(
+            left=self.erase(term.left), right=self.erase(term.right))
+
+    def erase_TmLet(self, term):
+        return term._replace(
+            let_term=self.erase(term.let_term),
+            in_term=self.erase(term.in_term))
+
+    def erase_TmIf(self, term):
+        return term._replace(
+            term_condition=self.erase(term.term_condition),
+            term_then=self.erase(term.term_then),
+            term_else=self.erase(term.term_else))
+
+    def erase_TmRecord(self, term):
+        return term._replace(fields=term.fields.map(self.erase))
+
+    def erase_TmProj(self, term):
+        return term._replace(term=self.erase(term.term))
+
+    def erase_TmAscribe(self, term):
+        return self.erase(term.term)
+
+    erase_TmPack = erase_TmAscribe
+
+    def erase_TmTAbs(self, term):
+        return self.syntax.TmAbs(
+            term.info, term.name, None, self.erase(term.term))
+
+    def erase_TmTApp(self, term):
+        return self.syntax.TmApp(
+            term.info, self.erase(term.term), self.syntax.TmUnit(term.info))
+
+    def erase_TmUnpack(self, term):
+        syntax = self.syntax
+        info = term.info
+        body = syntax.TmAbs(
+            info, term.ty_name, None,
+            syntax.TmAbs(info, term.var_name, None, self.erase(term.in_term)))
+        return syntax.TmApp(
+            info,
+            syntax.TmApp(info, body, syntax.TmUnit(info)),
+            self.erase(term.let_term))
+
+    def evaluate(self, ctx, term, fallback):
+        """
+        Evaluate the erased 'term', or 'term' itself with 'fallback'
+        when it can not be erased or compiled
+        """
+        try:
+            return self.compiler.run(ctx, self.erase(term), self.erase)
+        except (NotErasable, NotCompilable):
+            return fallback(ctx, term)
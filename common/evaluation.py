@@ -0,0 +1,26 @@
+from collections import namedtuple
+
+class NoRuleApplies(RuntimeError):
+    pass
+
+# Result of a bounded evaluation: the reached term, the number of
+# reduction steps performed and whether evaluation stopped on its own
+# (normal form or stop condition) rather than by exhausting the budget
+Evaluation = namedtuple("Evaluation", ["term", "steps", "done"])
+
+def run(step, term, stop, max_steps=None):
+    """
+    Iterative small-step driver: applies 'step' in a loop until
+    'stop(term)' holds, 'step' raises 'NoRuleApplies' or 'max_steps'
+    is exhausted
+    """
+    steps = 0
+    while not stop(term):
+        if max_steps is not None and steps >= max_steps:
+            return Evaluation(term, steps, False)
+        try:
+            term = step(term)
+        except NoRuleApplies:
+            break
+        steps += 1
+    return Evaluation(term, steps, True)
@@ -0,0 +1,48 @@
+"""
+Hash-consed AST nodes.
+
+'internedtuple' is a drop-in replacement for 'namedtuple': constructing a
+node that is equal to one built before returns the existing instance, so
+there is a single shared object per structural value and such nodes can
+be compared with 'is'. Children are keyed by identity when they are
+interned themselves, which also keeps apart nodes that plain tuple
+equality would confuse (e.g. 'TyBool()' and 'TyNat()' are both '()').
+
+Instances are kept alive by the table for the lifetime of the process,
+so this is meant for small, heavily repeated nodes such as types. Nodes
+with an unhashable field are not shared. Containers of nodes, such as
+the fields of records ('common.record'), compare their elements with
+'identity_key' to be shared too.
+"""
+
+from collections import namedtuple
+
+_interned = set()
+
+def identity_key(values):
+    """'values' with the interned nodes replaced by their identities"""
+    return tuple(id(x) if type(x) in _interned else x for x in values)
+
+def internedtuple(typename, field_names):
+    base = namedtuple(typename, field_names)
+    table = {}
+
+    def __new__(cls, *args, **kwargs):
+        node = base.__new__(cls, *args, **kwargs)
+        key = identity_key(node)
+        try:
+            return table.setdefault(key, node)
+        except TypeError:
+            return node
+
+    @classmethod
+    def _make(cls, iterable):
+        return cls(*iterable)
+
+    cls = type(typename, (base,), {
+        "__slots__": (),
+        "__new__": __new__,
+        "_make": _make,
+    })
+    _interned.add(cls)
+    return cls
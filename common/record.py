@@ -0,0 +1,123 @@
+"""
+Record fields indexed by label.
+
+The parsers build the fields of a record, and of a record type, as a
+list of (label, value) pairs stored right to left, so finding a label
+meant scanning the list. 'Fields' keeps the same pairs in an immutable
+tuple together with 'slots', a read-only mapping from every label to
+the position of its field. A label that appears twice maps to the
+leftmost field, the one a projection picks.
+
+Indexes are shared: all the fields with the same labels in the same
+order use one index, built the first time these labels are seen. A
+record and its type, or a record and the records evaluation makes from
+it, have the same labels, so they share the index with the record that
+was parsed. Comparing the indexes with 'is' tells whether two records
+have the same labels in the same order.
+
+Fields compare and hash interned values by identity, as
+'common.intern' does, so record types are interned like the other
+types.
+
+Evaluation never changes fields in place: 'step' returns new fields
+that share the index and the (label, value) pairs of every field but
+the one evaluated. They also remember how many fields on the left are
+values already, so the next step starts after them and evaluating a
+whole record looks at every field once. 'allvalues' keeps the count up
+to date too, so whether a record is a value is found once as well.
+"""
+
+from types import MappingProxyType
+
+from common.intern import identity_key
+
+# labels, right to left -> index
+_indexes = {}
+
+def index(labels):
+    """The shared read-only index of 'labels', stored right to left"""
+    labels = tuple(labels)
+    slots = _indexes.get(labels)
+    if slots is None:
+        positions = {}
+        # later positions are further to the left in the source
+        for (num, label) in enumerate(labels):
+            positions[label] = num
+        slots = _indexes.setdefault(labels, MappingProxyType(positions))
+    return slots
+
+
+class Fields(tuple):
+    """(label, value) pairs of a record, stored right to left"""
+
+    def __new__(cls, fields=(), slots=None):
+        self = tuple.__new__(cls, fields)
+        if slots is None:
+            slots = index(label for (label, _) in self)
+        self.slots = slots
+        self._key = None
+        # the number of fields on the left known to be values
+        self.values = 0
+        return self
+
+    def key(self):
+        """The labels and the values, interned ones by identity"""
+        if self._key is None:
+            self._key = tuple(identity_key(field) for field in self)
+        return self._key
+
+    def __eq__(self, other):
+        if type(other) is not Fields:
+            return NotImplemented
+        return self is other or self.key() == other.key()
+
+    def __ne__(self, other):
+        if type(other) is not Fields:
+            return NotImplemented
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __reduce__(self):
+        # the index is rebuilt, or found, where the fields are loaded
+        return (Fields, (tuple(self),))
+
+    def get(self, label, default=None):
+        """Value of the field 'label', 'default' when there is none"""
+        slot = self.slots.get(label)
+        if slot is None:
+            return default
+        return self[slot][1]
+
+    def map(self, function):
+        """Fields with the same labels and 'function' applied to the values"""
+        return Fields([(li, function(vi)) for (li, vi) in self], self.slots)
+
+    def replace(self, values):
+        """Fields with the same labels and the values 'values'"""
+        return Fields(
+            [(li, vi) for ((li, _), vi) in zip(self, values)], self.slots)
+
+    def allvalues(self, isval):
+        """Whether 'isval' holds for all the fields"""
+        for slot in range(len(self) - 1 - self.values, -1, -1):
+            if not isval(self[slot][1]):
+                return False
+            self.values += 1
+        return True
+
+    def step(self, isval, step):
+        """
+        Fields with 'step' applied to the leftmost field for which
+        'isval' does not hold, None when all the fields are values
+        """
+        for slot in range(len(self) - 1 - self.values, -1, -1):
+            (li, ti) = self[slot]
+            if not isval(ti):
+                fields = list(self)
+                fields[slot] = (li, step(ti))
+                fields = Fields(fields, self.slots)
+                fields.values = len(self) - 1 - slot
+                return fields
+        return None
@@ -0,0 +1,79 @@
+"""
+Streaming input.
+
+'parse_stream' reads a program line by line and parses each
+';'-terminated command as soon as it is complete, so a script is
+processed with memory bounded by its largest command and every result
+can be printed before the rest of the input is read.
+
+Commands are split on ';' outside comments ('/* */' and '//') and
+string literals. All other text, including newlines, is passed through,
+so the line numbers tracked by the lexer stay the same as when the whole
+file is parsed at once.
+"""
+
+import sys
+from contextlib import contextmanager
+
+from common.context import Context
+
+def split_commands(lines):
+    """Texts of the ';'-terminated commands read from 'lines'"""
+    chunk = []
+    pending = False     # whether 'chunk' holds more than blanks/comments
+    in_comment = False
+    for line in lines:
+        start = 0
+        pos = 0
+        end = len(line)
+        while pos < end:
+            if in_comment:
+                close = line.find("*/", pos)
+                if close < 0:
+                    pos = end
+                else:
+                    in_comment = False
+                    pos = close + 2
+                continue
+            ch = line[pos]
+            if ch == ";":
+                chunk.append(line[start:pos + 1])
+                yield "".join(chunk)
+                chunk = []
+                pending = False
+                start = pos = pos + 1
+            elif line.startswith("/*", pos):
+                in_comment = True
+                pos += 2
+            elif line.startswith("//", pos):
+                pos = end
+            elif ch == '"':
+                close = line.find('"', pos + 1)
+                pending = True
+                pos = end if close < 0 else close + 1
+            else:
+                if not ch.isspace():
+                    pending = True
+                pos += 1
+        chunk.append(line[start:])
+    if pending:
+        # unterminated command, left to the parser to report
+        yield "".join(chunk)
+
+def parse_stream(parser, lines, filename=""):
+    """Commands of 'lines' parsed one at a time by a calculus' 'Parser'"""
+    ctx = Context()
+    # a parser may be reused for several inputs, each one starts at line 1
+    parser.lexer.lexer.lineno = 1
+    for text in split_commands(lines):
+        for cmd in parser.parse(text, filename, ctx) or []:
+            yield cmd
+
+@contextmanager
+def open_input(filename):
+    """Lines of 'filename', or of the standard input for '-'"""
+    if filename == "-":
+        yield sys.stdin
+    else:
+        with open(filename, 'r') as f:
+            yield f
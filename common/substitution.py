@@ -0,0 +1,19 @@
+def substtop_onvar(mkvar, termShift, s):
+    """
+    Variable case of the single pass equivalent of
+    termShift(-1, termSubst(0, termShift(1, s), t)), for use with a
+    calculus' term map. Copies of 's' shifted by the same cutoff are
+    shared between occurrences, and at cutoff 0 's' itself is used
+    """
+    shifted = {0: s}
+
+    def onvar(info, c, x, n):
+        if x == c:
+            s_c = shifted.get(c)
+            if s_c is None:
+                s_c = shifted[c] = termShift(c, s)
+            return s_c
+        elif x > c:
+            return mkvar(info, x-1, n-1)
+        return mkvar(info, x, n-1)
+    return onvar
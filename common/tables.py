@@ -0,0 +1,106 @@
+"""
+Cached PLY tables.
+
+By default every calculus lets PLY write 'lextab'/'parsetab' next to its
+sources and checks the signature of the grammar against them when a
+parser is built. In optimize mode the tables are instead kept in a cache
+directory under names keyed on a hash of the grammar, i.e. the token
+rules and the productions. A change of the grammar therefore picks new
+names, and PLY can load existing tables without any validation or
+signature check:
+
+    lextab_<calculus>_<hash>.py           lexer tables (a module)
+    parsetab_<calculus>_<hash>.pickle     LALR tables
+
+The cache directory is '.cache/ply' in the repository or the value of
+the TAPL_PLY_CACHE environment variable.
+"""
+
+import hashlib
+import inspect
+import os
+import sys
+import time
+
+import ply
+
+def cache_dir():
+    path = os.environ.get("TAPL_PLY_CACHE")
+    if path is None:
+        path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            os.pardir, ".cache", "ply")
+    os.makedirs(path, exist_ok=True)
+    if path not in sys.path:
+        # lexer tables are loaded with 'import'
+        sys.path.append(path)
+    return path
+
+def _rules(obj, prefix):
+    """(line, name, rule) for the PLY rules of 'obj', in source order"""
+    rules = []
+    for name in dir(obj):
+        if not name.startswith(prefix):
+            continue
+        value = getattr(obj, name)
+        if callable(value):
+            line = value.__code__.co_firstlineno
+            rules.append((line, name, value.__doc__))
+        else:
+            rules.append((0, name, repr(value)))
+    rules.sort()
+    return rules
+
+def grammar_hash(parser_cls, lexer_cls):
+    """Hash of everything the lexer and parser tables are built from"""
+    parts = [
+        ply.__version__,
+        repr(lexer_cls.tokens),
+        repr(getattr(lexer_cls, "_unescape_tokens", ())),
+        repr(getattr(lexer_cls, "_tokens", ())),
+        repr(getattr(lexer_cls, "reserved", {})),
+        repr(_rules(lexer_cls, "t_")),
+        repr(getattr(parser_cls, "precedence", ())),
+        repr(getattr(parser_cls, "start", None)),
+        repr(_rules(parser_cls, "p_")),
+    ]
+    digest = hashlib.sha1("\n".join(parts).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+def options(parser_cls, lexer_cls):
+    """
+    Keyword arguments for 'lex.lex' and 'yacc.yacc' that load the tables
+    of a calculus from the cache, building them there on first use
+    """
+    path = cache_dir()
+    name = os.path.basename(os.path.dirname(inspect.getfile(parser_cls)))
+    key = "%s_%s" % (name, grammar_hash(parser_cls, lexer_cls))
+    lex_options = {
+        "optimize": True,
+        "lextab": "lextab_" + key,
+        "outputdir": path,
+    }
+    yacc_options = {
+        "optimize": True,
+        "picklefile": os.path.join(path, "parsetab_%s.pickle" % key),
+        "outputdir": path,
+    }
+    return lex_options, yacc_options
+
+def add_arguments(arg_parser):
+    """Command line options of the calculi for table caching"""
+    arg_parser.add_argument(
+        "--optimize", action="store_true",
+        help="Load parser tables from the cache without validating them")
+    arg_parser.add_argument(
+        "--startup-time", action="store_true",
+        help="Report the time spent building the parser on stderr")
+
+def make_parser(parser_cls, args):
+    """Build 'parser_cls' as requested by the options of 'add_arguments'"""
+    start = time.perf_counter()
+    parser = parser_cls(optimize=args.optimize)
+    if args.startup_time:
+        print("startup: %.1f ms" % ((time.perf_counter() - start) * 1e3),
+              file=sys.stderr)
+    return parser
@@ -0,0 +1,132 @@
+"""
+Visitors with precomputed dispatch.
+
+A visitor calls 'visit_<Class>' for a node of class '<Class>' and falls
+back to 'visit__' when there is no such method. The method is looked up
+by name only the first time a visitor class meets a node class. After
+that it comes from a per-class table keyed on the node class, so no
+strings are built and no attributes are probed on the hot path.
+
+'Visitor' is used through the class: methods take the node in place of
+'self'. 'InstanceVisitor' is used through an instance that carries state
+(e.g. a context) and its methods take 'self' and the node.
+'PairVisitor' dispatches on the classes of two nodes and honours the
+guards attached with '@when'.
+"""
+
+def when(guard):
+
+    def when_decorator(func):
+        func.guard = guard
+        return func
+
+    return when_decorator
+
+
+class Visitor:
+
+    default_method = 'visit__'
+    _dispatch = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = {}
+
+    @classmethod
+    def visit(cls, term, *args, **kwargs):
+        try:
+            method = cls._dispatch[term.__class__]
+        except KeyError:
+            method = cls._resolve(term.__class__)
+        return method(term, *args, **kwargs)
+
+    @classmethod
+    def _resolve(cls, node_cls):
+        method_name = 'visit_' + node_cls.__name__
+        method = getattr(cls, method_name, None)
+        if method is None:
+            method = getattr(cls, cls.default_method, None)
+        if method is None:
+            raise AttributeError(
+                "type object '%s' has no attribute '%s'" %
+                (cls.__name__, method_name))
+        cls._dispatch[node_cls] = method
+        return method
+
+
+class InstanceVisitor:
+
+    default_method = 'visit__'
+    _dispatch = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = {}
+
+    def visit(self, term, *args, **kwargs):
+        try:
+            method = self._dispatch[term.__class__]
+        except KeyError:
+            method = self._resolve(term)
+        return method(self, term, *args, **kwargs)
+
+    def _resolve(self, term):
+        cls = type(self)
+        method = getattr(cls, 'visit_' + type(term).__name__, None)
+        if method is None:
+            method = getattr(cls, cls.default_method, None)
+        if method is None:
+            raise AttributeError(
+                "Object '%s' has no suitable attribute for '%s'" %
+                (cls.__name__, term))
+        cls._dispatch[term.__class__] = method
+        return method
+
+
+class PairVisitor:
+
+    _dispatch = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = {}
+
+    def visit(self, term1, term2, *args, **kwargs):
+        key = (term1.__class__, term2.__class__)
+        try:
+            candidates = self._dispatch[key]
+        except KeyError:
+            candidates = self._resolve(key)
+
+        for (method, guard) in candidates:
+            if guard is None or guard(self, term1, term2):
+                return method(self, term1, term2, *args, **kwargs)
+
+        raise AttributeError(
+            "Object '%s' has no suitable attribute for '%s', '%s'" %
+            (type(self).__name__, term1, term2))
+
+    @classmethod
+    def _resolve(cls, key):
+        """
+        Methods that may handle the pair, most specific first. Lookup
+        stops after the first one without a guard
+        """
+        (name1, name2) = (key[0].__name__, key[1].__name__)
+        props = [
+            "visit_%s_%s" % (name1, name2),
+            "visit_%s__" % name1,
+            "visit__%s" % name2,
+            "visit__"]
+
+        candidates = []
+        for method_name in props:
+            method = getattr(cls, method_name, None)
+            if method is None:
+                continue
+            guard = getattr(method, "guard", None)
+            candidates.append((method, guard))
+            if guard is None:
+                break
+        cls._dispatch[key] = candidates
+        return candidates
@@ -0,0 +1,268 @@
+"""
+Micro-benchmarks for fullpoly.
+
+    python bench.py dispatch
+    python bench.py abbrev
+    python bench.py tapp --size 50
+    python bench.py suite --json results.json
+"""
+
+import argparse
+import sys
+import timeit
+
+from parser import Parser
+from syntax import *
+import syntax
+import core
+import explicit
+import erasure
+from common import benchmark
+from common.record import Fields
+
+# Dispatch as done before per-class tables: the method name is built and
+# looked up on every call
+
+class LegacyVisitor:
+
+    def visit(self, term, *args, **kwargs):
+        method_name = 'visit_' + type(term).__name__
+        method = getattr(
+            self, method_name,
+            getattr(self, 'visit__', None))
+        return method(term, *args, **kwargs)
+
+class LegacyPairVisitor:
+
+    def visit(self, term1, term2, *args, **kwargs):
+        props = [
+            "visit_%s_%s" % (
+                type(term1).__name__,
+                type(term2).__name__),
+            "visit_%s__" % type(term1).__name__,
+            "visit__%s" % type(term2).__name__,
+            "visit__"]
+
+        for method_name in props:
+            method = getattr(self, method_name, None)
+            if method is not None:
+                if hasattr(method, "guard"):
+                    if method.guard(self, term1, term2):
+                        return method(term1, term2, *args, **kwargs)
+                else:
+                    return method(term1, term2, *args, **kwargs)
+
+class LegacyTypeMap(LegacyVisitor, TypeMap):
+    pass
+
+class LegacyTypeEqVisitor(LegacyPairVisitor, core.TypeEqVisitor):
+    pass
+
+def arrows(depth):
+    """Type of 'depth' nested arrows over type variables and base types"""
+    tyT = TyVar(0, 2)
+    for num in range(depth):
+        left = (TyNat(), TyBool(), TyVar(1, 2), TyId("X"))[num % 4]
+        tyT = TyArr(left, tyT)
+    return tyT
+
+def count_nodes(tyT):
+    if type(tyT) is TyArr:
+        return 1 + count_nodes(tyT.left) + count_nodes(tyT.right)
+    return 1
+
+def bench_dispatch(depth, number):
+    """
+    Time per visited node of a type shift ('TypeMap', one dispatch per
+    node) and per call of the pair visitor behind 'tyeqv', with dispatch
+    by name on every call and with the per-class tables
+    """
+    ctx = []
+    addbinding(ctx, "A", TyVarBind())
+    addbinding(ctx, "B", TyVarBind())
+    tyT = arrows(depth)
+    nodes = count_nodes(tyT)
+    onvar = lambda c, x, n: TyVar(x+1, n+1) if x >= c else TyVar(x, n+1)
+
+    # pairs of different types reaching every kind of method: exact
+    # match, guarded match with a false guard, and the default
+    pairs = [
+        (TyId("X"), TyId("Y")),
+        (TyVar(0, 2), TyVar(1, 2)),
+        (TyVar(0, 2), TyNat()),
+        (TyNat(), TyVar(0, 2)),
+        (TyNat(), TyBool()),
+    ] * (depth // 5)
+
+    def run_map(cls):
+        return cls(cutoff=0, onvar=onvar).visit(tyT)
+
+    def run_pairs(cls):
+        visitor = cls()
+        visitor.ctx = ctx
+        for tyS, tyU in pairs:
+            visitor.visit(tyS, tyU)
+
+    print("type size: %d nodes, pairs: %d" % (nodes, len(pairs)))
+    for (name, visit_cls, pair_cls) in (
+            ("getattr", LegacyTypeMap, LegacyTypeEqVisitor),
+            ("table", TypeMap, core.TypeEqVisitor)):
+        time_map = timeit.timeit(lambda: run_map(visit_cls), number=number)
+        time_pairs = timeit.timeit(
+            lambda: run_pairs(pair_cls), number=number)
+        print("%s: %.0f ns per visited node, %.0f ns per pair" % (
+            name,
+            time_map / number / nodes * 1e9,
+            time_pairs / number / len(pairs) * 1e9))
+
+def legacy_simplifyty(ctx, tyT):
+    """'simplifyty' without the memo: every expansion shifts the definition"""
+    while type(tyT) is TyVar:
+        (_, binding) = get_ctx_item(ctx, tyT.index)
+        if type(binding) is not TyAbbBind:
+            break
+        tyT = bindingshift(tyT.index + 1, binding).type
+    return tyT
+
+def bench_abbrev(fields, number):
+    """
+    Time per expansion of an abbreviation of a record with 'fields'
+    fields and per comparison of two references to it, with the
+    definition shifted on every expansion and with the memo
+    """
+    ctx = Context()
+    addbinding(ctx, "R", TyAbbBind(TyRecord(Fields([
+        ("l%d" % num, (TyNat(), TyBool())[num % 2])
+        for num in range(fields)]))))
+    for num in range(10):
+        addbinding(ctx, "x%d" % num, VarBind(TyVar(num, num + 1)))
+    tyR = TyVar(10, 11)
+
+    def run_tyeqv(simplifyty):
+        tyS = simplifyty(ctx, tyR)
+        tyT = simplifyty(ctx, tyR)
+        return tyS is tyT or core.tyeqv(ctx, tyS, tyT)
+
+    print("fields: %d" % fields)
+    for (name, simplifyty) in (
+            ("shift", legacy_simplifyty), ("memo", core.simplifyty)):
+        time_simplify = timeit.timeit(
+            lambda: simplifyty(ctx, tyR), number=number)
+        time_tyeqv = timeit.timeit(
+            lambda: run_tyeqv(simplifyty), number=number)
+        print("%s: %.1f us per expansion, %.1f us per comparison" % (
+            name, time_simplify / number * 1e6, time_tyeqv / number * 1e6))
+
+def type_applications(count):
+    """
+    Source of 'count' type abstractions around a function whose argument
+    type mentions every type variable, applied to 'count' types
+    """
+    names = ["X%d" % num for num in range(count)]
+    return "(%s lambda x:{%s}. x) %s;" % (
+        " ".join("lambda %s." % name for name in names),
+        ", ".join("l%s:%s" % (name, name) for name in names),
+        " ".join("[Nat]" for name in names))
+
+def bench_tapp(count, number):
+    """
+    Evaluation time of 'count' type applications of a polymorphic
+    function, with eager substitution, with explicit substitutions and
+    after type erasure
+    """
+    term = Parser().parse(type_applications(count))[0].term
+    ctx = Context()
+    expected = format_term(ctx, core.evaluate(ctx, term))
+    assert format_term(ctx, explicit.evaluate(ctx, term)) == expected
+    print("type applications: %d" % count)
+    erased = lambda ctx, term: erasure.evaluate(ctx, term, core.evaluate)
+    for (name, evaluate) in (
+            ("subst", core.evaluate), ("explicit", explicit.evaluate),
+            ("erase", erased)):
+        elapsed = timeit.timeit(lambda: evaluate(ctx, term), number=number)
+        print("%s: %.1f us per evaluation" % (name, elapsed / number * 1e6))
+
+def packages(depth):
+    """
+    Source of 'depth' packages nested in one another, each one hiding
+    the type of the next, opened by as many nested unpackings
+    """
+    (term, tyT) = ("0", "Nat")
+    for num in range(depth):
+        term = "{*Nat, %s} as {Some X%d, %s}" % (term, num, tyT)
+        tyT = "{Some X%d, %s}" % (num, tyT)
+    source = []
+    for num in range(depth):
+        source.append("let {X%d,x%d} = %s in" % (num, num, term))
+        term = "x%d" % num
+    source.append(term + ";")
+    return " ".join(source)
+
+def checked_tapp(count):
+    """Workload type checking and evaluating 'type_applications'"""
+    term = Parser().parse(type_applications(count))[0].term
+    ctx = Context()
+
+    def run():
+        core.typeof(ctx, term)
+        return core.evaluate_steps(ctx, term).steps
+    return run
+
+def checked_packages(depth):
+    """
+    Workload type checking 'packages', counting the packages: 'core'
+    does not substitute into a package, so they are not evaluated
+    """
+    term = Parser().parse(packages(depth))[0].term
+    ctx = Context()
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * depth + 100))
+
+    def run():
+        core.typeof(ctx, term)
+        return depth
+    return run
+
+def numeral_applications(depth):
+    """
+    Source of 'depth' nested applications of the identity on 'Nat' to a
+    numeral as large as 'depth', a value tested at every step
+    """
+    return "(lambda f:Nat->Nat. %s%d%s) (lambda x:Nat. x);" % (
+        "f (" * depth, depth, ")" * depth)
+
+def checked_numerals(depth):
+    """Workload type checking and evaluating 'numeral_applications'"""
+    term = Parser().parse(numeral_applications(depth))[0].term
+    ctx = Context()
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * depth + 100))
+
+    def run():
+        core.typeof(ctx, term)
+        return core.evaluate_steps(ctx, term).steps
+    return run
+
+WORKLOADS = {
+    "all": (checked_tapp, (10, 20, 40)),
+    "some": (checked_packages, (10, 20, 40)),
+    "nat": (checked_numerals, (50, 100, 200)),
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "benchmark", choices=["dispatch", "abbrev", "tapp", "suite"])
+    arg_parser.add_argument("--size", type=int)
+    arg_parser.add_argument("--number", type=int)
+    benchmark.add_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    if args.benchmark == "dispatch":
+        bench_dispatch(args.size or 200, args.number or 200)
+    elif args.benchmark == "abbrev":
+        bench_abbrev(args.size or 200, args.number or 200)
+    elif args.benchmark == "tapp":
+        bench_tapp(args.size or 50, args.number or 20)
+    elif args.benchmark == "suite":
+        benchmark.main("fullpoly", syntax, WORKLOADS, args)
+
+if __name__ == '__main__':
+    main()
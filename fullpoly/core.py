@@ -1,34 +1,37 @@
 from syntax import *
 # ------------------------   EVALUATION  ------------------------
 
-class NoRuleApplies(RuntimeError):
-    pass
+from common.evaluation import NoRuleApplies, run
+
+# terms that are values whatever they hold
+VALUES = frozenset([
+    TmString,
+    TmUnit,
+    TmTrue,
+    TmFalse,
+    TmFloat,
+    TmZero,
+    TmAbs,
+    TmTAbs])
 
 def isnumericval(term):
     ty_term = type(term)
-    if ty_term is TmZero:
-        return True
-    elif ty_term is TmSucc:
-        isnumericval(term.term)
-    return False
+    return ty_term is TmZero or ty_term is TmSucc and term.numeric
 
 def isval(term):
-    val_terms = [
-        TmString,
-        TmUnit,
-        TmTrue,
-        TmFalse,
-        TmFloat,
-        TmAbs,
-        TmTAbs]
+    """
+    Whether 'term' is a value. Numerals and records keep what was found
+    about them (see 'TmSucc' and 'Fields.allvalues'), so a numeral or a
+    record already checked costs the same as a constant
+    """
     ty_term = type(term)
 
-    if ty_term in val_terms:
-        return True
-    elif isnumericval(term):
+    if ty_term in VALUES:
         return True
+    elif ty_term is TmSucc:
+        return term.numeric
     elif ty_term is TmRecord:
-        return all(map(lambda t: isval(t[1]), term.fields))
+        return term.fields.allvalues(isval)
     elif ty_term is TmPack:
         return isval(term.term)
     else:
@@ -59,25 +62,23 @@ class Evaluate(Visitor):
         raise NotImplementedError
 
     def visit_TmRecord(self, term):
-        for (num, field) in enumerate(term.fields):
-            f_term = self.visit(field[1])
-            term.fields[num] = (field[0], f_term)
-        return term
+        fields = term.fields.step(isval, self.visit)
+        if fields is None:
+            raise NoRuleApplies
+        return TmRecord(term.info, fields)
 
     def visit_TmProj(self, term):
-        if type(term.term) is TmRecord:
+        if type(term.term) is TmRecord and isval(term.term):
+            fields = term.term.fields
             if isinstance(term.name, int):
-                return term.term.fields[-term.name][1]
-            # lookup by name
-            # TODO: for increase perfomance may be used 'dict'
-            for (name, value) in reversed(term.term.fields):
-                if name == term.name:
-                    return value
-            raise NoRuleApplies("Not found")
+                return fields[-term.name][1]
+            value = fields.get(term.name)
+            if value is None:
+                raise NoRuleApplies("Not found")
+            return value
         else:
             new_term = self.visit(term.term)
             return term._replace(term=new_term)
-        raise NoRuleApplies
 
     def visit_TmIf(self, term):
         if isinstance(term.term_condition, TmTrue):
@@ -85,7 +86,7 @@ class Evaluate(Visitor):
         elif isinstance(term.term_condition, TmFalse):
             return term.term_else
         else:
-            new_term_condition = evaluate(self.ctx, term.term_condition)
+            new_term_condition = self.visit(term.term_condition)
             return TmIf(
                 term.info,
                 new_term_condition,
@@ -95,13 +96,21 @@ class Evaluate(Visitor):
         raise NotImplementedError
 
     def visit_TmSucc(self, term):
-        raise NotImplementedError
+        return TmSucc(term.info, self.visit(term.term))
 
     def visit_TmPred(self, term):
-        raise NotImplementedError
+        if type(term.term) is TmZero:
+            return term.term
+        elif type(term.term) is TmSucc and term.term.numeric:
+            return term.term.term
+        return TmPred(term.info, self.visit(term.term))
 
     def visit_TmIsZero(self, term):
-        raise NotImplementedError
+        if type(term.term) is TmZero:
+            return TmTrue(term.info)
+        elif type(term.term) is TmSucc and term.term.numeric:
+            return TmFalse(term.info)
+        return TmIsZero(term.info, self.visit(term.term))
 
     def visit_TmUnpack(self, term):
 
@@ -144,16 +153,15 @@ def evaluate1(ctx, term):
     return visitor.visit(term)
 
 
-def evaluate(ctx, term):
+def evaluate_steps(ctx, term, max_steps=None, stop=isval):
     eval_visitor = Evaluate()
     eval_visitor.ctx = ctx
-    try:
-        new_term = eval_visitor.visit(term)
-        return evaluate(ctx, new_term)
-    except NoRuleApplies:
-        return term
+    return run(eval_visitor.visit, term, stop, max_steps)
 
-def evalbinding(ctx, b):
+def evaluate(ctx, term):
+    return evaluate_steps(ctx, term).term
+
+def evalbinding(ctx, b, evaluate=evaluate):
     type_b = type(b)
     if type_b is TmAbbBind:
        term = evaluate(ctx, b.term)
@@ -161,11 +169,9 @@ def evalbinding(ctx, b):
     return b
 
 def istyabb(ctx, i):
-    # FIXME: may be implement with using gettyabb
-    b = getbinding(ctx, i)
-    if isinstance(b, TyAbbBind):
-        return True
-    return False
+    # the kind of a binding does not depend on shifting
+    (_, b) = get_ctx_item(ctx, i)
+    return type(b) is TyAbbBind
 
 def gettyabb(ctx, i):
     b = getbinding(ctx, i)
@@ -180,12 +186,14 @@ def computety(ctx, tyT):
         raise NoRuleApplies
 
 def simplifyty(ctx, tyT):
-    # TODO: unfold into cycle
-    try:
-        tyT1 = computety(ctx, tyT)
-        return simplifyty(ctx, tyT1)
-    except NoRuleApplies:
-        return tyT
+    """
+    'tyT' with the abbreviations at its head expanded. Definitions come
+    from 'getbinding', so an abbreviation is only shifted once at each
+    depth and every expansion of it there is the same object
+    """
+    while type(tyT) is TyVar and istyabb(ctx, tyT.index):
+        tyT = gettyabb(ctx, tyT.index)
+    return tyT
 
 
 class TypeEqVisitor(PairVisitor):
@@ -229,12 +237,19 @@ class TypeEqVisitor(PairVisitor):
         raise NotImplementedError
 
     def visit_TyRecord_TyRecord(self, tyS, tyT):
-        if len(tyS.fields) != len(tyT.fields):
+        """Same labels and equivalent types, in any order (see '11.8 Records')"""
+        fieldsS = tyS.fields
+        fieldsT = tyT.fields
+        if len(fieldsS) != len(fieldsT):
             return False
-        # NOTE: positionally dependent
-        # See notes in 11.8 Records
-        for ((name1, tyS1), (name2,tyT1)) in zip(tyS.fields, tyT.fields):
-            if not tyeqv(self.ctx, tyS1, tyT1):
+        if fieldsS.slots is fieldsT.slots:
+            # same labels in the same order
+            return all(
+                tyeqv(self.ctx, tySi, tyTi)
+                for ((_, tySi), (_, tyTi)) in zip(fieldsS, fieldsT))
+        for (li, tySi) in fieldsS:
+            tyTi = fieldsT.get(li)
+            if tyTi is None or not tyeqv(self.ctx, tySi, tyTi):
                 return False
         return True
 
@@ -243,8 +258,12 @@ class TypeEqVisitor(PairVisitor):
             return self.visit(tyS.type, tyT.type)
 
 def tyeqv(ctx, tyS, tyT):
+    if tyS is tyT:
+        return True
     tyS = simplifyty(ctx, tyS)
     tyT = simplifyty(ctx, tyT)
+    if tyS is tyT:
+        return True
     visitor = TypeEqVisitor()
     visitor.ctx = ctx
     return visitor.visit(tyS, tyT)
@@ -299,17 +318,16 @@ class Typeof(Visitor):
         raise NotImplementedError
 
     def visit_TmRecord(self, term):
-        fieldtys = [(li, self.visit(ti)) for li, ti in term.fields]
-        return TyRecord(fieldtys)
+        return TyRecord(term.fields.map(self.visit))
 
     def visit_TmProj(self, term):
         tyT = self.visit(term.term)
         s_term = simplifyty(self.ctx, tyT)
         if type(s_term) is not TyRecord:
             raise RuntimeError(term.info, "Expected record type")
-        for (name, tf) in s_term.fields:
-            if name == term.name:
-                return tf
+        tf = s_term.fields.get(term.name)
+        if tf is not None:
+            return tf
         raise RuntimeError(
             term.info, "label " + str(term.name) + " not found")
 
@@ -343,23 +361,23 @@ class Typeof(Visitor):
 
     def visit_TmSucc(self, term):
         tyT = self.visit(term.term)
-        if tyeqv(selc.ctx, tyT, TyNat()):
+        if tyeqv(self.ctx, tyT, TyNat()):
             return TyNat()
-        RuntimeError(
+        raise RuntimeError(
             term.info, "Argument of 'succ' is not a number")
 
     def visit_TmPred(self, term):
         tyT = self.visit(term.term)
-        if tyeqv(selc.ctx, tyT, TyNat()):
+        if tyeqv(self.ctx, tyT, TyNat()):
             return TyNat()
-        RuntimeError(
+        raise RuntimeError(
             term.info, "Argument of 'pred' is not a number")
 
     def visit_TmIsZero(self, term):
         tyT = self.visit(term.term)
-        if tyeqv(selc.ctx, tyT, TyNat()):
+        if tyeqv(self.ctx, tyT, TyNat()):
             return TyBool()
-        RuntimeError(
+        raise RuntimeError(
             term.info, "Argument of 'iszero' is not a number")
 
     def visit_TmPack(self, term):
@@ -0,0 +1,14 @@
+"""
+Type erasure for fullpoly, see 'common.erasure'.
+"""
+
+import syntax
+import core
+from common.compiler import Compiler, ALL_FORMS
+from common.erasure import Erasure
+
+# the compiler only meets erased terms: its read back leaves types as
+# they are, which is wrong for a term with type variables
+erasure = Erasure(syntax, Compiler(syntax, core.evaluate, ALL_FORMS))
+erase = erasure.erase
+evaluate = erasure.evaluate
@@ -0,0 +1,229 @@
+"""
+Explicit-substitution evaluator for fullpoly.
+
+'core.evaluate' performs every beta step with 'termSubstTop' or
+'tytermSubstTop', which walk the whole body, type annotations included,
+and rebuild it. Here a substitution is suspended instead: a body is
+paired with an environment that holds the values of its free term
+variables and the types of its free type variables, in the manner of
+the lambda-sigma calculus. Extending the environment is O(1), so a type
+application of a large polymorphic function costs the same as one of a
+small one. The substitution is pushed into a term only when its value
+is read back, once, at the end, so it can be shown by 'printtm' exactly
+like the result of 'core.evaluate'.
+
+Evaluation order is the same as in 'core' (call-by-value, left to
+right). When evaluation gets stuck (a variable without a value, a rule
+'core' does not implement) the term is handed to 'core.evaluate', which
+stops at the same place.
+"""
+
+from collections import namedtuple
+
+from syntax import *
+import core
+from common.evaluation import NoRuleApplies
+
+# Values
+
+Closure = namedtuple("Closure", ["term", "env"])
+RecordValue = namedtuple("RecordValue", ["info", "fields"])
+PackValue = namedtuple("PackValue", ["info", "witness", "value", "type"])
+
+# Suspended substitution of a type: the type of a 'TmTApp' or the
+# witness of a 'TmPack' together with the environment it appears in
+TypeClosure = namedtuple("TypeClosure", ["type", "env"])
+
+# Environment: linked list of values and type closures, 'None' is the
+# empty environment
+
+Env = namedtuple("Env", ["value", "next", "size"])
+
+def extend(env, value):
+    return Env(value, env, env.size + 1 if env else 1)
+
+def envsize(env):
+    return env.size if env else 0
+
+def lookup(env, index):
+    while index:
+        env = env.next
+        index -= 1
+    return env.value
+
+# ----------------------------------------------------------------------
+# Read back
+
+def readback_type(ctxlength, tyT, env, c=0):
+    """
+    Type 'tyT' under environment 'env' and 'c' extra binders as a plain
+    type valid in a context of 'ctxlength' names
+    """
+    size = envsize(env)
+    if not size:
+        return tyT
+
+    def onvar(c, x, n):
+        if x < c:
+            return TyVar(x, ctxlength + c)
+        elif x - c < size:
+            tyC = lookup(env, x - c)
+            return typeShift(c, readback_type(ctxlength, tyC.type, tyC.env))
+        return TyVar(x - size, ctxlength + c)
+
+    return TypeMap(cutoff=c, onvar=onvar).visit(tyT)
+
+def readback_term(ctxlength, term, env):
+    size = envsize(env)
+    if not size:
+        return term
+
+    def onvar(info, c, x, n):
+        if x < c:
+            return TmVar(info, x, ctxlength + c)
+        elif x - c < size:
+            return termShift(c, readback(ctxlength, lookup(env, x - c)))
+        return TmVar(info, x - size, ctxlength + c)
+
+    tmmap = TermMap(
+        cutoff = 0,
+        onvar = onvar,
+        ontype = lambda c, tyT: readback_type(ctxlength, tyT, env, c)
+        )
+    return tmmap.visit(term)
+
+def readback(ctxlength, value):
+    """Value 'value' as a plain term valid in a context of 'ctxlength' names"""
+    ty_value = type(value)
+    if ty_value is RecordValue:
+        return TmRecord(
+            value.info, value.fields.map(lambda vi: readback(ctxlength, vi)))
+    elif ty_value is PackValue:
+        return TmPack(
+            value.info,
+            readback_type(ctxlength, value.witness.type, value.witness.env),
+            readback(ctxlength, value.value),
+            readback_type(ctxlength, value.type.type, value.type.env))
+    return readback_term(ctxlength, value.term, value.env)
+
+# ----------------------------------------------------------------------
+# Evaluation
+
+class Evaluate(Visitor):
+    """
+    Big-step evaluation of a term under an environment. Raises
+    'NoRuleApplies' when evaluation gets stuck
+    """
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    def closure(self, term, env):
+        return Closure(term, env)
+
+    visit_TmAbs = closure
+    visit_TmTAbs = closure
+    visit_TmTrue = closure
+    visit_TmFalse = closure
+    visit_TmString = closure
+    visit_TmUnit = closure
+    visit_TmFloat = closure
+    visit_TmZero = closure
+
+    def visit_TmVar(self, term, env):
+        size = envsize(env)
+        if term.index < size:
+            return lookup(env, term.index)
+        b = getbinding(self.ctx, term.index - size)
+        if type(b) is TmAbbBind:
+            return self.visit(b.term, None)
+        raise NoRuleApplies
+
+    def visit_TmApp(self, term, env):
+        left = self.visit(term.left, env)
+        right = self.visit(term.right, env)
+        if type(left) is not Closure or type(left.term) is not TmAbs:
+            raise NoRuleApplies
+        return self.visit(left.term.term, extend(left.env, right))
+
+    def visit_TmLet(self, term, env):
+        let_value = self.visit(term.let_term, env)
+        return self.visit(term.in_term, extend(env, let_value))
+
+    def visit_TmIf(self, term, env):
+        cond = self.visit(term.term_condition, env)
+        if type(cond) is Closure:
+            if type(cond.term) is TmTrue:
+                return self.visit(term.term_then, env)
+            elif type(cond.term) is TmFalse:
+                return self.visit(term.term_else, env)
+        raise NoRuleApplies
+
+    def numeral(self, term, env):
+        """The numeral 'term' evaluates to, a closed term"""
+        value = self.visit(term, env)
+        if type(value) is not Closure or not core.isnumericval(value.term):
+            raise NoRuleApplies
+        return value.term
+
+    def visit_TmSucc(self, term, env):
+        if term.numeric:
+            return Closure(term, None)
+        return Closure(TmSucc(term.info, self.numeral(term.term, env)), None)
+
+    def visit_TmPred(self, term, env):
+        nv = self.numeral(term.term, env)
+        if type(nv) is TmZero:
+            return Closure(nv, None)
+        return Closure(nv.term, None)
+
+    def visit_TmIsZero(self, term, env):
+        if type(self.numeral(term.term, env)) is TmZero:
+            return Closure(TmTrue(term.info), None)
+        return Closure(TmFalse(term.info), None)
+
+    def visit_TmRecord(self, term, env):
+        return RecordValue(
+            term.info, term.fields.map(lambda ti: self.visit(ti, env)))
+
+    def visit_TmProj(self, term, env):
+        record = self.visit(term.term, env)
+        if type(record) is not RecordValue:
+            raise NoRuleApplies
+        if isinstance(term.name, int):
+            return record.fields[-term.name][1]
+        value = record.fields.get(term.name)
+        if value is None:
+            raise NoRuleApplies("Not found")
+        return value
+
+    def visit_TmTApp(self, term, env):
+        tabs = self.visit(term.term, env)
+        if type(tabs) is not Closure or type(tabs.term) is not TmTAbs:
+            raise NoRuleApplies
+        tyC = TypeClosure(term.type, env)
+        return self.visit(tabs.term.term, extend(tabs.env, tyC))
+
+    def visit_TmPack(self, term, env):
+        return PackValue(
+            term.info,
+            TypeClosure(term.witness_type, env),
+            self.visit(term.term, env),
+            TypeClosure(term.type, env))
+
+    def visit_TmUnpack(self, term, env):
+        pack = self.visit(term.let_term, env)
+        if type(pack) is not PackValue:
+            raise NoRuleApplies
+        env = extend(extend(env, pack.witness), pack.value)
+        return self.visit(term.in_term, env)
+
+    def visit__(self, term, env):
+        raise NoRuleApplies
+
+def evaluate(ctx, term):
+    try:
+        value = Evaluate(ctx).visit(term, None)
+    except NoRuleApplies:
+        return core.evaluate(ctx, term)
+    return readback(len(ctx), value)
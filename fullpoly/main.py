@@ -1,27 +1,37 @@
 #!/usr/bin/env python3
 
 import argparse
+import functools
+import sys
 
 from lexer import Lexer
 from parser import Parser
 import syntax
 import core
+import explicit
+import erasure
+from common import batch, stream, tables
 
-def prbindingty(b, ctx):
+engines = {
+    "subst": core.evaluate,
+    "explicit": explicit.evaluate,
+}
+
+def prbindingty(b, ctx, out):
     type_b = type(b)
     if type_b in [syntax.NameBind, syntax.TyVarBind]:
         pass
     elif type_b is syntax.VarBind:
-        print(": ", end="")
-        syntax.printty(b.type, ctx)
+        out.append(": ")
+        syntax.printty(ctx, b.type, out)
     elif type_b is syntax.TmAbbBind:
-        print(": ", end="")
+        out.append(": ")
         if b.type is None:
-            syntax.printty(core.typeof(ctx, b.term), ctx)
+            syntax.printty(ctx, core.typeof(ctx, b.term), out)
         else:
-            syntax.printty(b.type, ctx)
+            syntax.printty(ctx, b.type, out)
     elif type_b is syntax.TyAbbBind:
-        print(":: *", end="")
+        out.append(":: *")
     else:
         raise NotImplementedError(b)
 
@@ -43,22 +53,25 @@ def checkbinding(b, ctx):
     raise NotImplementedError(b)
 
 
-def process_command(cmd, ctx):
+def process_command(cmd, ctx, evaluate=core.evaluate, erase=False):
+    out = []
     type_cmd = type(cmd)
     if type_cmd is syntax.Eval:
         term_type = core.typeof(ctx, cmd.term)
-        term = core.evaluate(ctx, cmd.term)
-        syntax.printtm(ctx, term)
-        print(": ", end="")
-        syntax.printty(ctx, term_type)
-        print("")
+        if erase:
+            term = erasure.evaluate(ctx, cmd.term, evaluate)
+        else:
+            term = evaluate(ctx, cmd.term)
+        syntax.printtm(ctx, term, out)
+        out.append(": ")
+        syntax.printty(ctx, term_type, out)
+        out.append("\n")
     elif type_cmd is syntax.Bind:
         bind = checkbinding(cmd.binding, ctx)
-        bind = core.evalbinding(ctx, bind)
-        print(cmd.name, end="")
-        print(" ", end="")
-        prbindingty(bind, ctx)
-        print("")
+        bind = core.evalbinding(ctx, bind, evaluate)
+        out.append(cmd.name + " ")
+        prbindingty(bind, ctx, out)
+        out.append("\n")
         syntax.addbinding(ctx, cmd.name, bind)
     elif type_cmd is syntax.SomeBind:
         tyT = core.typeof(ctx, cmd.term)
@@ -68,40 +81,62 @@ def process_command(cmd, ctx):
                 cmd.term.info, "Existential type expected")
 
         tyBody = styT.type
-        term = core.evaluate(ctx, cmd.term)
+        term = evaluate(ctx, cmd.term)
         if type(term) is syntax.TmPack:
             b = syntax.TmAbbBind(
                 syntax.termShift(1, term.term), tyBody)
         else:
             b = syntax.VarBind(tyBody)
-        print(cmd.ty_name)
-        print(cmd.var_name, end="")
-        print(" : ", end="")
+        out.append(cmd.ty_name + "\n")
+        out.append(cmd.var_name + " : ")
 
         syntax.addbinding(ctx, cmd.ty_name, syntax.TyVarBind())
-        syntax.printty(ctx, tyBody)
+        syntax.printty(ctx, tyBody, out)
         syntax.addbinding(ctx, cmd.var_name, b)
-        print("")
+        out.append("\n")
     else:
         raise RuntimeError("Unknown command", cmd)
+    sys.stdout.write("".join(out))
 
-def parse_file(f):
+def parse_file(f, parser=None):
     with open(f, 'r') as fd:
         text = fd.read()
-    parser = Parser()
+    if parser is None:
+        parser = Parser()
     return parser.parse(text, f)
 
-def process_file(f):
-    cmds = parse_file(f)
-    ctx = []
-    for cmd in cmds:
-        process_command(cmd, ctx)
+def process_file(f, evaluate=core.evaluate, parser=None, erase=False):
+    if parser is None:
+        parser = Parser()
+    ctx = syntax.Context()
+    with stream.open_input(f) as lines:
+        for cmd in stream.parse_stream(parser, lines, f):
+            process_command(cmd, ctx, evaluate, erase)
+            sys.stdout.flush()
+
+def check_file(args, f, parser):
+    """Process 'f' as requested by the command line options 'args'"""
+    process_file(f, engines[args.engine], parser=parser, erase=args.erase)
 
 def main():
     arg_parser = argparse.ArgumentParser()
-    arg_parser.add_argument("file", help="Input file")
+    batch.add_arguments(arg_parser)
+    arg_parser.add_argument(
+        "--engine", choices=sorted(engines), default="subst",
+        help="Evaluation engine: small-step evaluator with eager "
+             "substitution or evaluator with explicit substitutions")
+    arg_parser.add_argument(
+        "--erase", action="store_true",
+        help="Erase the types of a checked term and run it untyped, "
+             "the result is shown without types")
+    tables.add_arguments(arg_parser)
     args = arg_parser.parse_args()
-    process_file(args.file)
+    make_parser = functools.partial(tables.make_parser, Parser, args)
+    check = functools.partial(check_file, args)
+    if batch.requested(args):
+        failed = batch.run(check, args.files, make_parser, args.jobs)
+        sys.exit(1 if failed else 0)
+    check(args.files[0], make_parser())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -4,6 +4,8 @@ from ply.lex import LexToken
 from lexer import Lexer
 
 import syntax
+from common import tables
+from common.record import Fields
 
 
 class ParserException:
@@ -11,14 +13,18 @@ class ParserException:
 
 class Parser:
 
-    def __init__(self, debug=False):
-        self.lexer = Lexer()
+    def __init__(self, debug=False, optimize=False):
+        if optimize:
+            lex_options, yacc_options = tables.options(Parser, Lexer)
+        else:
+            lex_options, yacc_options = {}, {}
+        self.lexer = Lexer(**lex_options)
         self.tokens = self.lexer.tokens
         self.debug = debug
-        self.parser = yacc.yacc(module=self, debug=debug)
+        self.parser = yacc.yacc(module=self, debug=debug, **yacc_options)
 
     def parse(self, text, filename="", ctx=None):
-        self._ctx = ctx or []
+        self._ctx = syntax.Context() if ctx is None else ctx
         self._scope_comma_cnt = []
         self.filename = filename
         return self.parser.parse(
@@ -30,9 +36,10 @@ class Parser:
         "Commands : Command SEMI"
         p[0] = [p[1]]
 
-    def p_Commands_Command_Commands(self, p):
-        "Commands : Command SEMI Commands"
-        p[0] = [p[1]] + p[3]
+    def p_Commands_Commands_Command(self, p):
+        "Commands : Commands Command SEMI"
+        p[1].append(p[2])
+        p[0] = p[1]
 
 # Command
 
@@ -107,7 +114,7 @@ class Parser:
 
     def p_AType_LCURLY_FieldTypes_RCURLY(self, p):
         "AType : LCURLY AType_LCURLY FieldTypes RCURLY AType_RCURLY"
-        p[0] = syntax.TyRecord(p[3])
+        p[0] = syntax.TyRecord(Fields(p[3]))
 
     def p_AType_BOOL(self, p):
         "AType : BOOL"
@@ -304,15 +311,15 @@ class Parser:
 
     def p_AppTerm_SUCC_PathTerm(self, p):
         "AppTerm : SUCC PathTerm"
-        raise NotImplementedError()
+        p[0] = syntax.TmSucc(self._info(p), p[2])
 
     def p_AppTerm_PRED_PathTerm(self, p):
         "AppTerm : PRED PathTerm"
-        raise NotImplementedError()
+        p[0] = syntax.TmPred(self._info(p), p[2])
 
     def p_AppTerm_ISZERO_PathTerm(self, p):
         "AppTerm : ISZERO PathTerm"
-        raise NotImplementedError()
+        p[0] = syntax.TmIsZero(self._info(p), p[2])
 
     def p_AppTerm_LSQUARE_Type_RSQUARE(self, p):
         "AppTerm : AppTerm LSQUARE Type RSQUARE"
@@ -386,7 +393,7 @@ class Parser:
 
     def p_ATerm_LCURLY_Fields_RCURLY(self, p):
         "ATerm : LCURLY ATerm_LCURLY Fields RCURLY ATerm_RCURLY"
-        p[0] = syntax.TmRecord(self._info(p), p[3])
+        p[0] = syntax.TmRecord(self._info(p), Fields(p[3]))
 
     def p_ATerm_FLOATV(self, p):
         "ATerm : FLOATV"
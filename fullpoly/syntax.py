@@ -1,21 +1,31 @@
+import os
+import sys
 from collections import namedtuple
+from contextlib import contextmanager
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from common.context import Context, as_context, binding_memo
+from common.intern import internedtuple
+from common.substitution import substtop_onvar
+from common.visitor import InstanceVisitor as Visitor, PairVisitor, when
 
 # ----------------------------------------------------------------------
 # Datatypes
 
 # Types
 
-TyVar = namedtuple("TyVar", ["index", "ctxlength"])
-TyId = namedtuple("TyId", ["name"])
-TyArr = namedtuple("TyArr", ["left", "right"])
-TyString = namedtuple("TyString", [])
-TyUnit = namedtuple("TyUnit", [])
-TyRecord = namedtuple("TyRecord", ["fields"])
-TyBool = namedtuple("TyBool", [])
-TyFloat = namedtuple("TyFloat", [])
-TyNat = namedtuple("TyNat", [])
-TySome = namedtuple("TySome", ["name", "type"])
-TyAll = namedtuple("TyAll", ["name", "type"])
+TyVar = internedtuple("TyVar", ["index", "ctxlength"])
+TyId = internedtuple("TyId", ["name"])
+TyArr = internedtuple("TyArr", ["left", "right"])
+TyString = internedtuple("TyString", [])
+TyUnit = internedtuple("TyUnit", [])
+TyRecord = internedtuple("TyRecord", ["fields"])
+TyBool = internedtuple("TyBool", [])
+TyFloat = internedtuple("TyFloat", [])
+TyNat = internedtuple("TyNat", [])
+TySome = internedtuple("TySome", ["name", "type"])
+TyAll = internedtuple("TyAll", ["name", "type"])
 
 # Terms
 TmVar = namedtuple("TmVar", ["info", "index", "ctxlength"])
@@ -34,7 +44,23 @@ TmIf = namedtuple("TmIf", ["info", "term_condition", "term_then", "term_else"])
 TmFloat = namedtuple("TmFloat", ["info", "value"])
 TmTimesfloat = namedtuple("TmTimesfloat", ["info", "term1", "term2"])
 TmZero = namedtuple("TmZero", ["info"])
-TmSucc = namedtuple("TmSucc", ["info", "term"])
+
+class TmSucc(namedtuple("TmSucc", ["info", "term"])):
+    """
+    'numeric' is set when the node is built: whether it is a numeral,
+    so a numeral is told from a stuck 'succ' without walking it
+    """
+
+    def __new__(cls, info, term):
+        self = super().__new__(cls, info, term)
+        self.numeric = (
+            type(term) is TmZero or type(term) is TmSucc and term.numeric)
+        return self
+
+    @classmethod
+    def _make(cls, iterable):
+        return cls(*iterable)
+
 TmPred = namedtuple("TmPred", ["info", "term"])
 TmIsZero = namedtuple("TmIsZero", ["info", "term"])
 TmInert = namedtuple("TmInert", ["info", "type"])
@@ -61,135 +87,16 @@ class Info(namedtuple("Info", ["filename", "lineno"])):
     def __repr__(self):
         return '<%s:%s>' % self
 
-# ----------------------------------------------------------------------
-# Tools
-
-
-def when(guard):
-
-    def when_decorator(func):
-        func.guard = guard
-        return func
-
-    return when_decorator
-
-
-class PairVisitor:
-
-    def visit(self, term1, term2, *args, **kwargs):
-        props = [
-            "visit_%s_%s" % (
-                type(term1).__name__,
-                type(term2).__name__),
-            "visit_%s__" % type(term1).__name__,
-            "visit__%s" % type(term2).__name__,
-            "visit__"]
-
-        method = None
-        for method_name in props:
-            method = getattr(self, method_name, None)
-            if method is not None:
-
-                has_guard = hasattr(method, "guard")
-                if has_guard:
-                    if method.guard(self, term1, term2):
-                        return method(term1, term2, *args, **kwargs)
-                else:
-                    return method(term1, term2, *args, **kwargs)
-
-        raise AttributeError(
-            "Object '%s' has no suitable attribute for '%s', '%s'" %
-            (type(self).__name__, term1, term2))
-
-
-class Visitor:
-
-    def visit(self, term, *args, **kwargs):
-        method_name = 'visit_' + type(term).__name__
-        method = getattr(
-            self, method_name,
-            getattr(self, 'visit__', None))
-
-        if method is None:
-            raise AttributeError(
-                "Object '%s' has no suitable attribute for '%s'" %
-                (type(self).__name__, term))
-        return method(term, *args, **kwargs)
-
 # ----------------------------------------------------------------------
 # Context management
 
-from contextlib import contextmanager
-
-# Experimental alternative implementation of context
-class Context:
-
-    def __init__(self):
-        self._storage = []
-        self._map = {}
-
-    def __getitem__(self, index):
-        try:
-            return self._storage[-1 - index]
-        except IndexError:
-            raise RuntimeError(
-                "Variable lookup failure: offset: %d, ctx size: %d" %
-                (index, len(self._storage)))
-
-    def __len__(self):
-        return len(self._storage)
-
-    @contextmanager
-    def mgr_addbinding(self, name, bind):
-        self.addbinding(name, bind)
-        yield
-        self.pop()
-
-    def addbinding(self, name, bind):
-        self._storage.append((name, bind))
-        self._map[name] = len(self._storage) - 1
-
-    def pop(self):
-        (name, _) = self._storage.pop()
-        del self._map[name]
-
-    def addname(self, name):
-        return self.addbinding(name, NameBind())
-
-    def isnamebound(self, name):
-        return name in self._map
-
-    def name2index(self, name):
-        """
-        pos:   0, 1, 2, 3
-        index: 3, 2, 1, 0
-        items: A, B, C, D
-
-        A -> 4-(0+1) = 3
-        B -> 4-(1+1) = 2
-        ...
-        """
-        if not self.isnamebound:
-            raise ValueError("Identifier '%s' is unbound" % name)
-
-        pos = self._map[name] + 1
-        return len(self._storage) - pos
-
-    def index2name(self, index):
-        (name, _) = self[index]
-        return name
-
-    def pickfreshname(self, name):
-        new_name = str(name)
-        while self.isnamebound(new_name):
-            new_name += "'"
-        return new_name
-
 @contextmanager
 def mgr_addbinding(ctx, name, bind):
     ctx.append((name, bind))
-    yield
-    ctx.pop()
+    try:
+        yield
+    finally:
+        ctx.pop()
 
 def addbinding(ctx, name, bind):
     ctx.append((name, bind))
@@ -199,25 +106,17 @@ def addname(ctx, name):
     return addbinding(ctx, name, NameBind())
 
 def isnamebound(ctx, name):
-    for ctx_name, _ in ctx:
-        if ctx_name == name:
-            return True
-    return False
+    return ctx.isnamebound(name)
 
 @contextmanager
 def mgr_pickfreshname(ctx, name):
-    new_name = str(name)
-    while isnamebound(ctx, new_name):
-        new_name += "'"
+    """Bind a fresh variant of 'name' while the block runs"""
+    new_name = ctx.freshname(name)
     addname(ctx, new_name)
-    yield new_name
-    ctx.pop()
-
-def pickfreshname(ctx, name):
-    new_name = str(name)
-    while isnamebound(ctx, new_name):
-        new_name += "'"
-    return (ctx + [(new_name, NameBind())], new_name)
+    try:
+        yield new_name
+    finally:
+        ctx.pop()
 
 def get_ctx_item(ctx, index):
     try:
@@ -232,10 +131,7 @@ def index2name(ctx, index):
     return name
 
 def name2index(ctx, name):
-    for index, (v, _) in enumerate(reversed(ctx)):
-        if name == v:
-            return index
-    raise ValueError("Identifier '%s' is unbound" % name)
+    return ctx.name2index(name)
 
 # ----------------------------------------------------------------------
 # Shifting
@@ -250,7 +146,9 @@ goes through a binder (see section 6.2 Shifting and Substitution)
 
 class TypeMap(Visitor):
     """
-    Analogue of function 'tymap' from ML-implementation
+    Analogue of function 'tymap' from ML-implementation. Parts without
+    type variables are returned as they are, so mapping over a type
+    without any allocates nothing
     """
 
     cutoff = None
@@ -291,19 +189,26 @@ class TypeMap(Visitor):
     def visit_TyArr(self, tyT):
         left = self.visit(tyT.left)
         right = self.visit(tyT.right)
+        if left is tyT.left and right is tyT.right:
+            return tyT
         return TyArr(left, right)
 
     def visit_TySome(self, tyT):
         with self.inc_cutoff():
-            return TySome(tyT.name, self.visit(tyT.type))
+            tyT1 = self.visit(tyT.type)
+        return tyT if tyT1 is tyT.type else TySome(tyT.name, tyT1)
 
     def visit_TyAll(self, tyT):
         with self.inc_cutoff():
-            return TyAll(tyT.name, self.visit(tyT.type))
+            tyT1 = self.visit(tyT.type)
+        return tyT if tyT1 is tyT.type else TyAll(tyT.name, tyT1)
 
     def visit_TyRecord(self, tyT):
-        fields = [(li, self.visit(tyTi)) for li, tyTi in tyT.fields]
-        return TyRecord(fields)
+        fields = tyT.fields.map(self.visit)
+        for ((_, tyTi), (_, new_tyTi)) in zip(tyT.fields, fields):
+            if new_tyTi is not tyTi:
+                return TyRecord(fields)
+        return tyT
 
 
 class TermMap(Visitor):
@@ -382,13 +287,15 @@ class TermMap(Visitor):
         return t
 
     def visit_TmSucc(self, t):
-        raise NotImplementedError
+        if t.numeric:
+            return t
+        return TmSucc(t.info, self.visit(t.term))
 
     def visit_TmPred(self, t):
-        raise NotImplementedError
+        return TmPred(t.info, self.visit(t.term))
 
     def visit_TmIsZero(self, t):
-        raise NotImplementedError
+        return TmIsZero(t.info, self.visit(t.term))
 
     def visit_TmPack(self, t):
         raise NotImplementedError
@@ -402,7 +309,7 @@ class TermMap(Visitor):
 
     def visit_TmTApp(self, t):
         return TmTApp(
-            self.info,
+            t.info,
             self.visit(t.term),
             self.ontype(self.cutoff, t.type))
 
@@ -411,8 +318,7 @@ class TermMap(Visitor):
             term=self.visit(t.term))
 
     def visit_TmRecord(self, t):
-        fields = [(li, self.visit(ti)) for li, ti in t.fields]
-        return TmRecord(t.info, fields)
+        return TmRecord(t.info, t.fields.map(self.visit))
 
 
 def typeShiftAbove(d, c, tyT):
@@ -433,6 +339,14 @@ def termShiftAbove(d, c, t):
         )
     return tmmap.visit(t)
 
+def tmmap(onvar, c, t):
+    """
+    Map 'onvar' over the term variables of 't', leaving its types as
+    they are
+    """
+    tmmap = TermMap(cutoff=c, onvar=onvar, ontype=lambda c, tyT: tyT)
+    return tmmap.visit(t)
+
 def typeShift(d, tyT):
     return typeShiftAbove(d, 0, tyT)
 
@@ -468,7 +382,13 @@ def termSubst(j, s, t):
     return tmmap.visit(t)
 
 def termSubstTop(s, t):
-    return termShift(-1, termSubst(0, termShift(1, s), t))
+    onvar = substtop_onvar(TmVar, termShift, s)
+    tmmap = TermMap(
+        cutoff = 0,
+        onvar = onvar,
+        ontype = lambda c, tyT: typeShiftAbove(-1, c, tyT)
+        )
+    return tmmap.visit(t)
 
 def typeSubst(tyS, j, tyT):
     tymap = TypeMap(
@@ -497,8 +417,18 @@ def tytermSubstTop(tyS, t):
 # Context management (continued)
 
 def getbinding(ctx, index):
-    (_, binding) = get_ctx_item(ctx, index)
-    return bindingshift(index+1, binding)
+    """
+    The binding at 'index', shifted into the current context. The shifted
+    binding is memoized with the binding, per index it is looked up by,
+    so a variable is shifted once at each depth
+    """
+    memo = binding_memo(ctx, index)
+    try:
+        return memo[index]
+    except KeyError:
+        (_, binding) = get_ctx_item(ctx, index)
+        binding = memo[index] = bindingshift(index+1, binding)
+        return binding
 
 def getTypeFromContext(ctx, index):
     binding = getbinding(ctx, index)
@@ -521,176 +451,218 @@ def getTypeFromContext(ctx, index):
 
 
 class TypesPrinter(Visitor):
+    """Appends the text of a type to the list of chunks 'self.out'"""
 
     # Type
 
     def visit_TyAll(self, term):
         with mgr_pickfreshname(self.ctx, term.name) as name:
-            print("All ", end="")
-            print(name, end="")
-            print(".", end="")
-            printty(self.ctx, term.type)
+            self.out.append("All " + name + ".")
+            self.visit(term.type)
 
     # ArrowType
 
     def visit_TyArr(self, term):
-        printty(self.ctx, term.left)
-        print(" -> ", end="")
-        printty(self.ctx, term.right)
+        self.visit(term.left)
+        self.out.append(" -> ")
+        self.visit(term.right)
 
     # AType
 
     def visit_TyVar(self, term):
         if len(self.ctx) == term.ctxlength:
-            print(index2name(self.ctx, term.index), end="")
+            self.out.append(index2name(self.ctx, term.index))
         else:
-            print(
+            self.out.append(
                 "[bad index: " + str(term.index) + "/" + str(term.ctxlength)
-                + " in {" + " ".join(map(str, self.ctx)) + " }]")
+                + " in {" + " ".join(map(str, self.ctx)) + " }]\n")
 
     def visit_TyId(self, term):
-        print(term.name, end="")
+        self.out.append(term.name)
 
     def visit_TyString(self, term):
-        print("String", end="")
+        self.out.append("String")
 
     def visit_TyUnit(self, term):
-        print("Unit", end="")
+        self.out.append("Unit")
 
     def visit_TyRecord(self, term):
-        print("{", end="")
+        self.out.append("{")
         fields_length = len(term.fields)-1
         for (num, (name, tyT)) in enumerate(reversed(term.fields)):
             if type(name) is str:
-                print(name + ":", end="")
-            printty(self.ctx, tyT)
+                self.out.append(name + ":")
+            self.visit(tyT)
             if num < fields_length:
-                print(",", end="")
-        print("}", end="")
+                self.out.append(",")
+        self.out.append("}")
 
     def visit_TyBool(self, term):
-        print("Bool", end="")
+        self.out.append("Bool")
 
     def visit_TyFloat(self, term):
-        print("Float", end="")
+        self.out.append("Float")
 
     def visit_TyNat(self, term):
-        print("Nat", end="")
+        self.out.append("Nat")
 
     def visit_TySome(self, term):
         with mgr_pickfreshname(self.ctx, term.name) as name:
-            print("{Some ", end="")
-            print(name, end="")
-            print(".", end="")
-            printty(self.ctx, term.type)
-            print("}", end="")
+            self.out.append("{Some " + name + ".")
+            self.visit(term.type)
+            self.out.append("}")
 
 
-def printty(ctx, term):
+def format_type(ctx, tyT):
     visitor = TypesPrinter()
-    visitor.ctx = ctx
-    visitor.visit(term)
+    visitor.ctx = as_context(ctx)
+    visitor.out = []
+    visitor.visit(tyT)
+    return "".join(visitor.out)
+
+def printty(ctx, term, out=None):
+    """
+    Append the text of 'term' to 'out', or write it to the standard
+    output at once when 'out' is not given
+    """
+    if out is None:
+        sys.stdout.write(format_type(ctx, term))
+    else:
+        visitor = TypesPrinter()
+        visitor.ctx = as_context(ctx)
+        visitor.out = out
+        visitor.visit(term)
 
 
 class TermsPrinter(Visitor):
+    """Appends the text of a term to the list of chunks 'self.out'"""
 
     def visit_TmVar(self, term):
         if len(self.ctx) == term.ctxlength:
-            print(index2name(self.ctx, term.index), end="")
+            self.out.append(index2name(self.ctx, term.index))
         else:
-            print(
+            self.out.append(
                 "[bad index: " + str(term.index) + "/" + str(term.ctxlength)
-                + " in {" + ",".join(map(str, self.ctx)) + " }]")
+                + " in {" + ",".join(map(str, self.ctx)) + " }]\n")
 
     def visit_TmAbs(self, term):
-        (new_ctx, name) = pickfreshname(self.ctx, term.name)
-        print("(", end="")
-        print("lambda %s" % name, end="")
-        print(": ", end="")
-        printty(self.ctx, term.type)
-        print(" . ", end="")
-        printtm(new_ctx, term.term)
-        print(")", end="")
+        # the type of the variable is outside of its scope
+        name = self.ctx.freshname(term.name)
+        if term.type is None:
+            # erased, see 'common.erasure'
+            self.out.append("(lambda %s" % name)
+        else:
+            self.out.append("(lambda %s: " % name)
+            printty(self.ctx, term.type, self.out)
+        self.out.append(" . ")
+        with mgr_addbinding(self.ctx, name, NameBind()):
+            self.visit(term.term)
+        self.out.append(")")
 
     # AppTerm
 
     def visit_TmTAbs(self, term):
-        (new_ctx, name) = pickfreshname(self.ctx, term.name)
-        print("lambda ", end="")
-        print(name, end="")
-        print(".", end="")
-        printtm(new_ctx, term.term)
+        with mgr_pickfreshname(self.ctx, term.name) as name:
+            self.out.append("lambda " + name + ".")
+            self.visit(term.term)
 
     def visit_TmApp(self, term):
-        print("(", end="")
-        printtm(self.ctx, term.left)
-        print(" ", end="")
-        printtm(self.ctx, term.right)
-        print(")", end="")
+        self.out.append("(")
+        self.visit(term.left)
+        self.out.append(" ")
+        self.visit(term.right)
+        self.out.append(")")
 
     def visit_TmTimesfloat(self, term):
         raise NotImplementedError
 
     def visit_TmPred(self, term):
-        raise NotImplementedError
+        self.out.append("pred ")
+        self.visit(term.term)
 
     def visit_TmIsZero(self, term):
-        raise NotImplementedError
+        self.out.append("iszero ")
+        self.visit(term.term)
 
     def visit_TmTag(self, term):
-        print("Tag", term)
+        self.out.append("Tag %s\n" % (term,))
 
     def visit_TmIf(self, term):
-        print("if", end="")
-        printtm(self.ctx, term.term_condition)
-        print(" then ", end="")
-        printtm(self.ctx, term.term_then)
-        print(" else")
+        self.out.append("if ")
+        self.visit(term.term_condition)
+        self.out.append(" then ")
+        self.visit(term.term_then)
+        self.out.append(" else ")
+        self.visit(term.term_else)
 
     # ATerm
 
     def visit_TmString(self, term):
-        print("\"" + self.value + "\"", end="")
+        self.out.append("\"" + term.value + "\"")
 
     def visit_TmUnit(self, term):
-        raise NotImplementedError
+        self.out.append("unit")
 
     def visit_TmRecord(self, term):
-        print("{", end="")
+        self.out.append("{")
         fields_length = len(term.fields)-1
         for (num, (name, term)) in enumerate(reversed(term.fields)):
             if type(name) is str:
-                print(name + "=", end="")
-            printtm(self.ctx, term)
+                self.out.append(name + "=")
+            self.visit(term)
             if num < fields_length:
-                print(",", end="")
-        print("}", end="")
+                self.out.append(",")
+        self.out.append("}")
 
     def visit_TmTrue(self, term):
-        print("true", end="")
+        self.out.append("true")
 
     def visit_TmFalse(self, term):
-        print("false", end="")
+        self.out.append("false")
 
     def visit_TmFloat(self, term):
-        print(term.value, end="")
+        self.out.append(str(term.value))
 
     def visit_TmZero(self, term):
-        print("0", end="")
+        self.out.append("0")
 
     def visit_TmSucc(self, term):
-        raise NotImplementedError
+        if term.numeric:
+            num = 0
+            while type(term) is TmSucc:
+                term = term.term
+                num += 1
+            self.out.append(str(num))
+        else:
+            self.out.append("(succ ")
+            self.visit(term.term)
+            self.out.append(")")
 
     def visit_TmPack(self, term):
-        print("{*", end="")
-        printty(self.ctx, term.witness_type)
-        print(",", end="")
+        self.out.append("{*")
+        printty(self.ctx, term.witness_type, self.out)
+        self.out.append(",")
         self.visit(term.term)
-        print("} as ", end="")
-        printty(self.ctx, term.type)
+        self.out.append("} as ")
+        printty(self.ctx, term.type, self.out)
 
 
-def printtm(ctx, term):
+def format_term(ctx, term):
     visitor = TermsPrinter()
-    visitor.ctx = ctx
+    visitor.ctx = as_context(ctx)
+    visitor.out = []
     visitor.visit(term)
+    return "".join(visitor.out)
+
+def printtm(ctx, term, out=None):
+    """
+    Append the text of 'term' to 'out', or write it to the standard
+    output at once when 'out' is not given
+    """
+    if out is None:
+        sys.stdout.write(format_term(ctx, term))
+    else:
+        visitor = TermsPrinter()
+        visitor.ctx = as_context(ctx)
+        visitor.out = out
+        visitor.visit(term)
@@ -4,6 +4,9 @@ from lexer import Lexer
 import syntax
 from syntax import *
 import core
+import explicit
+import erasure
+from common.record import Fields
 
 class LexerTestCase(unittest.TestCase):
 
@@ -124,12 +127,12 @@ class ParserTestCase(unittest.TestCase):
         fi = Info("", 1)
         expected_term = TmPack(fi,
             TyNat(),
-            TmRecord(fi, [
+            TmRecord(fi, Fields([
                 ('f', TmAbs(fi, 'x', TyNat(), TmVar(fi, 0, 1))),
-                ('c', TmZero(fi))]),
-            TySome('X', TyRecord([
+                ('c', TmZero(fi))])),
+            TySome('X', TyRecord(Fields([
                             ('f', TyArr(TyVar(0, 1), TyNat())),
-                            ('c', TyVar(0, 1))])))
+                            ('c', TyVar(0, 1))]))))
         self.assertSequenceEqual(elem.term, expected_term)
 
     # def test_pack_alternative(self):
@@ -174,14 +177,14 @@ class ParserTestCase(unittest.TestCase):
         fi = Info("", 1)
         expected_term = TmUnpack(fi, 'X', 'ops',
             TmPack(fi, TyNat(),
-                TmRecord(fi, [
+                TmRecord(fi, Fields([
                     ('f', TmAbs(
                         fi, 'x', TyNat(), TmVar(fi, 0, 1))),
-                    ('c', TmZero(fi))]),
+                    ('c', TmZero(fi))])),
                 TySome('X',
-                    TyRecord([
+                    TyRecord(Fields([
                         ('f', TyArr(TyVar(0, 1), TyNat())),
-                        ('c', TyVar(0, 1))]))),
+                        ('c', TyVar(0, 1))])))),
             TmApp(fi,
                 TmProj(fi, TmVar(fi, 0, 2), 'f'),
                 TmProj(fi, TmVar(fi, 0, 2), 'c')))
@@ -206,6 +209,24 @@ class EvaluateTestCase(unittest.TestCase):
         term = core.evaluate(ctx, elem.term)
         self.assertIsInstance(term, syntax.TmTrue)
 
+    def test_numerals(self):
+        ast = self.parser.parse(
+            "(lambda x:Nat. succ (pred x)) 3; iszero (pred 1);")
+        self.assertTrue(core.isval(ast[0].term.right))
+        self.assertFalse(core.isval(ast[0].term.left.term))
+        self.assertEqual(format_term([], core.evaluate([], ast[0].term)), "3")
+        self.assertIsInstance(core.evaluate([], ast[1].term), TmTrue)
+
+    def test_record_value(self):
+        ast = self.parser.parse("{a=0, b=lambda x:Nat. x, c=0 [Nat]};")
+        fields = ast[0].term.fields
+        self.assertFalse(core.isval(ast[0].term))
+        # the fields found to be values are not looked at again
+        self.assertEqual(fields.values, 2)
+        ast = self.parser.parse("{a=0, b=lambda x:Nat. x};")
+        self.assertTrue(core.isval(ast[0].term))
+        self.assertEqual(ast[0].term.fields.values, 2)
+
     def test_abstraction(self):
         ast = self.parser.parse("lambda x:X. x;")
         elem = ast[0]
@@ -301,5 +322,177 @@ class EvaluateTestCase(unittest.TestCase):
         term = core.evaluate([], elem.term)
         self.assertIsInstance(term, TmZero)
 
+    def test_abbreviation(self):
+        ast = self.parser.parse(
+            "R = {a:Bool, b:String}; F = R -> String;"
+            " (lambda f:F. f {a=true, b=\"b\"}) (lambda r:R. r.b);")
+        ctx = self.parser._ctx
+        self.assertIs(core.typeof(ctx, ast[2].term), syntax.TyString())
+
+        tyF = core.simplifyty(ctx, syntax.TyVar(0, 2))
+        self.assertIs(core.simplifyty(ctx, syntax.TyVar(0, 2)), tyF)
+        self.assertEqual(tyF.left, syntax.TyVar(1, 2))
+
+
+class SubstitutionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def assertSameAsUnfused(self, s, t):
+        expected = syntax.termShift(
+            -1, syntax.termSubst(0, syntax.termShift(1, s), t))
+        self.assertEqual(syntax.termSubstTop(s, t), expected)
+
+    def test_subst_top(self):
+        ast = self.parser.parse(
+            "a:Nat;"
+            "lambda x:Nat->Nat. lambda X. lambda y:X->Nat."
+            "    {x a, lambda z:X. y z, x};"
+            "lambda n:Nat. {a, n};")
+        t = ast[1].term.term
+        s = ast[2].term
+        self.assertSameAsUnfused(s, t)
+        self.assertSameAsUnfused(s, ast[2].term.term)
+
+    def test_shift_closed(self):
+        ast = self.parser.parse(
+            "lambda x:{a:Bool->Nat, b:{String, Unit}}. x;")
+        tyT = ast[0].term.type
+        self.assertIs(syntax.typeShift(2, tyT), tyT)
+        tyS = syntax.TyArr(syntax.TyVar(0, 1), tyT)
+        self.assertIs(syntax.typeShift(1, tyS).right, tyT)
+
+    def test_getbinding(self):
+        ast = self.parser.parse("a:Nat; X = {a:Nat};")
+        ctx = self.parser._ctx
+        binding = syntax.getbinding(ctx, 0)
+        self.assertIs(binding.type, ast[1].binding.type)
+        self.assertIs(syntax.getbinding(ctx, 0), binding)
+        syntax.addbinding(ctx, "y", syntax.NameBind())
+        self.assertIs(syntax.getbinding(ctx, 1).type, binding.type)
+
+class ExplicitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def assertSameAsSubst(self, source):
+        ctx = syntax.Context()
+        for cmd in self.parser.parse(source):
+            if type(cmd) is syntax.Eval:
+                self.assertEqual(
+                    syntax.format_term(
+                        ctx, explicit.evaluate(ctx, cmd.term)),
+                    syntax.format_term(ctx, core.evaluate(ctx, cmd.term)))
+            else:
+                syntax.addbinding(ctx, cmd.name, core.evalbinding(
+                    ctx, cmd.binding, explicit.evaluate))
+
+    def test_type_application(self):
+        self.assertSameAsSubst(
+            "(lambda X. lambda Y. lambda x:X->Y. x) [Bool] [Nat];"
+            "(lambda X. lambda f:X->X. lambda X. lambda x:X. f)"
+            "    [Nat] (lambda n:Nat. n) [Bool];"
+            "(lambda X. {a=lambda x:X. x, b=lambda Y. lambda y:Y->X. y})"
+            "    [{Bool, Nat}];")
+
+    def test_values(self):
+        self.assertSameAsSubst(
+            "id = lambda X. lambda x:X. x;"
+            "let f = id [Bool] in {f true, f false}.2;"
+            "if id [Bool] false then 0 else id [Nat] 0;"
+            "{b=id [Bool] true, n=id [Nat] 0};"
+            "let {X, ops} = {*Nat, {c=0, f=lambda x:Nat. x}}"
+            "    as {Some X, {c:X, f:X->Nat}} in (ops.f ops.c);")
+
+    def test_numerals(self):
+        self.assertSameAsSubst(
+            "(lambda x:Nat. succ (succ x)) (succ 0);"
+            "(lambda X. lambda x:X. x) [Nat] (pred (succ (succ 0)));"
+            "pred 0;"
+            "let n = pred (succ 0) in {iszero n, iszero (succ n)};"
+            "if iszero (pred (succ 0)) then succ 0 else 0;")
+
+    def test_stuck(self):
+        self.assertSameAsSubst(
+            "f:Nat->Nat;"
+            "succ (f 0);"
+            "(lambda x:Nat. f x) 0;"
+            "(lambda X. lambda x:X. x) [Nat] (f 0);")
+
+
+class ErasureTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def evaluate(self, source):
+        term = self.parser.parse(source)[-1].term
+        ctx = syntax.Context()
+        return syntax.format_term(
+            ctx, erasure.evaluate(ctx, term, core.evaluate))
+
+    def test_erase(self):
+        ast = self.parser.parse("(lambda X. lambda x:X. x) [Nat];")
+        term = erasure.erase(ast[0].term)
+        self.assertEqual(
+            syntax.format_term([], term),
+            "((lambda X . (lambda x . x)) unit)")
+
+    def test_type_application(self):
+        self.assertEqual(
+            self.evaluate("(lambda X. lambda Y. lambda x:X->Y. x) [Bool] [Nat];"),
+            "(lambda x . x)")
+        self.assertEqual(
+            self.evaluate(
+                "let id = lambda X. lambda x:X. x in"
+                " {id [Bool] true, id [Nat] 0}.2;"),
+            "0")
+
+    def test_unpack(self):
+        self.assertEqual(
+            self.evaluate(
+                "let {X,ops} = {*Nat, {c=0, f=lambda x:Nat. x}}"
+                "    as {Some X, {c:X, f:X->Nat}} in (ops.f ops.c);"),
+            "0")
+
+    def test_abbreviation(self):
+        ast = self.parser.parse(
+            "id = lambda X. lambda x:X. x; n:Nat;"
+            " {id [Nat] 0, lambda y:Nat. id [Nat] n};")
+        ctx = syntax.Context()
+        for cmd in ast[:-1]:
+            syntax.addbinding(ctx, cmd.name, cmd.binding)
+
+        def fallback(ctx, term):
+            self.fail("fell back to the typed evaluator")
+        result = erasure.evaluate(ctx, ast[-1].term, fallback)
+        self.assertEqual(
+            syntax.format_term(ctx, result),
+            "{0,(lambda y . ((id unit) n))}")
+
+
+class PrinterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def test_format_type_abstraction(self):
+        ast = self.parser.parse("lambda X. lambda x:X. x;")
+        term = ast[0].term
+        self.assertEqual(
+            syntax.format_term([], term), "lambda X.(lambda x: X . x)")
+        self.assertEqual(
+            syntax.format_type([], core.typeof([], term)), "All X.X -> X")
+
+    def test_format_pack(self):
+        ast = self.parser.parse(
+            "{*Nat, {a=0, b=lambda x:Nat. x}} as {Some X, {a:X, b:X->Nat}};")
+        self.assertEqual(
+            syntax.format_term([], ast[0].term),
+            "{*Nat,{a=0,b=(lambda x: Nat . x)}} as "
+            "{Some X.{a:X,b:X -> Nat}}")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Benchmarks for fullsimple.
+
+    python bench.py suite --json results.json
+"""
+
+import argparse
+import sys
+
+from parser import Parser
+import syntax
+import core
+from common import benchmark
+
+def applications(depth):
+    """Source of 'depth' nested applications of the negation"""
+    return "(lambda f:Bool->Bool. %strue%s) %s;" % (
+        "f (" * depth, ")" * depth,
+        "(lambda x:Bool. if x then false else true)")
+
+def wide_record(width):
+    """
+    Source of a projection from a record of 'width' fields, passed to a
+    function whose parameter type is an abbreviation of the record type
+    """
+    labels = ["l%d" % num for num in range(width)]
+    return "R = {%s}; (lambda r:R. r.%s) {%s};" % (
+        ", ".join("%s:Bool" % li for li in labels), labels[-1],
+        ", ".join("%s=true" % li for li in labels))
+
+def record_fields(width):
+    """
+    Source of a projection from a record of 'width' fields that all
+    take a step to evaluate
+    """
+    return "{%s}.l0;" % ", ".join(
+        "l%d=(lambda x:Bool. x) true" % num for num in range(width))
+
+def checked(source, depth):
+    """
+    Workload type checking and evaluating the last command of 'source',
+    whose terms are nested 'depth' deep
+    """
+    ast = Parser().parse(source)
+    ctx = syntax.Context()
+    for cmd in ast[:-1]:
+        syntax.addbinding(ctx, cmd.name, cmd.binding)
+    term = ast[-1].term
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * depth + 100))
+
+    def run():
+        core.typeof(term, ctx)
+        return core.evaluate_steps(ctx, term).steps
+    return run
+
+WORKLOADS = {
+    "apps": (
+        lambda size: checked(applications(size), size), (100, 200, 400)),
+    "record": (lambda size: checked(wide_record(size), 1), (50, 100, 200)),
+    "fields": (
+        lambda size: checked(record_fields(size), 1), (50, 100, 200)),
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("benchmark", choices=["suite"])
+    arg_parser.add_argument("--size", type=int)
+    arg_parser.add_argument("--number", type=int)
+    benchmark.add_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    if args.benchmark == "suite":
+        benchmark.main("fullsimple", syntax, WORKLOADS, args)
+
+if __name__ == '__main__':
+    main()
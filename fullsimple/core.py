@@ -1,8 +1,7 @@
 from syntax import *
 # ------------------------   EVALUATION  ------------------------
 
-class NoRuleApplies(RuntimeError):
-    pass
+from common.evaluation import NoRuleApplies, run
 
 def isval(term):
     if type(term) is TmTrue:
@@ -12,12 +11,18 @@ def isval(term):
     elif isinstance(term, TmAbs):
         return True
     elif isinstance(term, TmRecord):
-        return all(map(lambda t: isval(t[1]), term.fields))
+        return term.fields.allvalues(isval)
     else:
         return False
 
 class Evaluate(Visitor):
-    
+
+    def visit_TmVar(term, ctx):
+        b = getbinding(ctx, term.index)
+        if type(b) is TmAbbBind:
+            return b.term
+        raise NoRuleApplies
+
     def visit_TmApp(term, ctx):
         if isval(term.left) and isval(term.right):
             return termSubstTop(term.right, term.left.term)
@@ -34,32 +39,29 @@ class Evaluate(Visitor):
         elif isinstance(term.term_condition, TmFalse):
             return term.term_else
         else:
-            new_term_condition = evaluate(ctx, term.term_condition)
+            new_term_condition = evaluate1(term.term_condition, ctx)
             return TmIf(
                 term.info,
                 new_term_condition,
                 term.term_then, term.term_else)
 
     def visit_TmRecord(term, ctx):
-        for (num, field) in enumerate(term.fields):
-            f_term = evaluate1(field[1], ctx)
-            term.fields[num] = (field[0], f_term)
-        return term
+        fields = term.fields.step(isval, lambda ti: evaluate1(ti, ctx))
+        if fields is None:
+            raise NoRuleApplies
+        return TmRecord(term.info, fields)
 
     def visit_TmProj(term, ctx):
-        if type(term.term) is TmRecord:
+        if type(term.term) is TmRecord and isval(term.term):
+            fields = term.term.fields
             if isinstance(term.name, int):
-                return term.term.fields[-term.name][1]
-            # lookup by name
-            # TODO: for increase perfomance may be used 'dict'
-            for (name, value) in reversed(term.term.fields):
-                if name == term.name:
-                    return value
-            raise NoRuleApplies("Not found")
+                return fields[-term.name][1]
+            value = fields.get(term.name)
+            if value is None:
+                raise NoRuleApplies("Not found")
+            return value
         else:
-            term.term = evaluate1(term.term, ctx)
-            return term
-        raise NoRuleApplies
+            return TmProj(term.info, evaluate1(term.term, ctx), term.name)
 
     def visit__(term, ctx):
         raise NoRuleApplies
@@ -68,11 +70,11 @@ class Evaluate(Visitor):
 evaluate1 = Evaluate.visit
 
 
+def evaluate_steps(ctx, term, max_steps=None, stop=isval):
+    return run(lambda t: evaluate1(t, ctx), term, stop, max_steps)
+
 def evaluate(ctx, term):
-    try:
-        return evaluate(ctx, evaluate1(term, ctx))
-    except NoRuleApplies:
-        return term
+    return evaluate_steps(ctx, term).term
 
 def evalbinding(ctx, b):
     type_b = type(b)
@@ -82,11 +84,9 @@ def evalbinding(ctx, b):
     return b
 
 def istyabb(ctx, i):
-    # FIXME: may be implement with using gettyabb
-    b = getbinding(ctx, i)
-    if isinstance(b, TyAbbBind):
-        return True
-    return False
+    # the kind of a binding does not depend on shifting
+    (_, b) = get_ctx_item(ctx, i)
+    return type(b) is TyAbbBind
 
 def gettyabb(ctx, i):
     b = getbinding(ctx, i)
@@ -101,16 +101,40 @@ def computety(ctx, tyT):
         raise NoRuleApplies
 
 def simplifyty(ctx, tyT):
-    # TODO: unfold into cycle
-    try:
-        tyT1 = computety(ctx, tyT)
-        return simplifyty(ctx, tyT1)
-    except NoRuleApplies:
-        return tyT
+    """
+    'tyT' with the abbreviations at its head expanded. Definitions come
+    from 'getbinding', so an abbreviation is only shifted once at each
+    depth and every expansion of it there is the same object
+    """
+    while type(tyT) is TyVar and istyabb(ctx, tyT.index):
+        tyT = gettyabb(ctx, tyT.index)
+    return tyT
+
+def fieldseqv(ctx, fieldsS, fieldsT):
+    """
+    Fields with the same labels and equivalent types, in any order
+    (see '11.8 Records')
+    """
+    if len(fieldsS) != len(fieldsT):
+        return False
+    if fieldsS.slots is fieldsT.slots:
+        # same labels in the same order
+        return all(
+            tyeqv(ctx, tySi, tyTi)
+            for ((_, tySi), (_, tyTi)) in zip(fieldsS, fieldsT))
+    for (li, tySi) in fieldsS:
+        tyTi = fieldsT.get(li)
+        if tyTi is None or not tyeqv(ctx, tySi, tyTi):
+            return False
+    return True
 
 def tyeqv(ctx, tyS, tyT):
+    if tyS is tyT:
+        return True
     tyS = simplifyty(ctx, tyS)
     tyT = simplifyty(ctx, tyT)
+    if tyS is tyT:
+        return True
     if type(tyS) == type(tyT):
 
         if type(tyS) is TyId:
@@ -118,16 +142,9 @@ def tyeqv(ctx, tyS, tyT):
         elif type(tyS) is TyVar:
             return tyS.index == tyT.index
         elif type(tyS) is TyArr:
-            return tyeqv(tyS.left, tyT.left) & tyeq(tyS.right, tyT.right)
+            return tyeqv(ctx, tyS.left, tyT.left) and tyeqv(ctx, tyS.right, tyT.right)
         elif type(tyS) is TyRecord:
-            if len(tyS.fields) != len(tyT.fields):
-                return False
-            # NOTE: positionally dependent
-            # See notes in 11.8 Records
-            for ((name1, tyS1), (name2,tyT1)) in zip(tyS.fields, tyT.fields):
-                if not tyeqv(ctx, tyS1, tyT1):
-                    return False
-            return True
+            return fieldseqv(ctx, tyS.fields, tyT.fields)
         elif type(tyS) is TyVariant:
             raise NotImplementedError(tyS, tyS)
         elif type(tyS) in [TyString, TyUnit, TyFloat, TyBool, TyNat]:
@@ -188,16 +205,15 @@ class Typeof(Visitor):
             raise RuntimeError(term.info, "guard of conditional not a boolean")
 
     def visit_TmRecord(term, ctx):
-        fieldtys = [(li, typeof(ti, ctx)) for li, ti in term.fields]
-        return TyRecord(fieldtys)
+        return TyRecord(term.fields.map(lambda ti: typeof(ti, ctx)))
 
     def visit_TmProj(term, ctx):
         s_term = simplifyty(ctx, typeof(term.term, ctx))
         if type(s_term) is not TyRecord:
             raise RuntimeError(term.info, "Expected record type")
-        for (name, tf) in s_term.fields:
-            if name == term.name: 
-                return tf
+        tf = s_term.fields.get(term.name)
+        if tf is not None:
+            return tf
         raise RuntimeError(
             term.info, "label " + str(term.name) + " not found")
 
@@ -208,10 +224,7 @@ class Typeof(Visitor):
         if type(s_term) is not TyVariant:
             raise RuntimeError(term.info, "Annotation is not a variant type")
 
-        tyTiExpected = None
-        for (name, tf) in s_term.fields:
-            if name == term.tag:
-                tyTiExpected = tf
+        tyTiExpected = s_term.fields.get(term.tag)
 
         if tyTiExpected is None:
             raise RuntimeError(
@@ -0,0 +1,11 @@
+"""
+Type erasure for fullsimple, see 'common.erasure'.
+"""
+
+import syntax
+import compiler
+from common.erasure import Erasure
+
+erasure = Erasure(syntax, compiler.compiler)
+erase = erasure.erase
+evaluate = erasure.evaluate
@@ -1,25 +1,35 @@
 import argparse
+import functools
+import sys
 
 from lexer import Lexer
 from parser import Parser
 import syntax
 import core
+from common import batch, stream, tables
+import compiler
+import erasure
 
-def prbindingty(b, ctx):
+engines = {
+    "subst": core.evaluate,
+    "compile": compiler.evaluate,
+}
+
+def prbindingty(b, ctx, out):
     type_b = type(b)
     if type_b in [syntax.NameBind, syntax.TyVarBind]:
         pass
     elif type_b is syntax.VarBind:
-        print(": ", end="")
-        syntax.printty(b.type, ctx)
+        out.append(": ")
+        syntax.printty(b.type, ctx, out)
     elif type_b is syntax.TmAbbBind:
-        print(": ", end="")
+        out.append(": ")
         if b.type is None:
-            syntax.printty(core.typeof(b.term, ctx), ctx)
+            syntax.printty(core.typeof(b.term, ctx), ctx, out)
         else:
-            syntax.printty(b.type, ctx)
+            syntax.printty(b.type, ctx, out)
     elif type_b is syntax.TyAbbBind:
-        print(":: *", end="")
+        out.append(":: *")
     else:
         raise NotImplementedError(b)
 
@@ -41,41 +51,67 @@ def checkbinding(b, ctx):
     raise NotImplementedError(b)
 
 
-def process_command(cmd, ctx):
+def process_command(cmd, ctx, evaluate=core.evaluate, erase=False):
+    out = []
     type_cmd = type(cmd)
     if type_cmd is syntax.Eval:
         term_type = core.typeof(cmd.term, ctx)
-        term = core.evaluate(ctx, cmd.term)
-        syntax.printtm(term, ctx)
-        print(": ", end="")
-        syntax.printty(term_type, ctx)
-        print("")
+        if erase:
+            term = erasure.evaluate(ctx, cmd.term, evaluate)
+        else:
+            term = evaluate(ctx, cmd.term)
+        syntax.printtm(term, ctx, out)
+        out.append(": ")
+        syntax.printty(term_type, ctx, out)
+        out.append("\n")
     elif type_cmd is syntax.Bind:
         bind = checkbinding(cmd.binding, ctx)
         bind = core.evalbinding(ctx, bind)
-        print(cmd.name, end="")
-        print(" ", end="")
-        prbindingty(bind, ctx)
-        print("")
+        out.append(cmd.name + " ")
+        prbindingty(bind, ctx, out)
+        out.append("\n")
         syntax.addbinding(ctx, cmd.name, bind)
+    sys.stdout.write("".join(out))
 
-def parse_file(f):
+def parse_file(f, parser=None):
     with open(f, 'r') as fd:
         text = fd.read()
-    parser = Parser()
+    if parser is None:
+        parser = Parser()
     return parser.parse(text, f)
 
-def process_file(f):
-    cmds = parse_file(f)
-    ctx = []
-    for cmd in cmds:
-        process_command(cmd, ctx)
+def process_file(f, evaluate=core.evaluate, parser=None, erase=False):
+    if parser is None:
+        parser = Parser()
+    ctx = syntax.Context()
+    with stream.open_input(f) as lines:
+        for cmd in stream.parse_stream(parser, lines, f):
+            process_command(cmd, ctx, evaluate, erase)
+            sys.stdout.flush()
+
+def check_file(args, f, parser):
+    """Process 'f' as requested by the command line options 'args'"""
+    process_file(f, engines[args.engine], parser=parser, erase=args.erase)
 
 def main():
     arg_parser = argparse.ArgumentParser()
-    arg_parser.add_argument("file", help="Input file")
+    batch.add_arguments(arg_parser)
+    arg_parser.add_argument(
+        "--engine", choices=sorted(engines), default="subst",
+        help="Evaluation engine: substitution-based small-step "
+             "evaluator or closures compiled from the checked term")
+    arg_parser.add_argument(
+        "--erase", action="store_true",
+        help="Erase the types of a checked term and run it untyped, "
+             "the result is shown without types")
+    tables.add_arguments(arg_parser)
     args = arg_parser.parse_args()
-    process_file(args.file)
+    make_parser = functools.partial(tables.make_parser, Parser, args)
+    check = functools.partial(check_file, args)
+    if batch.requested(args):
+        failed = batch.run(check, args.files, make_parser, args.jobs)
+        sys.exit(1 if failed else 0)
+    check(args.files[0], make_parser())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -4,11 +4,13 @@ import ply.yacc as yacc
 from lexer import Lexer
 
 import syntax
+from common import tables
+from common.record import Fields
 
 """
 Commands
             : Command SEMI
-            | Command SEMI Commands
+            | Commands Command SEMI
 
 Command
             : Term
@@ -114,14 +116,18 @@ class ParserException:
 
 class Parser:
 
-    def __init__(self, debug=False):
-        self.lexer = Lexer()
+    def __init__(self, debug=False, optimize=False):
+        if optimize:
+            lex_options, yacc_options = tables.options(Parser, Lexer)
+        else:
+            lex_options, yacc_options = {}, {}
+        self.lexer = Lexer(**lex_options)
         self.tokens = self.lexer.tokens
         self.debug = debug
-        self.parser = yacc.yacc(module=self, debug=debug)
+        self.parser = yacc.yacc(module=self, debug=debug, **yacc_options)
 
     def parse(self, text, filename="", ctx=None):
-        self._ctx = ctx or []
+        self._ctx = syntax.Context() if ctx is None else ctx
         self._scope_comma_cnt = []
         self.filename = filename
         return self.parser.parse(
@@ -133,9 +139,10 @@ class Parser:
         "Commands : Command SEMI"
         p[0] = [p[1]]
         
-    def p_Commands_Command_Commands(self, p):
-        "Commands : Command SEMI Commands"
-        p[0] = [p[1]] + p[3]
+    def p_Commands_Commands_Command(self, p):
+        "Commands : Commands Command SEMI"
+        p[1].append(p[2])
+        p[0] = p[1]
 
 # Command
 
@@ -188,7 +195,7 @@ class Parser:
 
     def p_AType_LT_FieldTypes_GT(self, p):
         "AType : LT AType_LT FieldTypes GT AType_GT"
-        p[0] = syntax.TyVariant(p[3])
+        p[0] = syntax.TyVariant(Fields(p[3]))
 
     def p_AType_USTRING(self, p):
         "AType : USTRING"
@@ -200,7 +207,7 @@ class Parser:
 
     def p_AType_LCURLY_FieldTypes_RCURLY(self, p):
         "AType : LCURLY AType_LCURLY FieldTypes RCURLY AType_RCURLY"
-        p[0] = syntax.TyRecord(p[3])
+        p[0] = syntax.TyRecord(Fields(p[3]))
 
     def p_AType_UFLOAT(self, p):
         "AType : UFLOAT"
@@ -437,7 +444,7 @@ class Parser:
 
     def p_ATerm_Fields(self, p):
         "ATerm : LCURLY ATerm_LCURLY Fields RCURLY ATerm_RCURLY"
-        p[0] = syntax.TmRecord(self._info(p), p[3])
+        p[0] = syntax.TmRecord(self._info(p), Fields(p[3]))
 
     def p_ATerm_FLOATV(self, p):
         "ATerm : FLOATV"
@@ -1,20 +1,31 @@
+import os
+import sys
 from collections import namedtuple
+from contextlib import contextmanager
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from common.context import Context, as_context, binding_memo
+from common.intern import internedtuple
+from common.record import Fields
+from common.substitution import substtop_onvar
+from common.visitor import Visitor
 
 # ----------------------------------------------------------------------
 # Datatypes
 
 # Types
 
-TyVar = namedtuple("TyVar", ["index", "ctxlength"])
-TyId = namedtuple("TyId", ["name"])
-TyArr = namedtuple("TyArr", ["left", "right"])
-TyUnit = namedtuple("TyUnit", [])
-TyRecord = namedtuple("TyRecord", ["fields"])
-TyVariant = namedtuple("TyVariant", ["fields"])
-TyBool = namedtuple("TyBool", [])
-TyString = namedtuple("TyString", [])
-TyFloat = namedtuple("TyFloat", [])
-TyNat = namedtuple("TyNat", [])
+TyVar = internedtuple("TyVar", ["index", "ctxlength"])
+TyId = internedtuple("TyId", ["name"])
+TyArr = internedtuple("TyArr", ["left", "right"])
+TyUnit = internedtuple("TyUnit", [])
+TyRecord = internedtuple("TyRecord", ["fields"])
+TyVariant = internedtuple("TyVariant", ["fields"])
+TyBool = internedtuple("TyBool", [])
+TyString = internedtuple("TyString", [])
+TyFloat = internedtuple("TyFloat", [])
+TyNat = internedtuple("TyNat", [])
 
 # Terms
 
@@ -64,17 +75,26 @@ def addbinding(ctx, name, bind):
 def addname(ctx, name):
     return addbinding(ctx, name, NameBind())
 
+@contextmanager
+def mgr_addbinding(ctx, name, bind):
+    addbinding(ctx, name, bind)
+    try:
+        yield
+    finally:
+        ctx.pop()
+
 def isnamebound(ctx, name):
-    for ctx_name, _ in ctx:
-        if ctx_name == name:
-            return True
-    return False
+    return ctx.isnamebound(name)
 
-def pickfreshname(ctx, name):
-    new_name = str(name)
-    while isnamebound(ctx, new_name):
-        new_name += "'"
-    return ctx + [(new_name, NameBind())], new_name
+@contextmanager
+def mgr_pickfreshname(ctx, name):
+    """Bind a fresh variant of 'name' while the block runs"""
+    new_name = ctx.freshname(name)
+    addname(ctx, new_name)
+    try:
+        yield new_name
+    finally:
+        ctx.pop()
 
 def get_ctx_item(ctx, index):
     try:
@@ -89,15 +109,28 @@ def index2name(ctx, index):
     return name
 
 def name2index(ctx, name):
-    for index, (v, _) in enumerate(reversed(ctx)):
-        if name == v:
-            return index
-    raise ValueError("Identifier '%s' is unbound" % name)
+    return ctx.name2index(name)
 
 # ----------------------------------------------------------------------
 # Shifting
 
 def tymap(onvar, c, tyT):
+    """
+    Map 'onvar' over the type variables of 'tyT'. Parts without type
+    variables are returned as they are, so mapping over a type without
+    any allocates nothing
+    """
+    def walk_fields(c, fields):
+        """The mapped fields, None when no field changes"""
+        for (num, (li, tyTi)) in enumerate(fields):
+            new_tyTi = walk(c, tyTi)
+            if new_tyTi is not tyTi:
+                values = [tyTj for (_, tyTj) in fields[:num]]
+                values.append(new_tyTi)
+                values.extend(walk(c, tyTj) for (_, tyTj) in fields[num+1:])
+                return fields.replace(values)
+        return None
+
     def walk(c, tyT):
         t_tyT = type(tyT)
         if t_tyT is TyVar:
@@ -109,8 +142,8 @@ def tymap(onvar, c, tyT):
         elif t_tyT is TyUnit:
             return tyT
         elif t_tyT is TyRecord:
-            fields = [(li, walk(c, tyTi)) for li, tyTi in tyT.fields]
-            return TyRecord(fields)
+            fields = walk_fields(c, tyT.fields)
+            return tyT if fields is None else TyRecord(fields)
         elif t_tyT is TyFloat:
             return tyT
         elif t_tyT is TyBool:
@@ -120,10 +153,12 @@ def tymap(onvar, c, tyT):
         elif t_tyT is TyArr:
             left = walk(c, tyT.left)
             right = walk(c, tyT.right)
+            if left is tyT.left and right is tyT.right:
+                return tyT
             return TyArr(left, right)
         elif t_tyT is TyVariant:
-            fields = [(li, walk(c, tyTi)) for li, tyTi in tyT.fields]
-            return TyVariant(fields)
+            fields = walk_fields(c, tyT.fields)
+            return tyT if fields is None else TyVariant(fields)
 
     return walk(c, tyT)
 
@@ -149,8 +184,7 @@ def tmmap(onvar, c, t):
                 walk(c, t.term_then),
                 walk(c, t.term_else))
         elif ty_t is TmRecord:
-                fields = [(li, walk(c, ti)) for li, ti in t.fields]
-                return TmRecord(t.info, fields)
+            return TmRecord(t.info, t.fields.map(lambda ti: walk(c, ti)))
         elif ty_t is TmTag:
             return TmTag(
                 t.info,
@@ -158,7 +192,7 @@ def tmmap(onvar, c, t):
                 walk(c, t.term),
                 ontype(c, t.type))
         elif ty_t is TmProj:
-            pass
+            return TmProj(t.info, walk(c, t.term), t.name)
         raise NotImplementedError(t)
     return walk(c, t)
 
@@ -206,14 +240,25 @@ def termSubst(j, s, t):
     )
 
 def termSubstTop(s, t):
-    return termShift(-1, termSubst(0, termShift(1, s), t))
+    onvar = substtop_onvar(TmVar, termShift, s)
+    return tmmap(onvar, 0, t)
 
 # ----------------------------------------------------------------------
 # Context management (continued)
 
 def getbinding(ctx, index):
-    (_, binding) = get_ctx_item(ctx, index)
-    return bindingshift(index+1, binding)
+    """
+    The binding at 'index', shifted into the current context. The shifted
+    binding is memoized with the binding, per index it is looked up by,
+    so a variable is shifted once at each depth
+    """
+    memo = binding_memo(ctx, index)
+    try:
+        return memo[index]
+    except KeyError:
+        (_, binding) = get_ctx_item(ctx, index)
+        binding = memo[index] = bindingshift(index+1, binding)
+        return binding
 
 def getTypeFromContext(ctx, index):
     binding = getbinding(ctx, index)
@@ -239,132 +284,158 @@ class Info(namedtuple("Info", ["filename", "lineno"])):
         return '<%s:%s>' % self
 
 
-class Visitor:
-
-    @classmethod
-    def visit(cls, term, *args, **kwargs):
-        method_name = 'visit_' + term.__class__.__name__
-        method = getattr(cls, method_name, getattr(cls, 'visit__', None))
-
-        if method is None:
-            raise AttributeError(
-                "type object '%s' has no attribute '%s'" %
-                (cls.__name__, method_name))
-        return method(term, *args, **kwargs)
-
-
 class TypesPrinter(Visitor):
+    """Appends the text of a type to the list of chunks 'out'"""
 
-    def visit_TyVar(self, ctx):
+    def visit_TyVar(self, ctx, out):
         if len(ctx) == self.ctxlength:
-            print(index2name(ctx, self.index), end="")
+            out.append(index2name(ctx, self.index))
         else:
-            print(
+            out.append(
                 "[bad index: " + str(self.index) + "/" + str(self.ctxlength)
-                + " in {" + " ".join(map(str, ctx)) + " }]")
+                + " in {" + " ".join(map(str, ctx)) + " }]\n")
 
-    def visit_TyId(self, ctx):
+    def visit_TyId(self, ctx, out):
         raise NotImplementedError()
 
-    def visit_TyArr(self, ctx):
-        printty(self.left, ctx)
-        print(" -> ", end="")
-        printty(self.right, ctx)
+    def visit_TyArr(self, ctx, out):
+        TypesPrinter.visit(self.left, ctx, out)
+        out.append(" -> ")
+        TypesPrinter.visit(self.right, ctx, out)
 
-    def visit_TyUnit(self,ctx):
-        print("Unit", end="")
+    def visit_TyUnit(self, ctx, out):
+        out.append("Unit")
 
-    def visit_TyRecord(self, ctx):
-        print("{", end="")
+    def visit_TyRecord(self, ctx, out):
+        out.append("{")
         fields_length = len(self.fields)-1
         for (num, (name, tyT)) in enumerate(reversed(self.fields)):
             if type(name) is str:
-                print(name + ":", end="")
-            printty(tyT, ctx)
+                out.append(name + ":")
+            TypesPrinter.visit(tyT, ctx, out)
             if num < fields_length:
-                print(",", end="")
-        print("}", end="")
+                out.append(",")
+        out.append("}")
 
-    def visit_TyVariant(self, ctx):
-        print("<", end="")
+    def visit_TyVariant(self, ctx, out):
+        out.append("<")
         fields_length = len(self.fields)-1
         for (num, (name, tyT)) in enumerate(reversed(self.fields)):
-            print(name + ":", end="")
-            printty(tyT, ctx)
+            out.append(name + ":")
+            TypesPrinter.visit(tyT, ctx, out)
             if num < fields_length:
-                print(",", end="")
-        print(">", end="")
+                out.append(",")
+        out.append(">")
 
-    def visit_TyBool(self, ctx):
-        print("Bool", end="")
+    def visit_TyBool(self, ctx, out):
+        out.append("Bool")
 
-    def visit_TyString(self, ctx):
-        print("String", end="")
+    def visit_TyString(self, ctx, out):
+        out.append("String")
 
-    def visit_TyFloat(self, ctx):
-        print("Float", end="")
+    def visit_TyFloat(self, ctx, out):
+        out.append("Float")
 
-    def visit_TyNat(self, ctx):
-        print("Nat", end="")
+    def visit_TyNat(self, ctx, out):
+        out.append("Nat")
 
-printty = TypesPrinter.visit
+def format_type(ctx, tyT):
+    out = []
+    TypesPrinter.visit(tyT, as_context(ctx), out)
+    return "".join(out)
+
+def printty(tyT, ctx, out=None):
+    """
+    Append the text of 'tyT' to 'out', or write it to the standard
+    output at once when 'out' is not given
+    """
+    if out is None:
+        sys.stdout.write(format_type(ctx, tyT))
+    else:
+        TypesPrinter.visit(tyT, as_context(ctx), out)
 
 class TermsPrinter(Visitor):
+    """Appends the text of a term to the list of chunks 'out'"""
 
-    def visit_TmVar(self, ctx):
+    def visit_TmVar(self, ctx, out):
         if len(ctx) == self.ctxlength:
-            print(index2name(ctx, self.index), end="")
+            out.append(index2name(ctx, self.index))
         else:
-            print(
+            out.append(
                 "[bad index: " + str(self.index) + "/" + str(self.ctxlength)
-                + " in {" + " ".join(map(str, ctx)) + " }]")
-
-    def visit_TmAbs(self, ctx):
-        (new_ctx, name) = pickfreshname(ctx, self.name)
-        print("(", end="")
-        print("lambda %s" % name, end="")
-        print(": ", end="")
-        printty(self.type, ctx)
-        print(" . ", end="")
-        printtm(self.term, new_ctx)
-        print(")", end="")
-
-    def visit_TmApp(self, ctx):
-        print("(", end="")
-        printtm(self.left, ctx)
-        print(" ", end="")
-        printtm(self.right, ctx)
-        print(")", end="")
-
-    def visit_TmTrue(self, ctx):
-        print("true", end="")
-
-    def visit_TmFalse(self, ctx):
-        print("false", end="")
-
-    def visit_TmTag(self, ctx):
-        print("Tag", self)
-
-    def visit_TmIf(self, ctx):
-        print("if", end="")
-        printtm(self.term_condition)
-        print(" then ", end="")
-        printtm(self.term_then)
-        print(" else")
-
-    def visit_TmString(self, ctx):
-        print("\"" + self.value + "\"", end="")
-
-    def visit_TmRecord(self, ctx):
-        print("{", end="")
+                + " in {" + " ".join(map(str, ctx)) + " }]\n")
+
+    def visit_TmAbs(self, ctx, out):
+        # the type of the variable is outside of its scope
+        name = ctx.freshname(self.name)
+        if self.type is None:
+            # erased, see 'common.erasure'
+            out.append("(lambda %s" % name)
+        else:
+            out.append("(lambda %s: " % name)
+            TypesPrinter.visit(self.type, ctx, out)
+        out.append(" . ")
+        with mgr_addbinding(ctx, name, NameBind()):
+            TermsPrinter.visit(self.term, ctx, out)
+        out.append(")")
+
+    def visit_TmApp(self, ctx, out):
+        out.append("(")
+        TermsPrinter.visit(self.left, ctx, out)
+        out.append(" ")
+        TermsPrinter.visit(self.right, ctx, out)
+        out.append(")")
+
+    def visit_TmTrue(self, ctx, out):
+        out.append("true")
+
+    def visit_TmFalse(self, ctx, out):
+        out.append("false")
+
+    def visit_TmTag(self, ctx, out):
+        out.append("<" + self.tag + "=")
+        TermsPrinter.visit(self.term, ctx, out)
+        out.append("> as ")
+        TypesPrinter.visit(self.type, ctx, out)
+
+    def visit_TmIf(self, ctx, out):
+        out.append("if ")
+        TermsPrinter.visit(self.term_condition, ctx, out)
+        out.append(" then ")
+        TermsPrinter.visit(self.term_then, ctx, out)
+        out.append(" else ")
+        TermsPrinter.visit(self.term_else, ctx, out)
+
+    def visit_TmString(self, ctx, out):
+        out.append("\"" + self.value + "\"")
+
+    def visit_TmRecord(self, ctx, out):
+        out.append("{")
         fields_length = len(self.fields)-1
         for (num, (name, term)) in enumerate(reversed(self.fields)):
             if type(name) is str:
-                print(name + "=", end="")
-            printtm(term, ctx)
+                out.append(name + "=")
+            TermsPrinter.visit(term, ctx, out)
             if num < fields_length:
-                print(",", end="")
-        print("}", end="")
-
-
-printtm = TermsPrinter.visit
+                out.append(",")
+        out.append("}")
+
+    def visit_TmProj(self, ctx, out):
+        TermsPrinter.visit(self.term, ctx, out)
+        out.append("." + str(self.name))
+
+
+def format_term(ctx, term):
+    out = []
+    TermsPrinter.visit(term, as_context(ctx), out)
+    return "".join(out)
+
+def printtm(term, ctx, out=None):
+    """
+    Append the text of 'term' to 'out', or write it to the standard
+    output at once when 'out' is not given
+    """
+    if out is None:
+        sys.stdout.write(format_term(ctx, term))
+    else:
+        TermsPrinter.visit(term, as_context(ctx), out)
@@ -1,8 +1,13 @@
+import io
 import unittest
+from unittest import mock
 from parser import Parser
 from lexer import Lexer
 import syntax
 import core
+import compiler
+import erasure
+import main
 
 class LexerTestCase(unittest.TestCase):
 
@@ -223,6 +228,50 @@ class TypeOfTestCase(unittest.TestCase):
     def setUp(self):
         self.parser = Parser()
 
+    def test_abbreviation(self):
+        ctx = syntax.Context()
+        ast = self.parser.parse(
+            "R = {a:Bool, b:String}; F = R -> String;"
+            " (lambda f:F. f {a=true, b=\"b\"}) (lambda r:R. r.b);", ctx=ctx)
+        self.assertIs(core.typeof(ast[2].term, ctx), syntax.TyString())
+
+        # the expansion is shifted once per depth and dropped on pop
+        tyF = core.simplifyty(ctx, syntax.TyVar(0, 2))
+        self.assertIs(core.simplifyty(ctx, syntax.TyVar(0, 2)), tyF)
+        self.assertEqual(tyF.left, syntax.TyVar(1, 2))
+        syntax.addbinding(ctx, "x", syntax.NameBind())
+        self.assertEqual(
+            core.simplifyty(ctx, syntax.TyVar(1, 3)).left,
+            syntax.TyVar(2, 3))
+        ctx.pop()
+        self.assertIs(core.simplifyty(ctx, syntax.TyVar(0, 2)), tyF)
+
+    def test_getbinding(self):
+        ctx = syntax.Context()
+        self.parser.parse(
+            "x:{a:Bool, b:String->Bool}; Y = Bool; F = Y -> Y;", ctx=ctx)
+        # shifting a type without variables keeps it as it is
+        tyT = ctx[0][1].type
+        self.assertIs(syntax.getbinding(ctx, 2).type, tyT)
+        tyF = syntax.getbinding(ctx, 0).type
+        self.assertEqual(tyF.left, syntax.TyVar(1, 3))
+        self.assertIs(syntax.getbinding(ctx, 0).type, tyF)
+
+    def test_record_labels(self):
+        ast = self.parser.parse(
+            "(lambda r:{y:String, x:Bool}. r.x) {x=true, y=\"y\"};"
+            " (lambda r:{y:Bool, z:Bool}. r.y) {x=true, y=false};")
+        ctx = []
+        self.assertIs(core.typeof(ast[0].term, ctx), syntax.TyBool())
+        with self.assertRaises(RuntimeError):
+            core.typeof(ast[1].term, ctx)
+
+        # the type of a record shares the index of its labels
+        record = ast[0].term.right
+        tyT = core.typeof(record, ctx)
+        self.assertIs(tyT.fields.slots, record.fields.slots)
+        self.assertIs(tyT.fields.get("x"), syntax.TyBool())
+
     def test_record_type_mismatch(self):
         ast = self.parser.parse(
             "(lambda x:{Bool, Bool}. x.1) true;")
@@ -261,5 +310,153 @@ class EvaluateTestCase(unittest.TestCase):
         self.assertIsInstance(term.fields[0][1], syntax.TmFalse)
         self.assertIsInstance(term.fields[1][1], syntax.TmTrue)
 
+    def test_record_steps(self):
+        ast = self.parser.parse(
+            "{a=true, b=(lambda x:Bool. x) false,"
+            " c=(lambda x:Bool. x) true}.c;")
+        term = ast[0].term
+        result = core.evaluate_steps([], term, max_steps=1)
+        record = result.term.term
+        self.assertIsInstance(record.fields.get("b"), syntax.TmFalse)
+        self.assertIsInstance(record.fields.get("c"), syntax.TmApp)
+        # the evaluated fields are shared, the parsed term is unchanged
+        self.assertIs(record.fields[-1], term.term.fields[-1])
+        self.assertIsInstance(term.term.fields.get("b"), syntax.TmApp)
+
+        result = core.evaluate_steps([], term)
+        self.assertEqual(result.steps, 3)
+        self.assertIsInstance(result.term, syntax.TmTrue)
+
+class CompilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def assertSameAsSubst(self, source):
+        # evaluation never changes a term, both engines run the same one
+        ctx = []
+        ast = self.parser.parse(source)
+        for cmd in ast[:-1]:
+            syntax.addbinding(ctx, cmd.name, cmd.binding)
+        term = ast[-1].term
+        expected = core.evaluate(ctx, term)
+        result = compiler.evaluate(ctx, term)
+        self.assertEqual(result, expected)
+        return result
+
+    def test_abs_app(self):
+        self.assertSameAsSubst(
+            "(lambda f:Bool->Bool. lambda x:Bool. f (f x))"
+            "(lambda y:Bool. if y then false else true);")
+        self.assertSameAsSubst(
+            "(lambda f:Bool->Bool. lambda x:Bool. f (f x))"
+            "(lambda y:Bool. if y then false else true) true;")
+
+    def test_if(self):
+        result = self.assertSameAsSubst(
+            "if (lambda x:Bool. x) true then false else true;")
+        self.assertIsInstance(result, syntax.TmFalse)
+
+    def test_free_variable(self):
+        # variables are not values, so both engines leave it stuck
+        result = self.assertSameAsSubst("x:Bool; (lambda y:Bool. y) x;")
+        self.assertIsInstance(result, syntax.TmApp)
+
+    def test_abbreviation(self):
+        source = "not = lambda b:Bool. if b then false else true; x:Bool;"
+        result = self.assertSameAsSubst(source + "not (not true);")
+        self.assertIsInstance(result, syntax.TmTrue)
+        # the variables of the context are read back by name
+        self.assertSameAsSubst(source + "lambda y:Bool. not x;")
+        self.assertSameAsSubst(source + "not x;")
+
+    def test_record(self):
+        result = self.assertSameAsSubst(
+            "{(lambda x:Bool. x) true, (lambda x:Bool. x) false};")
+        self.assertIsInstance(result, syntax.TmRecord)
+        self.assertSameAsSubst(
+            "(lambda r:{a:Bool, b:Bool}. lambda x:Bool. r.b) {a=true, b=false};")
+
+    def test_proj(self):
+        result = self.assertSameAsSubst("{true, false}.1;")
+        self.assertIsInstance(result, syntax.TmTrue)
+        self.assertSameAsSubst("{x=true, y=false}.y;")
+        self.assertSameAsSubst("{x=true, x=false}.x;")
+
+
+class ErasureTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def test_erase(self):
+        ast = self.parser.parse(
+            "(lambda f:Bool->Bool. f) ((lambda x:Bool. x) as Bool->Bool);")
+        term = erasure.erase(ast[0].term)
+        self.assertIsNone(term.left.type)
+        self.assertEqual(
+            syntax.format_term([], term), "((lambda f . f) (lambda x . x))")
+
+    def test_evaluate(self):
+        source = (
+            "(lambda f:Bool->Bool. lambda x:Bool. f (f x))"
+            "(lambda y:Bool. if y then false else true);")
+        term = self.parser.parse(source)[0].term
+        result = erasure.evaluate([], term, core.evaluate)
+        self.assertEqual(
+            syntax.format_term([], result),
+            "(lambda x . ((lambda y . if y then false else true) "
+            "((lambda y . if y then false else true) x)))")
+        term = self.parser.parse("{(lambda x:Bool. x) true, false}.1;")[0].term
+        result = erasure.evaluate([], term, core.evaluate)
+        self.assertIsInstance(result, syntax.TmTrue)
+
+    def test_fallback(self):
+        ctx = []
+        ast = self.parser.parse("x:Bool; (lambda y:Bool. y) x;")
+        syntax.addbinding(ctx, ast[0].name, ast[0].binding)
+        result = erasure.evaluate(ctx, ast[1].term, core.evaluate)
+        self.assertEqual(result, core.evaluate(ctx, ast[1].term))
+
+
+class PrinterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def test_format_term(self):
+        ast = self.parser.parse(
+            "lambda r:{a:Bool, Bool}. if r.a then {b=\"s\", r.2} else r;")
+        term = ast[0].term
+        self.assertEqual(
+            syntax.format_term([], term),
+            "(lambda r: {a:Bool,Bool} . "
+            "if r.a then {b=\"s\",r.2} else r)")
+
+    def test_format_shadowed_abstraction(self):
+        ast = self.parser.parse("X; x:X; lambda x:X. x;")
+        self.assertEqual(
+            syntax.format_term(self.parser._ctx, ast[2].term),
+            "(lambda x': X . x')")
+
+    def test_format_type(self):
+        ast = self.parser.parse("lambda r:{a:Bool, Bool}. {r.2, r};")
+        self.assertEqual(
+            syntax.format_type([], core.typeof(ast[0].term, [])),
+            "{a:Bool,Bool} -> {Bool,{a:Bool,Bool}}")
+
+    def test_single_write(self):
+        stdout = io.StringIO()
+        with mock.patch("sys.stdout", stdout), \
+                mock.patch.object(stdout, "write", wraps=stdout.write) as write:
+            ctx = []
+            for cmd in self.parser.parse("x:Bool; {x, lambda y:Bool. x};"):
+                main.process_command(cmd, ctx)
+        self.assertEqual(write.call_count, 2)
+        self.assertEqual(
+            stdout.getvalue(),
+            "x : Bool\n"
+            "{x,(lambda y: Bool . x)}: {Bool,Bool -> Bool}\n")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
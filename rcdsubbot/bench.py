@@ -0,0 +1,72 @@
+"""
+Benchmarks for rcdsubbot.
+
+    python bench.py suite --json results.json
+"""
+
+import argparse
+import sys
+
+from parser import Parser
+import syntax
+import core
+from common import benchmark
+
+def wide_record(width):
+    """
+    Source of a record of 'width' fields passed to a function whose
+    parameter type lists the same fields in the reverse order
+    """
+    labels = ["l%d" % num for num in range(width)]
+    return "(lambda r:{%s}. r.%s) {%s};" % (
+        ", ".join("%s:Top->Top" % li for li in reversed(labels)), labels[0],
+        ", ".join("%s=lambda x:Top. x" % li for li in labels))
+
+def applications(depth):
+    """Source of 'depth' nested applications of the identity on 'Top'"""
+    return "(lambda f:Top->Top. %slambda y:Top. y%s) (lambda x:Top. x);" % (
+        "f (" * depth, ")" * depth)
+
+def if_tree(depth, num=0):
+    """
+    Source of a balanced 'if' tree with 2^depth records as leaves, of
+    eight shapes that all have the field 'c'
+    """
+    if depth == 0:
+        return "{c=lambda x:Top. x, l%d=true}" % (num % 8)
+    return "(if true then %s else %s)" % (
+        if_tree(depth - 1, 2 * num), if_tree(depth - 1, 2 * num + 1))
+
+def checked(source, depth):
+    """
+    Workload type checking and evaluating 'source', whose terms are
+    nested 'depth' deep
+    """
+    (cmd,) = Parser().parse(source)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * depth + 100))
+
+    def run():
+        core.typeof(cmd.term, [])
+        return core.evaluate_steps([], cmd.term).steps
+    return run
+
+WORKLOADS = {
+    "record": (lambda size: checked(wide_record(size), 1), (50, 100, 200)),
+    "apps": (
+        lambda size: checked(applications(size), size), (100, 200, 400)),
+    "if": (
+        lambda size: checked(if_tree(size) + ";", size), (6, 8, 10)),
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("benchmark", choices=["suite"])
+    arg_parser.add_argument("--size", type=int)
+    arg_parser.add_argument("--number", type=int)
+    benchmark.add_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    if args.benchmark == "suite":
+        benchmark.main("rcdsubbot", syntax, WORKLOADS, args)
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,17 @@
+from collections import OrderedDict
+
 from syntax import *
 
-class NoRuleApplies(RuntimeError):
-    pass
+from common.evaluation import NoRuleApplies, run
+from common.record import Fields
 
 # ------------------------   EVALUATION  ------------------------
 
 def isval(term):
-    if type(term) is TmAbs:
+    if type(term) in (TmAbs, TmTrue, TmFalse):
         return True
     if type(term) is TmRecord:
-        return all(map(lambda t: isval(t[1]), term.fields))
+        return term.fields.allvalues(isval)
     return False
 
 class Evaluate(Visitor):
@@ -24,26 +26,31 @@ class Evaluate(Visitor):
             left = evaluate1(term.left, ctx)
             return TmApp(term.info, left, term.right)
 
+    def visit_TmIf(term, ctx):
+        if type(term.term_condition) is TmTrue:
+            return term.term_then
+        elif type(term.term_condition) is TmFalse:
+            return term.term_else
+        condition = evaluate1(term.term_condition, ctx)
+        return TmIf(term.info, condition, term.term_then, term.term_else)
+
     def visit_TmRecord(term, ctx):
-        for (num, field) in enumerate(term.fields):
-            f_term = evaluate1(field[1], ctx)
-            term.fields[num] = (field[0], f_term)
-        return term
+        fields = term.fields.step(isval, lambda ti: evaluate1(ti, ctx))
+        if fields is None:
+            raise NoRuleApplies
+        return TmRecord(term.info, fields)
 
     def visit_TmProj(term, ctx):
-        if type(term.term) is TmRecord:
+        if type(term.term) is TmRecord and isval(term.term):
+            fields = term.term.fields
             if isinstance(term.name, int):
-                return term.term.fields[-term.name][1]
-            # lookup by name
-            # TODO: for increase perfomance may be used 'dict'
-            for (name, value) in reversed(term.term.fields):
-                if name == term.name:
-                    return value
-            raise NoRuleApplies("Not found")
+                return fields[-term.name][1]
+            value = fields.get(term.name)
+            if value is None:
+                raise NoRuleApplies("Not found")
+            return value
         else:
-            term.term = evaluate1(term.term, ctx)
-            return term
-        raise NoRuleApplies
+            return TmProj(term.info, evaluate1(term.term, ctx), term.name)
 
     def visit__(term, ctx):
         raise NoRuleApplies
@@ -52,70 +59,249 @@ class Evaluate(Visitor):
 evaluate1 = Evaluate.visit
 
 
+def evaluate_steps(ctx, term, max_steps=None, stop=isval):
+    return run(lambda t: evaluate1(t, ctx), term, stop, max_steps)
+
 def evaluate(ctx, term):
-    try:
-        return evaluate(ctx, evaluate1(term, ctx))
-    except NoRuleApplies:
-        return term
+    return evaluate_steps(ctx, term).term
 
 # ------------------------   SUBTYPING  ------------------------
 
-def subtype(tyS, tyT):
-    t_tyS = type(tyS)
-    t_tyT = type(tyT)
+class Subtyping:
+    """
+    Subtype checks of one type-checking session.
+
+    The result for every pair (S, T) checked is memoized, so the pairs
+    met again, such as the fields of a record type that appears in
+    several applications, are answered at once. Pairs are keyed by
+    identity: types are interned, so equal types are the same object.
+    Types are closed, so a result holds for the whole session.
+
+    A pair is assumed to hold while it is being checked, so that with
+    recursive types a check that comes back to the same pair succeeds
+    (co-inductively, see '21.5 Subtyping Algorithm') instead of looping.
+    A success that rests on the assumption for a pair still being
+    checked is only memoized once that pair is; failures hold whatever
+    was assumed.
+
+    Joins and meets (see '16.3 Joins and Meets') are kept in a cache of
+    the 'lattice_size' pairs used last, keyed by identity like the memo.
+    With 'Top' and 'Bot' every pair of types has both.
+    """
+
+    lattice_size = 1024
+
+    def __init__(self):
+        # (id(S), id(T)) -> (S, T, S <: T)
+        self.memo = {}
+        # pairs being checked -> their depth
+        self.pending = {}
+        # the lowest depth of the assumptions used
+        self.assumed = None
+        # (operation, id(S), id(T)) -> (S, T, result), least recently
+        # used first
+        self.lattice = OrderedDict()
+
+    def subtype(self, tyS, tyT):
+        if tyS is tyT:
+            return True
+
+        t_tyS = type(tyS)
+        t_tyT = type(tyT)
+
+        if t_tyT is TyTop:
+            return True
+
+        if t_tyS is TyBot:
+            return True
+
+        key = (id(tyS), id(tyT))
+        hit = self.memo.get(key)
+        if hit is not None:
+            return hit[2]
+        depth = self.pending.get(key)
+        if depth is not None:
+            if self.assumed is None or depth < self.assumed:
+                self.assumed = depth
+            return True
+
+        depth = len(self.pending)
+        self.pending[key] = depth
+        try:
+            result = self.check(tyS, tyT)
+        finally:
+            del self.pending[key]
+        if self.assumed is None or self.assumed >= depth:
+            self.assumed = None
+            self.memo[key] = (tyS, tyT, result)
+        elif not result:
+            self.memo[key] = (tyS, tyT, result)
+        return result
+
+    def check(self, tyS, tyT):
+        t_tyS = type(tyS)
+        t_tyT = type(tyT)
+
+        if t_tyS is TyArr and t_tyT is TyArr:
+            """ contravariant
+            T1 <: S1
+            S2 <: T2
+            --------
+            S1->S2 <: T1->T2
+
+            (see '15.2 The Subtype Relation' page 184)
+            """
+            return (
+                self.subtype(tyT.left, tyS.left) and
+                self.subtype(tyS.right, tyT.right))
+
+        if t_tyS is TyRecord and t_tyT is TyRecord:
+            """ width, depth and permutation
+            for each label li of T: li is in S and Si <: Ti
+            """
+            fieldsS = tyS.fields
+            for (nameT, tyTi) in tyT.fields:
+                tySi = fieldsS.get(nameT)
+                if tySi is None or not self.subtype(tySi, tyTi):
+                    return False
+            return True
+
+        return False
+
+    def cached(self, operation, compute, tyS, tyT):
+        key = (operation, id(tyS), id(tyT))
+        lattice = self.lattice
+        hit = lattice.get(key)
+        if hit is not None:
+            lattice.move_to_end(key)
+            return hit[2]
+        result = compute(tyS, tyT)
+        lattice[key] = (tyS, tyT, result)
+        while len(lattice) > self.lattice_size:
+            lattice.popitem(last=False)
+        return result
+
+    def join(self, tyS, tyT):
+        """The least common supertype of 'tyS' and 'tyT'"""
+        if self.subtype(tyS, tyT):
+            return tyT
+        if self.subtype(tyT, tyS):
+            return tyS
+        return self.cached("join", self.compute_join, tyS, tyT)
+
+    def meet(self, tyS, tyT):
+        """The greatest common subtype of 'tyS' and 'tyT'"""
+        if self.subtype(tyS, tyT):
+            return tyS
+        if self.subtype(tyT, tyS):
+            return tyT
+        return self.cached("meet", self.compute_meet, tyS, tyT)
+
+    def compute_join(self, tyS, tyT):
+        t_tyS = type(tyS)
+        t_tyT = type(tyT)
+
+        if t_tyS is TyArr and t_tyT is TyArr:
+            return TyArr(
+                self.meet(tyS.left, tyT.left),
+                self.join(tyS.right, tyT.right))
+
+        if t_tyS is TyRecord and t_tyT is TyRecord:
+            # the labels of both, in the order of S
+            fields = []
+            for (li, tySi) in first_fields(tyS.fields):
+                tyTi = tyT.fields.get(li)
+                if tyTi is not None:
+                    fields.append((li, self.join(tySi, tyTi)))
+            fields.reverse()
+            return TyRecord(Fields(fields))
+
+        return TyTop()
+
+    def compute_meet(self, tyS, tyT):
+        t_tyS = type(tyS)
+        t_tyT = type(tyT)
+
+        if t_tyS is TyArr and t_tyT is TyArr:
+            return TyArr(
+                self.join(tyS.left, tyT.left),
+                self.meet(tyS.right, tyT.right))
+
+        if t_tyS is TyRecord and t_tyT is TyRecord:
+            # the labels of either, those of S first
+            fields = []
+            for (li, tySi) in first_fields(tyS.fields):
+                tyTi = tyT.fields.get(li)
+                if tyTi is not None:
+                    tySi = self.meet(tySi, tyTi)
+                fields.append((li, tySi))
+            for (li, tyTi) in first_fields(tyT.fields):
+                if li not in tyS.fields.slots:
+                    fields.append((li, tyTi))
+            fields.reverse()
+            return TyRecord(Fields(fields))
+
+        return TyBot()
+
+def first_fields(fields):
+    """
+    The fields of 'fields' from left to right, without those hidden by
+    a field with the same label on their left
+    """
+    slots = fields.slots
+    for slot in range(len(fields) - 1, -1, -1):
+        li = fields[slot][0]
+        if slots[li] == slot:
+            yield fields[slot]
 
-    if t_tyT is TyTop:
-        return True
-
-    if t_tyS is TyBot:
-        return True
-
-    if t_tyS is TyArr and t_tyT is TyArr:
-        """ contravariant
-        T1 <: S1
-        S2 <: T2
-        --------
-        S1->S2 <: T1->T2
-
-        (see '15.2 The Subtype Relation' page 184)
-        """
-        return subtype(tyT.left, tyS.left) and subtype(tyS.right, tyT.right)
-
-    if t_tyS is TyRecord and t_tyT is TyRecord:
-        # NOTE: positionally independent
-        for (nameT, tyTi) in tyT.fields:
-            for (nameS, tySi) in tyS.fields:
-                if nameT == nameS: 
-                    return subtype(tySi, tyTi)
-
-    return False
+def subtype(tyS, tyT):
+    return Subtyping().subtype(tyS, tyT)
 
 # ------------------------   TYPING  ------------------------
 
 class Typeof(Visitor):
 
-    def visit_TmRecord(term, ctx):
-        fieldtys = [(li, typeof(ti, ctx)) for li, ti in term.fields]
-        return TyRecord(fieldtys)
+    def visit_TmTrue(term, ctx, subtyping):
+        return TyBool()
 
-    def visit_TmVar(term, ctx):
+    def visit_TmFalse(term, ctx, subtyping):
+        return TyBool()
+
+    def visit_TmIf(term, ctx, subtyping):
+        """
+        The type of a conditional is the join of the types of its
+        branches (see '16.3 Joins and Meets')
+        """
+        typeCond = typeof(term.term_condition, ctx, subtyping)
+        if not subtyping.subtype(typeCond, TyBool()):
+            raise RuntimeError(
+                "Guard of conditional not a boolean", term.info, term)
+        typeThen = typeof(term.term_then, ctx, subtyping)
+        typeElse = typeof(term.term_else, ctx, subtyping)
+        return subtyping.join(typeThen, typeElse)
+
+    def visit_TmRecord(term, ctx, subtyping):
+        return TyRecord(
+            term.fields.map(lambda ti: typeof(ti, ctx, subtyping)))
+
+    def visit_TmVar(term, ctx, subtyping):
         return getTypeFromContext(ctx, term.index)
 
-    def visit_TmAbs(term, ctx):
+    def visit_TmAbs(term, ctx, subtyping):
         addbinding(ctx, term.name, VarBind(term.type))
         typeLeft = term.type
-        typeRight = typeof(term.term, ctx)
+        typeRight = typeof(term.term, ctx, subtyping)
         ctx.pop()
         return TyArr(typeLeft, typeRight)
 
-    def visit_TmApp(term, ctx):
+    def visit_TmApp(term, ctx, subtyping):
         "(typeLeft.left -> typeLeft.right) typeRight"
 
-        typeLeft = typeof(term.left, ctx)
-        typeRight = typeof(term.right, ctx)
+        typeLeft = typeof(term.left, ctx, subtyping)
+        typeRight = typeof(term.right, ctx, subtyping)
 
         if type(typeLeft) is TyArr:
-            if subtype(typeRight, typeLeft.left):
+            if subtyping.subtype(typeRight, typeLeft.left):
                 return typeLeft.right
             else:
                 raise RuntimeError(
@@ -125,8 +311,8 @@ class Typeof(Visitor):
         else:
             raise RuntimeError("Arrow type expected", term.info, term)
 
-    def visit_TmProj(term, ctx):
-        t_term = typeof(term.term, ctx)
+    def visit_TmProj(term, ctx, subtyping):
+        t_term = typeof(term.term, ctx, subtyping)
 
         if type(t_term) is TyBot:
             return TyBot()
@@ -134,11 +320,18 @@ class Typeof(Visitor):
         if type(t_term) is not TyRecord:
             raise RuntimeError("Expected record type", term.info, term)
             
-        for (name, tf) in t_term.fields:
-            if name == term.name: 
-                return tf
+        tf = t_term.fields.get(term.name)
+        if tf is not None:
+            return tf
 
         raise RuntimeError(
             "label " + str(term.name) + " not found", term.info)
 
-typeof = Typeof.visit
+def typeof(term, ctx, subtyping=None):
+    """
+    Type of 'term' in 'ctx', the subtype checks use the memo of
+    'subtyping', a new one by default
+    """
+    if subtyping is None:
+        subtyping = Subtyping()
+    return Typeof.visit(term, ctx, subtyping)
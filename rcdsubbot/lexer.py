@@ -50,6 +50,12 @@ class Lexer:
 
     reserved = {
        "lambda" : "LAMBDA",
+       "if": "IF",
+       "then": "THEN",
+       "else": "ELSE",
+       "true": "TRUE",
+       "false": "FALSE",
+       "Bool": "BOOL",
        "Top": "TTOP",
        "Bot": "TBOT"
     }
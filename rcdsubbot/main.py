@@ -1,44 +1,64 @@
 import argparse
+import functools
+import sys
 
 from lexer import Lexer
 from parser import Parser
 import syntax
 import core
+from common import batch, stream, tables
 
 
-def process_command(cmd, ctx):
+def process_command(cmd, ctx, subtyping=None):
+    out = []
     if isinstance(cmd, syntax.Eval):
-        term_type = core.typeof(cmd.term, ctx)
+        term_type = core.typeof(cmd.term, ctx, subtyping)
         term = core.evaluate(ctx, cmd.term)
-        syntax.printtm(term, ctx)
-        print(": ", end="")
-        syntax.printty(term_type)
-        print("")
+        syntax.printtm(term, ctx, out)
+        out.append(": ")
+        syntax.printty(term_type, out)
+        out.append("\n")
     elif isinstance(cmd, syntax.Bind):
         if isinstance(cmd.binding, syntax.VarBind):
-            print(cmd.name, end="")
-            print(": ", end="")
-            syntax.printty(cmd.binding.type)
-            print("")
+            out.append(cmd.name + ": ")
+            syntax.printty(cmd.binding.type, out)
+            out.append("\n")
         syntax.addbinding(ctx, cmd.name, cmd.binding)
+    sys.stdout.write("".join(out))
 
-def parse_file(f):
+def parse_file(f, parser=None):
     with open(f, 'r') as f:
         text = f.read()
-    parser = Parser()
+    if parser is None:
+        parser = Parser()
     return parser.parse(text, f)
 
-def process_file(f):
-    cmds = parse_file(f)
-    ctx = []
-    for cmd in cmds:
-        process_command(cmd, ctx)
+def process_file(f, parser=None):
+    if parser is None:
+        parser = Parser()
+    ctx = syntax.Context()
+    # types are closed, the subtype checks of a file share one memo
+    subtyping = core.Subtyping()
+    with stream.open_input(f) as lines:
+        for cmd in stream.parse_stream(parser, lines, f):
+            process_command(cmd, ctx, subtyping)
+            sys.stdout.flush()
+
+def check_file(args, f, parser):
+    """Process 'f' as requested by the command line options 'args'"""
+    process_file(f, parser=parser)
 
 def main():
     arg_parser = argparse.ArgumentParser()
-    arg_parser.add_argument("file", help="Input file")
+    batch.add_arguments(arg_parser)
+    tables.add_arguments(arg_parser)
     args = arg_parser.parse_args()
-    process_file(args.file)
+    make_parser = functools.partial(tables.make_parser, Parser, args)
+    check = functools.partial(check_file, args)
+    if batch.requested(args):
+        failed = batch.run(check, args.files, make_parser, args.jobs)
+        sys.exit(1 if failed else 0)
+    check(args.files[0], make_parser())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
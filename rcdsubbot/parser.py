@@ -3,11 +3,13 @@ import ply.yacc as yacc
 from lexer import Lexer
 
 import syntax
+from common import tables
+from common.record import Fields
 
 """
 Commands
             : Command SEMI
-            | Command SEMI Commands
+            | Commands Command SEMI
 
 Command
             : Term
@@ -25,6 +27,7 @@ Type
 
 AType       : LPAREN Type RPAREN
             | LCURLY FieldTypes RCURLY
+            | BOOL
             | TTOP
             | TBOT
 
@@ -45,6 +48,7 @@ Term
             : AppTerm
             | LAMBDA LCID COLON Type new_scope DOT Term end_scope
             | LAMBDA USCORE COLON Type new_scope DOT Term end_scope
+            | IF Term THEN Term ELSE Term
 
 AppTerm     
             : PathTerm
@@ -54,6 +58,8 @@ ATerm
             : LPAREN Term RPAREN
             | LCID
             | LCURLY Fields RCURLY
+            | TRUE
+            | FALSE
 
 Fields
             :
@@ -71,14 +77,18 @@ Field
 
 class Parser:
 
-    def __init__(self, debug=False):
-        self.lexer = Lexer()
+    def __init__(self, debug=False, optimize=False):
+        if optimize:
+            lex_options, yacc_options = tables.options(Parser, Lexer)
+        else:
+            lex_options, yacc_options = {}, {}
+        self.lexer = Lexer(**lex_options)
         self.tokens = self.lexer.tokens
         self.debug = debug
-        self.parser = yacc.yacc(module=self, debug=debug)
+        self.parser = yacc.yacc(module=self, debug=debug, **yacc_options)
 
-    def parse(self, text, filename=""):
-        self._ctx = []
+    def parse(self, text, filename="", ctx=None):
+        self._ctx = syntax.Context() if ctx is None else ctx
         self._scope_comma_cnt = []
         self.filename = filename
         return self.parser.parse(
@@ -90,9 +100,10 @@ class Parser:
         "Commands : Command SEMI"
         p[0] = [p[1]]
         
-    def p_Commands_Command_Commands(self, p):
-        "Commands : Command SEMI Commands"
-        p[0] = [p[1]] + p[3]
+    def p_Commands_Commands_Command(self, p):
+        "Commands : Commands Command SEMI"
+        p[1].append(p[2])
+        p[0] = p[1]
 
 # Command
 
@@ -126,7 +137,11 @@ class Parser:
 
     def p_AType_LCURLY_FieldTypes_RCURLY(self, p):
         "AType : LCURLY AType_LCURLY FieldTypes RCURLY AType_RCURLY"
-        p[0] = syntax.TyRecord(p[3])
+        p[0] = syntax.TyRecord(Fields(p[3]))
+
+    def p_AType_BOOL(self, p):
+        "AType : BOOL"
+        p[0] = syntax.TyBool()
 
     def p_AType_TTOP(self, p):
         "AType : TTOP"
@@ -207,6 +222,10 @@ class Parser:
         "Term : LAMBDA USCORE COLON Type lambda_new_scope DOT Term lambda_end_scope"
         p[0] = syntax.TmAbs(self._info(p), "_", p[4], p[7])
 
+    def p_Term_IF(self, p):
+        "Term : IF Term THEN Term ELSE Term"
+        p[0] = syntax.TmIf(self._info(p), p[2], p[4], p[6])
+
     def p_lambda_new_scope(self, p):
         "lambda_new_scope :"
         self.addname(p[-3])
@@ -254,7 +273,15 @@ class Parser:
 
     def p_ATerm_Fields(self, p):
         "ATerm : LCURLY ATerm_LCURLY Fields RCURLY ATerm_RCURLY"
-        p[0] = syntax.TmRecord(self._info(p), p[3])
+        p[0] = syntax.TmRecord(self._info(p), Fields(p[3]))
+
+    def p_ATerm_TRUE(self, p):
+        "ATerm : TRUE"
+        p[0] = syntax.TmTrue(self._info(p))
+
+    def p_ATerm_FALSE(self, p):
+        "ATerm : FALSE"
+        p[0] = syntax.TmFalse(self._info(p))
 
     # Helpers
 
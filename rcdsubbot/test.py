@@ -70,6 +70,85 @@ class TypeOfTestCase(unittest.TestCase):
         with self.assertRaises(RuntimeError) as e:
             core.typeof(ast[2].term, ctx)
 
+    def test_record_subtype_all_fields(self):
+        ast = self.parser.parse(
+            "(lambda r:{a:Top->Top, b:Top->Top}. r.b)"
+            " {b=lambda x:Top. x, a={}, c={}};")
+        with self.assertRaises(RuntimeError):
+            core.typeof(ast[0].term, [])
+
+    def test_subtyping_memo(self):
+        ast = self.parser.parse(
+            "lambda r:{a:{x:Top, y:Top}, b:{}}. r;"
+            " lambda r:{b:Top, a:{y:Top}}. r;")
+        tyS = ast[0].term.type
+        tyT = ast[1].term.type
+        subtyping = core.Subtyping()
+        self.assertTrue(subtyping.subtype(tyS, tyT))
+        self.assertFalse(subtyping.subtype(tyT, tyS))
+        self.assertIs(subtyping.memo[(id(tyS), id(tyT))][2], True)
+        self.assertIs(subtyping.memo[(id(tyT), id(tyS))][2], False)
+        self.assertEqual(subtyping.pending, {})
+
+    def test_if_join(self):
+        ast = self.parser.parse(
+            "if true then {x=true, y=lambda a:Top. a}"
+            " else {y=lambda b:Bool. b, z=false};"
+            " lambda r:{y:Bool->Top}. r;"
+            " if {} then true else false;")
+        self.assertIs(core.typeof(ast[0].term, []), ast[1].term.type)
+        with self.assertRaises(RuntimeError):
+            core.typeof(ast[2].term, [])
+
+    def test_lattice(self):
+        ast = self.parser.parse(
+            "lambda r:{a:Top, b:Bool}. r; lambda r:{c:Top, a:Bool}. r;"
+            " lambda r:{a:Top}. r; lambda r:{a:Bool, b:Bool, c:Top}. r;")
+        (tyS, tyT, tyJoin, tyMeet) = [cmd.term.type for cmd in ast]
+        subtyping = core.Subtyping()
+        self.assertIs(subtyping.join(tyS, tyT), tyJoin)
+        self.assertIs(subtyping.meet(tyS, tyT), tyMeet)
+        self.assertIs(subtyping.meet(syntax.TyBool(), tyS), syntax.TyBot())
+        self.assertEqual(
+            list(subtyping.lattice)[-3:],
+            [("join", id(tyS), id(tyT)), ("meet", id(tyS), id(tyT)),
+             ("meet", id(syntax.TyBool()), id(tyS))])
+
+        # the least recently used pair goes first
+        subtyping.lattice_size = 2
+        subtyping.join(tyS, tyT)
+        subtyping.join(tyT, tyS)
+        self.assertEqual(
+            list(subtyping.lattice),
+            [("join", id(tyS), id(tyT)), ("join", id(tyT), id(tyS))])
+
+class EvaluateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def test_proj_steps(self):
+        ast = self.parser.parse(
+            "(lambda r:{a:Top}. r.a) {a=lambda x:Top. x, b=lambda y:Top. y};")
+        term = ast[0].term
+
+        result = core.evaluate_steps([], term, max_steps=1)
+        self.assertFalse(result.done)
+        self.assertEqual(result.steps, 1)
+        self.assertIsInstance(result.term, syntax.TmProj)
+
+        result = core.evaluate_steps([], term)
+        self.assertTrue(result.done)
+        self.assertEqual(result.steps, 2)
+        self.assertIsInstance(result.term, syntax.TmAbs)
+        self.assertEqual(result.term.name, "x")
+
+    def test_if(self):
+        ast = self.parser.parse(
+            "(lambda x:Bool. if x then {} else x) false;")
+        result = core.evaluate_steps([], ast[0].term)
+        self.assertEqual(result.steps, 2)
+        self.assertIsInstance(result.term, syntax.TmFalse)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
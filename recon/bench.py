@@ -0,0 +1,241 @@
+"""
+Benchmarks for type reconstruction.
+
+    python bench.py unify --size 8
+    python bench.py recon --size 2000
+    python bench.py session --size 100
+    python bench.py let --size 400
+    python bench.py suite --json results.json
+"""
+
+import argparse
+import sys
+import time
+
+from parser import Parser
+from syntax import *
+import syntax
+import core
+import solver
+from common import benchmark
+
+# Constraint generation as done before the shared buffer: every node
+# returns a new list that concatenates the lists of its subterms.
+# 'copied' counts the list slots written
+
+class LegacyReconstruction(Visitor):
+
+    copied = 0
+
+    def visit_TmVar(term, ctx, nextuvar):
+        return (getTypeFromContext(ctx, term.index), [])
+
+    def visit_TmAbs(term, ctx, nextuvar):
+        addbinding(ctx, term.name, VarBind(term.type))
+        (typeRight, constr) = legacy_recon(term.term, ctx, nextuvar)
+        ctx.pop()
+        return (TyArr(term.type, typeRight), constr)
+
+    def visit_TmApp(term, ctx, nextuvar):
+        (typeLeft, constrLeft) = legacy_recon(term.left, ctx, nextuvar)
+        (typeRight, constrRight) = legacy_recon(term.right, ctx, nextuvar)
+        tyX = nextuvar()
+        newconstr = [(typeLeft, TyArr(typeRight, TyId(tyX)))]
+        constr = newconstr + constrLeft + constrRight
+        LegacyReconstruction.copied += len(constr)
+        return (TyId(tyX), constr)
+
+    def visit_TmZero(term, ctx, nextuvar):
+        return (TyNat(), [])
+
+legacy_recon = LegacyReconstruction.visit
+
+def applications(depth):
+    """Source of 'depth' nested applications of a function variable"""
+    return "lambda f:F. %s0%s;" % ("f (" * depth, ")" * depth)
+
+def bench_recon(depth):
+    """
+    Time and list slots written per application to generate the
+    constraints of 'depth' nested applications, with list concatenation
+    and with the shared buffer
+    """
+    term = Parser().parse(applications(depth))[0].term
+    # two frames per level of the term
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * depth + 100))
+
+    def run(recon):
+        iuvargen = core.uvargen()
+        start = time.perf_counter()
+        (tyT, constr) = recon(term, [], lambda: next(iuvargen))
+        return (time.perf_counter() - start, constr)
+
+    LegacyReconstruction.copied = 0
+    (elapsed, expected) = run(legacy_recon)
+    print("concat: %.2f us, %.1f slots per application" % (
+        elapsed / depth * 1e6, LegacyReconstruction.copied / depth))
+    (elapsed, constr) = run(core.recon)
+    assert constr == expected
+    print("buffer: %.2f us, %.1f slots per application" % (
+        elapsed / depth * 1e6, len(constr) / depth))
+
+def leaf(num):
+    return "((lambda x:A%d. succ x) 0)" % num
+
+def tree(depth, num=0):
+    """Source of a balanced 'if' tree with 2^depth applications"""
+    if depth == 0:
+        return leaf(num)
+    return "(if true then %s else %s)" % (
+        tree(depth - 1, 2 * num), tree(depth - 1, 2 * num + 1))
+
+def bench_unify(depth):
+    """
+    Time to solve the constraints of a term with 2^depth applications,
+    by variable elimination and with union-find
+    """
+    term = Parser().parse(tree(depth) + ";")[0].term
+    iuvargen = core.uvargen()
+    nextuvar = lambda: next(iuvargen)
+    (tyT, constr) = core.recon(term, [], nextuvar)
+    print("applications: %d, constraints: %d" % (2 ** depth, len(constr)))
+
+    # variable elimination recurses once per constraint
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * len(constr)))
+    for (name, unify) in (("subst", core.unify), ("unionfind", solver.unify)):
+        start = time.perf_counter()
+        subst = unify([], constr)
+        elapsed = time.perf_counter() - start
+        result = core.applysubst(subst, tyT)
+        print("%s: %.1f ms, %s" % (
+            name, elapsed * 1e3, format_type([], result)))
+
+def command(num):
+    # the argument stays small: a numeral parses to that many 'succ's
+    return (
+        "(lambda f:F%d. lambda x:X%d. if iszero x then f x else f (pred x))"
+        " (lambda y:Nat. succ y) %d;" % (num, num, num % 10))
+
+def bench_session(commands):
+    """
+    Inference time of the first and the last tenth of 'commands'
+    commands of one session, for each constraint store
+    """
+    parser = Parser()
+    terms = [parser.parse(command(num))[0].term for num in range(commands)]
+    tenth = max(commands // 10, 1)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * commands))
+
+    for (name, store_cls) in (
+            ("subst", core.Substitution), ("unionfind", solver.Solver)):
+        store = store_cls()
+        iuvargen = core.uvargen()
+        nextuvar = lambda: next(iuvargen)
+        times = []
+        for term in terms:
+            start = time.perf_counter()
+            store.checkpoint()
+            constr = []
+            tyT = core.reconstruct(term, [], nextuvar, constr, store)
+            store.solve(constr)
+            tyT = store.resolve(tyT)
+            store.commit()
+            times.append(time.perf_counter() - start)
+        print("%s: %.2f ms per command at first, %.2f ms at last, %s" % (
+            name,
+            sum(times[:tenth]) / tenth * 1e3,
+            sum(times[-tenth:]) / tenth * 1e3,
+            format_type([], tyT)))
+
+def lets(count):
+    """
+    Source of 'count' nested 'let's, each one binding a function that
+    applies the previous one twice
+    """
+    source = ["let f0 = lambda x:X. x in"]
+    for num in range(1, count):
+        source.append(
+            "let f%d = lambda x:X%d. f%d (f%d x) in" % (
+                num, num, num - 1, num - 1))
+    source.append("f%d 0;" % (count - 1))
+    return "\n".join(source)
+
+def bench_let(count):
+    """
+    Inference time per 'let' of 'count' nested 'let's, for each
+    constraint store
+    """
+    term = Parser().parse(lets(count))[0].term
+    # a few frames per 'let', and variable elimination recurses once
+    # per constraint
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * count))
+
+    for (name, store_cls) in (
+            ("subst", core.Substitution), ("unionfind", solver.Solver)):
+        store = store_cls()
+        iuvargen = core.uvargen()
+        nextuvar = lambda: next(iuvargen)
+        start = time.perf_counter()
+        constr = []
+        tyT = core.reconstruct(term, [], nextuvar, constr, store)
+        store.solve(constr)
+        tyT = store.resolve(tyT)
+        elapsed = time.perf_counter() - start
+        print("%s: %.3f ms per let, %s" % (
+            name, elapsed / count * 1e3, format_type([], tyT)))
+
+def reconstruction(source, frames):
+    """
+    Workload reconstructing the type of 'source' with the union-find
+    solver, counting the type variables it introduces. 'frames' is the
+    recursion depth it needs
+    """
+    term = Parser().parse(source)[0].term
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), frames))
+
+    def run():
+        iuvargen = core.uvargen()
+        count = [0]
+
+        def nextuvar():
+            count[0] += 1
+            return next(iuvargen)
+
+        store = solver.Solver()
+        constr = []
+        tyT = core.reconstruct(term, [], nextuvar, constr, store)
+        store.solve(constr)
+        store.resolve(tyT)
+        return count[0]
+    return run
+
+WORKLOADS = {
+    "apps": (
+        lambda size: reconstruction(applications(size), 4 * size + 100),
+        (500, 1000, 2000)),
+    "let": (
+        lambda size: reconstruction(lets(size), 20 * size),
+        (50, 100, 200)),
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "benchmark", choices=["unify", "recon", "session", "let", "suite"])
+    arg_parser.add_argument("--size", type=int)
+    arg_parser.add_argument("--number", type=int)
+    benchmark.add_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    if args.benchmark == "unify":
+        bench_unify(args.size or 8)
+    elif args.benchmark == "recon":
+        bench_recon(args.size or 2000)
+    elif args.benchmark == "session":
+        bench_session(args.size or 100)
+    elif args.benchmark == "let":
+        bench_let(args.size or 400)
+    elif args.benchmark == "suite":
+        benchmark.main("recon", syntax, WORKLOADS, args)
+
+if __name__ == '__main__':
+    main()
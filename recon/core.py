@@ -1,10 +1,8 @@
 from functools import reduce
 
 from syntax import *
-from collections import namedtuple
 
-class NoRuleApplies(RuntimeError):
-    pass
+from common.evaluation import NoRuleApplies, run
 
 # ------------------------   EVALUATION  ------------------------
 
@@ -42,6 +40,12 @@ class Evaluate(Visitor):
             left = evaluate1(term.left, ctx)
             return term._replace(left=left)
 
+    def visit_TmLet(term, ctx):
+        if isval(term.let_term):
+            return termSubstTop(term.let_term, term.in_term)
+        let_term = evaluate1(term.let_term, ctx)
+        return term._replace(let_term=let_term)
+
     def visit_TmIf(term, ctx): 
         t_cond = type(term.term_condition)
         if t_cond is TmTrue:
@@ -81,11 +85,11 @@ class Evaluate(Visitor):
 evaluate1 = Evaluate.visit
 
 
+def evaluate_steps(ctx, term, max_steps=None, stop=isval):
+    return run(lambda t: evaluate1(t, ctx), term, stop, max_steps)
+
 def evaluate(ctx, term):
-    try:
-        return evaluate(ctx, evaluate1(term, ctx))
-    except NoRuleApplies:
-        return term
+    return evaluate_steps(ctx, term).term
 
 # ------------------------   TYPING  ------------------------
 
@@ -99,65 +103,128 @@ def uvargen():
 
 
 class Reconstruction(Visitor):
-
-    def visit_TmVar(term, ctx, nextuvar):
+    """
+    Appends the constraints of a term to the list 'constr' and returns
+    its type. Constraints of a node come before the ones of its subterms,
+    so their slots are reserved first and filled in once the types of the
+    subterms are known.
+
+    The constraints of the bound term of a 'let' are solved right away
+    in the constraint store 'store' instead, so that its type can be
+    generalized (see 'Substitution' and 'solver.Solver').
+    """
+
+    def visit_TmVar(term, ctx, nextuvar, constr, store):
         tyT = getTypeFromContext(ctx, term.index)
-        return (tyT, [])
+        if type(tyT) is TyScheme:
+            tyT = instantiate(tyT, nextuvar)
+            store.introduce(tyT)
+        return tyT
 
-    def visit_TmAbs(term, ctx, nextuvar):
+    def visit_TmAbs(term, ctx, nextuvar, constr, store):
         "lambda <name>:<type>. <term>"
 
         typeLeft = term.type
+        store.introduce(typeLeft)
         addbinding(ctx, term.name, VarBind(typeLeft))
-        (typeRight, contsr) = recon(term.term, ctx, nextuvar)
+        typeRight = reconstruct(term.term, ctx, nextuvar, constr, store)
         ctx.pop()
-        return (TyArr(typeLeft, typeRight), contsr)
+        return TyArr(typeLeft, typeRight)
 
-    def visit_TmApp(term, ctx, nextuvar):
+    def visit_TmApp(term, ctx, nextuvar, constr, store):
         """
         (t1 t2) with t1: T1, t2: T2
         return: type X and constraint T1 = T2 -> X
         
         see 22.3 Constraint-Based Typing
         """
-        (typeLeft, constrLeft) = recon(term.left, ctx, nextuvar)
-        (typeRight, constrRight) = recon(term.right, ctx, nextuvar)
-        tyX = nextuvar()
+        slot = len(constr)
+        constr.append(None)
+        typeLeft = reconstruct(term.left, ctx, nextuvar, constr, store)
+        typeRight = reconstruct(term.right, ctx, nextuvar, constr, store)
+        tyX = TyId(nextuvar())
+        store.introduce(tyX)
         # typeLeft should be is 'arrow' from typeRight to X
-        newconstr = [(typeLeft, TyArr(typeRight, TyId(tyX)))]
-        constr = newconstr + constrLeft + constrRight
-        return (TyId(tyX), constr)
-
-    def visit_TmZero(term, ctx, nextuvar):
-        return (TyNat(), [])
-
-    def visit_TmSucc(term, ctx, nextuvar):
-        (tyT, constr) = recon(term.term, ctx, nextuvar)
-        return (TyNat(), [(tyT, TyNat())] + constr)
-
-    def visit_TmPred(term, ctx, nextuvar):
-        (tyT, constr) = recon(term.term, ctx, nextuvar)
-        return (TyNat(), [(tyT, TyNat())] + constr)
-
-    def visit_TmIsZero(term, ctx, nextuvar):
-        (tyT, constr) = recon(term.term, ctx, nextuvar)
-        return (TyNat(), [(tyT, TyNat())] + constr)
-
-    def visit_TmTrue(term, ctx, nextuvar):
-        return (TyBool(), [])
+        constr[slot] = (typeLeft, TyArr(typeRight, tyX))
+        return tyX
 
-    def visit_TmFalse(term, ctx, nextuvar):
-        return (TyBool(), [])
+    def visit_TmLet(term, ctx, nextuvar, constr, store):
+        """
+        let <name> = <let_term> in <in_term>
 
-    def visit_TmIf(term, ctx, nextuvar):
-        (tyT1, constr1) = recon(term.term_condition, ctx, nextuvar)
-        (tyT2, constr2) = recon(term.term_then, ctx, nextuvar)
-        (tyT3, constr3) = recon(term.term_else, ctx, nextuvar)
-        newconstr = [(tyT1,TyBool()), (tyT2,tyT3)]
-        constr = newconstr + constr1 + constr2 + constr3
-        return (tyT3, constr)
+        'let_term' is reconstructed and solved one level deeper, and
+        <name> is bound to its type generalized over the variables that
+        are still at that level
 
-recon = Reconstruction.visit
+        see 22.7 Let-Polymorphism
+        """
+        start = len(constr)
+        store.enter()
+        tyT1 = reconstruct(term.let_term, ctx, nextuvar, constr, store)
+        store.solve(constr[start:])
+        del constr[start:]
+        store.leave()
+        addbinding(ctx, term.name, VarBind(store.generalize(tyT1)))
+        tyT2 = reconstruct(term.in_term, ctx, nextuvar, constr, store)
+        ctx.pop()
+        return tyT2
+
+    def visit_TmZero(term, ctx, nextuvar, constr, store):
+        return TyNat()
+
+    def visit_TmSucc(term, ctx, nextuvar, constr, store):
+        slot = len(constr)
+        constr.append(None)
+        tyT = reconstruct(term.term, ctx, nextuvar, constr, store)
+        constr[slot] = (tyT, TyNat())
+        return TyNat()
+
+    def visit_TmPred(term, ctx, nextuvar, constr, store):
+        slot = len(constr)
+        constr.append(None)
+        tyT = reconstruct(term.term, ctx, nextuvar, constr, store)
+        constr[slot] = (tyT, TyNat())
+        return TyNat()
+
+    def visit_TmIsZero(term, ctx, nextuvar, constr, store):
+        slot = len(constr)
+        constr.append(None)
+        tyT = reconstruct(term.term, ctx, nextuvar, constr, store)
+        constr[slot] = (tyT, TyNat())
+        return TyBool()
+
+    def visit_TmTrue(term, ctx, nextuvar, constr, store):
+        return TyBool()
+
+    def visit_TmFalse(term, ctx, nextuvar, constr, store):
+        return TyBool()
+
+    def visit_TmIf(term, ctx, nextuvar, constr, store):
+        slot = len(constr)
+        constr.extend((None, None))
+        tyT1 = reconstruct(term.term_condition, ctx, nextuvar, constr, store)
+        tyT2 = reconstruct(term.term_then, ctx, nextuvar, constr, store)
+        tyT3 = reconstruct(term.term_else, ctx, nextuvar, constr, store)
+        constr[slot] = (tyT1, TyBool())
+        constr[slot + 1] = (tyT2, tyT3)
+        return tyT3
+
+reconstruct = Reconstruction.visit
+
+def recon(term, ctx, nextuvar, store=None):
+    """
+    Type of 'term' and the list of its constraints, except the ones of
+    'let' bound terms, which are solved in 'store'. Without a store,
+    the solution of the 'let' bound terms is returned with the other
+    constraints, as equations between its variables and their types
+    """
+    if store is None:
+        store = Substitution()
+        (tyT, constr) = recon(term, ctx, nextuvar, store)
+        return (tyT, list(store.substitution()) + constr)
+    constr = []
+    tyT = reconstruct(term, ctx, nextuvar, constr, store)
+    return (tyT, constr)
 
 class SubstituteInTy(Visitor):
 
@@ -219,6 +286,8 @@ def unify(ctx, constr_in):
     constr = list(constr_in)
     (tyS, tyT) = constr[0]
     rest = constr[1:]
+    if tyS is tyT:
+        return unify(ctx, rest)
     t_tyS = type(tyS)
     t_tyT = type(tyT)
     if t_tyT is TyId:
@@ -251,3 +320,106 @@ def unify(ctx, constr_in):
         return unify(ctx, upd)
     
     raise RuntimeError("Unsolvable constraints")
+
+
+def typevars(tyT):
+    """Names of the variables of 'tyT', in order of appearance"""
+    names = {}
+    pending = [tyT]
+    while pending:
+        tyT = pending.pop()
+        t_tyT = type(tyT)
+        if t_tyT is TyArr:
+            pending.append(tyT.right)
+            pending.append(tyT.left)
+        elif t_tyT is TyId:
+            names[tyT.name] = None
+    return list(names)
+
+def instantiate(tyS, nextuvar):
+    """Type of a use of a variable of scheme 'tyS', with fresh variables"""
+    tyT = tyS.type
+    for name in tyS.names:
+        tyT = substinty(tyT, name, TyId(nextuvar()))
+    return tyT
+
+
+class Substitution:
+    """
+    Constraint store that solves new constraints together with all
+    previous ones by 'unify'.
+
+    The level of a variable is the number of 'let' bound terms around
+    the place it was introduced at, the outermost one for variables that
+    are only met in constraints. A variable of the type of a 'let' bound
+    term is generalized when its level is deeper than the one of the
+    'let' and no variable of that level or an enclosing one is solved to
+    a type that mentions it, which is checked over the whole solution.
+    """
+
+    def __init__(self):
+        self.constr = []
+        self.level = 0
+        self._levels = {}
+        self._marks = []
+
+    def enter(self):
+        self.level += 1
+
+    def leave(self):
+        self.level -= 1
+
+    def introduce(self, tyT):
+        """Make the variables of 'tyT' belong to the current level"""
+        for name in typevars(tyT):
+            if self._levels.get(name, self.level) >= self.level:
+                self._levels[name] = self.level
+
+    def solve(self, constr):
+        self.constr = unify([], self.constr + constr)
+
+    def resolve(self, tyT):
+        return applysubst(self.constr, tyT)
+
+    def substitution(self):
+        return self.constr
+
+    def generalize(self, tyT):
+        """
+        'tyT' as a scheme over its variables that are deeper than the
+        current level, 'tyT' itself when there are none
+        """
+        tyT = self.resolve(tyT)
+        names = [
+            name for name in typevars(tyT)
+            if self._levels.get(name, 0) > self.level]
+        if names:
+            escaped = self._escaped()
+            names = tuple(name for name in names if name not in escaped)
+        if names:
+            return TyScheme(names, tyT)
+        return tyT
+
+    def _escaped(self):
+        """Variables reachable from the ones of the current level"""
+        solved = dict((tyX.name, tyS) for (tyX, tyS) in self.constr)
+        pending = [
+            name for name in list(self._levels) + list(solved)
+            if self._levels.get(name, 0) <= self.level]
+        escaped = set()
+        while pending:
+            name = pending.pop()
+            if name not in escaped:
+                escaped.add(name)
+                if name in solved:
+                    pending.extend(typevars(solved[name]))
+        return escaped
+
+    def checkpoint(self):
+        self._marks.append((self.constr, self.level, dict(self._levels)))
+
+    def rollback(self):
+        (self.constr, self.level, self._levels) = self._marks.pop()
+
+    def commit(self):
+        self._marks.pop()
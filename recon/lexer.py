@@ -19,7 +19,7 @@ class Lexer:
         # ("/", "SLASH"),
         (":", "COLON"),
         # ("::", "COLONCOLON"),
-        # ("=", "EQ"),
+        ("=", "EQ"),
         # ("==", "EQEQ"),
         # ("[", "LSQUARE"), 
         # ("<", "LT"),
@@ -50,6 +50,8 @@ class Lexer:
 
     reserved = {
        "lambda" : "LAMBDA",
+       "let": "LET",
+       "in": "IN",
        "if": "IF",
        "then": "THEN",
        "else": "ELSE",
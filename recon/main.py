@@ -1,57 +1,90 @@
 import argparse
+import functools
+import sys
 
 from lexer import Lexer
 from parser import Parser
 import syntax
 import core
+from common import batch, stream, tables
+import solver
 
+solvers = {
+    "subst": core.Substitution,
+    "unionfind": solver.Solver,
+}
 
-def process_command(cmd, ctx, constr, nextuvar):
+def process_command(cmd, ctx, store, nextuvar):
+    out = []
     if type(cmd) is syntax.Eval:
-        # Step 1 - Reconstruction
-        (tyT, constr_t) = core.recon(cmd.term, ctx, nextuvar)
+        # 'let' bound terms are solved in the store during reconstruction,
+        # so it is rolled back from before it
+        store.checkpoint()
+        try:
+            # Step 1 - Reconstruction
+            constr = []
+            tyT = core.reconstruct(cmd.term, ctx, nextuvar, constr, store)
+            # Step 2 - Unification (Inference) of the new constraints
+            store.solve(constr)
+            tyT_inf = store.resolve(tyT)
+        except RuntimeError:
+            store.rollback()
+            raise
+        store.commit()
         term = core.evaluate(ctx, cmd.term)
-        core.combineconstr(constr, constr_t)
-        #Step 2 - Unification (Inference)
-        unify_constr = core.unify(ctx, constr)
-        constr.clear()
-        constr.extend(unify_constr)
-
-        tyT_inf = core.applysubst(constr, tyT)
         # Printing
-        syntax.printtm(term, ctx)
-        print(": ", end="")
-        syntax.printty(tyT_inf)
-        print("")
+        syntax.printtm(term, ctx, out)
+        out.append(": ")
+        syntax.printty(tyT_inf, out)
+        out.append("\n")
 
     elif isinstance(cmd, syntax.Bind):
         if isinstance(cmd.binding, syntax.VarBind):
-            print(cmd.name, end="")
-            print(": ", end="")
-            syntax.printty(cmd.binding.type)
-            print("")
+            out.append(cmd.name + ": ")
+            syntax.printty(cmd.binding.type, out)
+            out.append("\n")
         syntax.addbinding(ctx, cmd.name, cmd.binding)
+    sys.stdout.write("".join(out))
 
-def parse_file(f):
+def parse_file(f, parser=None):
     with open(f, 'r') as f:
         text = f.read()
-    parser = Parser()
+    if parser is None:
+        parser = Parser()
     return parser.parse(text, f)
 
-def process_file(f):
-    cmds = parse_file(f)
-    ctx = []
-    constr = []
+def process_file(f, store_cls=solver.Solver, parser=None):
+    if parser is None:
+        parser = Parser()
+    ctx = syntax.Context()
+    store = store_cls()
     iuvargen = core.uvargen()
     nextuvar = lambda: next(iuvargen)
-    for cmd in cmds:
-        process_command(cmd, ctx, constr, nextuvar)
+    with stream.open_input(f) as lines:
+        for cmd in stream.parse_stream(parser, lines, f):
+            process_command(cmd, ctx, store, nextuvar)
+            sys.stdout.flush()
+
+def check_file(args, f, parser):
+    """Process 'f' as requested by the command line options 'args'"""
+    process_file(f, solvers[args.solver], parser=parser)
 
 def main():
     arg_parser = argparse.ArgumentParser()
-    arg_parser.add_argument("file", help="Input file")
+    batch.add_arguments(arg_parser)
+    arg_parser.add_argument(
+        "--solver", choices=sorted(solvers), default="unionfind",
+        help="Constraint solver: union-find over type variables, or "
+             "variable elimination by substitution, which solves all the "
+             "constraints of the file again for every command")
+    tables.add_arguments(arg_parser)
     args = arg_parser.parse_args()
-    process_file(args.file)
+    make_parser = functools.partial(tables.make_parser, Parser, args)
+    check = functools.partial(check_file, args)
+    if batch.requested(args):
+        failed = batch.run(check, args.files, make_parser, args.jobs)
+        sys.exit(1 if failed else 0)
+    check(args.files[0], make_parser())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
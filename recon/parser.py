@@ -3,11 +3,12 @@ import ply.yacc as yacc
 from lexer import Lexer
 
 import syntax
+from common import tables
 
 """
 Commands
             : Command SEMI
-            | Command SEMI Commands
+            | Commands Command SEMI
 
 Command
             : Term
@@ -32,6 +33,8 @@ Term
             | LAMBDA LCID COLON Type new_scope DOT Term end_scope
             | LAMBDA USCORE COLON Type new_scope DOT Term end_scope
             | IF Term THEN Term ELSE Term
+            | LET LCID EQ Term IN Term
+            | LET USCORE EQ Term IN Term
 
 AppTerm     
             : ATerm
@@ -50,14 +53,18 @@ ATerm
 
 class Parser:
 
-    def __init__(self, debug=False):
-        self.lexer = Lexer()
+    def __init__(self, debug=False, optimize=False):
+        if optimize:
+            lex_options, yacc_options = tables.options(Parser, Lexer)
+        else:
+            lex_options, yacc_options = {}, {}
+        self.lexer = Lexer(**lex_options)
         self.tokens = self.lexer.tokens
         self.debug = debug
-        self.parser = yacc.yacc(module=self, debug=debug)
+        self.parser = yacc.yacc(module=self, debug=debug, **yacc_options)
 
-    def parse(self, text, filename=""):
-        self._ctx = []
+    def parse(self, text, filename="", ctx=None):
+        self._ctx = syntax.Context() if ctx is None else ctx
         self._scope_comma_cnt = []
         self.filename = filename
         return self.parser.parse(
@@ -69,9 +76,10 @@ class Parser:
         "Commands : Command SEMI"
         p[0] = [p[1]]
         
-    def p_Commands_Command_Commands(self, p):
-        "Commands : Command SEMI Commands"
-        p[0] = [p[1]] + p[3]
+    def p_Commands_Commands_Command(self, p):
+        "Commands : Commands Command SEMI"
+        p[1].append(p[2])
+        p[0] = p[1]
 
 # Command
 
@@ -152,6 +160,22 @@ class Parser:
         "Term : IF Term THEN Term ELSE Term"
         p[0] = syntax.TmIf(self._info(p), p[2], p[4], p[6])
 
+    def p_Term_LET_LCID_EQ_Term_IN_Term(self, p):
+        "Term : LET LCID EQ Term IN let_new_scope Term let_end_scope"
+        p[0] = syntax.TmLet(self._info(p), p[2], p[4], p[7])
+
+    def p_Term_LET_USCORE_EQ_Term_IN_Term(self, p):
+        "Term : LET USCORE EQ Term IN let_new_scope Term let_end_scope"
+        p[0] = syntax.TmLet(self._info(p), "_", p[4], p[7])
+
+    def p_let_new_scope(self, p):
+        "let_new_scope :"
+        self.addname(p[-4])
+
+    def p_let_end_scope(self, p):
+        "let_end_scope :"
+        self._ctx.pop()
+
 # AppTerm
 
     def p_AppTerm_ATerm(self, p):
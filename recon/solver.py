@@ -0,0 +1,274 @@
+"""
+Union-find constraint solver for recon.
+
+'core.unify' eliminates one variable at a time, substituting it through
+all remaining constraints, and 'applysubst' then replays the whole
+substitution on the type. This solver keeps a mutable node per type
+variable instead. Nodes that are unified are merged in a union-find
+forest (union by rank, path compression) and the root of a class holds
+the structure ('TyArr', 'TyNat', 'TyBool') the class is equal to, if
+any. Every constraint is then handled in near-constant time plus the
+work of decomposing arrows, without rewriting other constraints.
+
+The occurs check is done when a solution is read back: a class whose
+structure contains itself is reported as circular. 'solve' reads back
+the classes it changed, so a circular constraint is reported by the
+call that adds it.
+
+A 'Solver' is incremental: constraints added by 'solve' are solved
+against the state left by the previous calls. 'checkpoint' starts
+recording the changes made to the state, 'rollback' undoes them and
+'commit' keeps them. Checkpoints nest.
+
+For let-polymorphism every variable has a level, the number of 'let'
+bound terms around the place it was introduced at (Remy's ranks).
+Whenever a class is merged with another or given a structure, the
+variables it then reaches are lowered to its level, so a variable is
+still deeper than a 'let' after the bound term is solved exactly when
+nothing outside the 'let' reaches it, and 'generalize' only looks at
+the type being generalized.
+
+'unify' takes and returns the same values as 'core.unify': the solution
+is a list of (TyId(X), T) pairs, one per solved variable, where no 'T'
+mentions a solved variable, so 'applysubst' gives the same types.
+'core.Substitution' is a store with the interface of 'Solver' that
+re-solves all constraints with 'core.unify' instead.
+"""
+
+from syntax import *
+import core
+
+
+class Variable:
+
+    __slots__ = ("name", "parent", "rank", "type", "level")
+
+    def __init__(self, name, level=0):
+        self.name = name
+        self.parent = self
+        self.rank = 0
+        self.type = None
+        self.level = level
+
+
+class Solver:
+
+    def __init__(self):
+        self._variables = {}
+        self._solutions = {}
+        # (variable, attribute, old value) for every change made since
+        # the oldest checkpoint, attribute None for a new variable
+        self._trail = []
+        self._marks = []
+        self._touched = []
+        self.level = 0
+
+    def _assign(self, var, attr, value):
+        if self._marks:
+            self._trail.append((var, attr, getattr(var, attr)))
+        setattr(var, attr, value)
+
+    def variable(self, name, level=0):
+        """Node of the type variable 'name', created at 'level' on first use"""
+        try:
+            return self._variables[name]
+        except KeyError:
+            var = self._variables[name] = Variable(name, level)
+            if self._marks:
+                self._trail.append((var, None, None))
+            return var
+
+    def find(self, var):
+        root = var
+        while root.parent is not root:
+            root = root.parent
+        while var.parent is not root:
+            parent = var.parent
+            self._assign(var, "parent", root)
+            var = parent
+        return root
+
+    def _union(self, varS, varT):
+        """Merge two roots, return the new root"""
+        if varS.rank < varT.rank:
+            (varS, varT) = (varT, varS)
+        elif varS.rank == varT.rank:
+            self._assign(varS, "rank", varS.rank + 1)
+        self._assign(varT, "parent", varS)
+        return varS
+
+    def _lower(self, tyT, level):
+        """Lower the variables reached from 'tyT' to 'level'"""
+        pending = [tyT]
+        while pending:
+            tyT = pending.pop()
+            t_tyT = type(tyT)
+            if t_tyT is TyArr:
+                pending.append(tyT.left)
+                pending.append(tyT.right)
+            elif t_tyT is TyId:
+                var = self.find(self.variable(tyT.name))
+                if var.level > level:
+                    self._assign(var, "level", level)
+                    if var.type is not None:
+                        pending.append(var.type)
+
+    def _settype(self, var, tyT):
+        self._assign(var, "type", tyT)
+        self._lower(tyT, var.level)
+        self._touched.append(var)
+
+    def enter(self):
+        self.level += 1
+
+    def leave(self):
+        self.level -= 1
+
+    def introduce(self, tyT):
+        """Make the variables of 'tyT' belong to the current level"""
+        for name in core.typevars(tyT):
+            if name in self._variables:
+                self._lower(TyId(name), self.level)
+            else:
+                self.variable(name, self.level)
+
+    def _root(self, tyT):
+        """Root node of a variable, None for a structure"""
+        if type(tyT) is TyId:
+            return self.find(self.variable(tyT.name))
+        return None
+
+    def unify(self, tyS, tyT):
+        self._solutions.clear()
+        pending = [(tyS, tyT)]
+        while pending:
+            (tyS, tyT) = pending.pop()
+            if tyS is tyT:
+                continue
+            varS = self._root(tyS)
+            varT = self._root(tyT)
+            if varS is not None and varT is not None:
+                if varS is varT:
+                    continue
+                # merged before their structures are unified, so that
+                # circular structures meet the same root again
+                (tyS, tyT) = (varS.type, varT.type)
+                level = min(varS.level, varT.level)
+                root = self._union(varS, varT)
+                if root.level > level:
+                    self._assign(root, "level", level)
+                if tyS is None:
+                    tyS = tyT
+                elif tyT is not None:
+                    pending.append((tyS, tyT))
+                if tyS is None:
+                    self._touched.append(root)
+                else:
+                    self._settype(root, tyS)
+            elif varT is not None:
+                if varT.type is None:
+                    self._settype(varT, tyS)
+                else:
+                    pending.append((tyS, varT.type))
+            elif varS is not None:
+                if varS.type is None:
+                    self._settype(varS, tyT)
+                else:
+                    pending.append((varS.type, tyT))
+            elif type(tyS) is TyArr and type(tyT) is TyArr:
+                pending.append((tyS.right, tyT.right))
+                pending.append((tyS.left, tyT.left))
+            else:
+                # base types are interned, so equal ones are the same
+                raise RuntimeError("Unsolvable constraints")
+
+    def solve(self, constr):
+        """Add the constraints 'constr' to the solved ones"""
+        for (tyS, tyT) in constr:
+            self.unify(tyS, tyT)
+        (touched, self._touched) = (self._touched, [])
+        for var in touched:
+            self.resolve(TyId(var.name))
+
+    def resolve(self, tyT):
+        """'tyT' with every solved variable replaced by its solution"""
+        return self._resolve(tyT, set())
+
+    def _resolve(self, tyT, visiting):
+        t_tyT = type(tyT)
+        if t_tyT is TyArr:
+            left = self._resolve(tyT.left, visiting)
+            right = self._resolve(tyT.right, visiting)
+            if left is tyT.left and right is tyT.right:
+                return tyT
+            return TyArr(left, right)
+        elif t_tyT is not TyId or tyT.name not in self._variables:
+            return tyT
+
+        root = self.find(self._variables[tyT.name])
+        try:
+            return self._solutions[root]
+        except KeyError:
+            pass
+        if root.type is None:
+            solution = TyId(root.name)
+        elif root in visiting:
+            raise RuntimeError("Circular constraints")
+        else:
+            visiting.add(root)
+            solution = self._resolve(root.type, visiting)
+            visiting.discard(root)
+        self._solutions[root] = solution
+        return solution
+
+    def generalize(self, tyT):
+        """
+        'tyT' as a scheme over its variables that are deeper than the
+        current level, 'tyT' itself when there are none
+        """
+        tyT = self.resolve(tyT)
+        names = tuple(
+            name for name in core.typevars(tyT)
+            if name in self._variables
+            and self.find(self._variables[name]).level > self.level)
+        if names:
+            return TyScheme(names, tyT)
+        return tyT
+
+    def substitution(self):
+        """The solution as (TyId(X), T) pairs, as returned by 'core.unify'"""
+        subst = []
+        for name in self._variables:
+            tyX = TyId(name)
+            tyT = self.resolve(tyX)
+            if tyT is not tyX:
+                subst.append((tyX, tyT))
+        return subst
+
+    def checkpoint(self):
+        self._marks.append((len(self._trail), self.level))
+
+    def rollback(self):
+        """Undo the changes made since the last checkpoint and drop it"""
+        (mark, self.level) = self._marks.pop()
+        trail = self._trail
+        while len(trail) > mark:
+            (var, attr, value) = trail.pop()
+            if attr is None:
+                del self._variables[var.name]
+            else:
+                setattr(var, attr, value)
+        self._solutions.clear()
+        self._touched.clear()
+
+    def commit(self):
+        """Keep the changes made since the last checkpoint and drop it"""
+        self._marks.pop()
+        if not self._marks:
+            self._trail.clear()
+
+
+def unify(ctx, constr):
+    solver = Solver()
+    solver.solve(constr)
+    return solver.substitution()
@@ -1,14 +1,27 @@
+import os
+import sys
 from collections import namedtuple
+from contextlib import contextmanager
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from common.context import Context, as_context
+from common.intern import internedtuple
+from common.substitution import substtop_onvar
+from common import visitor
 
 # ----------------------------------------------------------------------
 # Datatypes
 
 # Types
 
-TyBool = namedtuple("TyBool", [])
-TyNat = namedtuple("TyNat", [])
-TyArr = namedtuple("TyArr", ["left", "right"])
-TyId = namedtuple("TyId", ["name"])
+TyBool = internedtuple("TyBool", [])
+TyNat = internedtuple("TyNat", [])
+TyArr = internedtuple("TyArr", ["left", "right"])
+TyId = internedtuple("TyId", ["name"])
+
+# Type of a let-bound variable, generalized over the variables 'names'
+TyScheme = namedtuple("TyScheme", ["names", "type"])
 
 
 # Terms
@@ -23,6 +36,7 @@ TmIsZero = namedtuple("TmIsZero", ["info", "term"])
 TmVar = namedtuple("TmVar", ["info", "index", "ctxlength"])
 TmAbs = namedtuple("TmAbs", ["info", "name", "type", "term"])
 TmApp = namedtuple("TmApp", ["info", "left", "right"])
+TmLet = namedtuple("TmLet", ["info", "name", "let_term", "in_term"])
 
 # Bindings
 
@@ -45,16 +59,17 @@ def addname(ctx, name):
     return addbinding(ctx, name, NameBind())
 
 def isnamebound(ctx, name):
-    for ctx_name, _ in ctx:
-        if ctx_name == name:
-            return True
-    return False
+    return ctx.isnamebound(name)
 
-def pickfreshname(ctx, name):
-    new_name = str(name)
-    while isnamebound(ctx, new_name):
-        new_name += "'"
-    return ctx + [(new_name, NameBind())], new_name
+@contextmanager
+def mgr_pickfreshname(ctx, name):
+    """Bind a fresh variant of 'name' while the block runs"""
+    new_name = ctx.freshname(name)
+    addname(ctx, new_name)
+    try:
+        yield new_name
+    finally:
+        ctx.pop()
 
 def get_ctx_item(ctx, index):
     try:
@@ -69,10 +84,7 @@ def index2name(ctx, index):
     return name
 
 def name2index(ctx, name):
-    for index, (v, _) in enumerate(reversed(ctx)):
-        if name == v:
-            return index
-    raise ValueError("Identifier %s is unbound" % name)
+    return ctx.name2index(name)
 
 # ----------------------------------------------------------------------
 # Shifting
@@ -86,6 +98,9 @@ def tmmap(onvar, c, t):
             return TmAbs(t.info, t.name, t.type, walk((c+1), t.term))
         elif type_t is TmApp:
             return TmApp(t.info, walk(c, t.left), walk(c, t.right))
+        elif type_t is TmLet:
+            return TmLet(
+                t.info, t.name, walk(c, t.let_term), walk(c+1, t.in_term))
         elif type_t is TmTrue:
             return t
         elif type_t is TmFalse:
@@ -125,7 +140,8 @@ def termSubst(j, s, t):
     )
 
 def termSubstTop(s, t):
-    return termShift(-1, termSubst(0, termShift(1, s), t))
+    onvar = substtop_onvar(TmVar, termShift, s)
+    return tmmap(onvar, 0, t)
 
 # ----------------------------------------------------------------------
 # Context management (continued)
@@ -153,104 +169,127 @@ class Info(namedtuple("Info", ["filename", "lineno"])):
         return '<%s:%s>' % self
 
 
-class Visitor:
-
-    @classmethod
-    def visit(cls, term, *args, **kwargs):
-        method_name = 'visit_' + term.__class__.__name__
-        default_name = getattr(cls, 'visit_ANY', None)
-        method = getattr(cls, method_name, default_name)
+class Visitor(visitor.Visitor):
 
-        if method is None:
-            raise AttributeError(
-                "type object '%s' has no attribute '%s'" %
-                (cls.__name__, method_name))
-        return method(term, *args, **kwargs)
+    default_method = 'visit_ANY'
 
 
 class TypesPrinter(Visitor):
+    """Appends the text of a type to the list of chunks 'out'"""
 
-    def visit_TyArr(self):
-        printty(self.left)
-        print(" -> ", end="")
-        printty(self.right)
+    def visit_TyArr(self, out):
+        TypesPrinter.visit(self.left, out)
+        out.append(" -> ")
+        TypesPrinter.visit(self.right, out)
 
-    def visit_TyBool(self):
-        print("Bool", end="")
+    def visit_TyBool(self, out):
+        out.append("Bool")
 
-    def visit_TyNat(self):
-        print("Nat", end="")
+    def visit_TyNat(self, out):
+        out.append("Nat")
 
-    def visit_TyId(self):
-        print(self.name, end="")
+    def visit_TyId(self, out):
+        out.append(self.name)
 
 
-printty = TypesPrinter.visit
+def format_type(ctx, tyT):
+    out = []
+    TypesPrinter.visit(tyT, out)
+    return "".join(out)
+
+def printty(tyT, out=None):
+    """
+    Append the text of 'tyT' to 'out', or write it to the standard
+    output at once when 'out' is not given
+    """
+    if out is None:
+        sys.stdout.write(format_type([], tyT))
+    else:
+        TypesPrinter.visit(tyT, out)
 
 
 class TermsPrinter(Visitor):
+    """Appends the text of a term to the list of chunks 'out'"""
 
-    def visit_TmVar(self, ctx):
+    def visit_TmVar(self, ctx, out):
         if len(ctx) == self.ctxlength:
-            print(index2name(ctx, self.index), end="")
+            out.append(index2name(ctx, self.index))
         else:
-            print(
+            out.append(
                 "[bad index: " + str(self.index) + "/" + str(self.ctxlength)
-                + " in {" + " ".join(map(str, ctx)) + " }]")
-
-    def visit_TmAbs(self, ctx):
-        (new_ctx, name) = pickfreshname(ctx, self.name)
-        print("(", end="")
-        print("lambda %s" % name, end="")
-        print(": ", end="")
-        printty(self.type)
-        print(" . ", end="")
-        printtm(self.term, new_ctx)
-        print(")", end="")
-
-    def visit_TmApp(self, ctx):
-        print("(", end="")
-        printtm(self.left, ctx)
-        print(" ", end="")
-        printtm(self.right, ctx)
-        print(")", end="")
-
-    def visit_TmTrue(self, ctx):
-        print("true", end="")
-
-    def visit_TmFalse(self, ctx):
-        print("false", end="")
-
-    def visit_TmIf(self, ctx):
-        print("if", end="")
-        printtm(self.term_condition, ctx)
-        print(" then ", end="")
-        printtm(self.term_then, ctx)
-        print(" else ", end="")
-        printtm(self.term_else, ctx)
-
-    def visit_TmPred(self, ctx):
-        print("pred ", end="")
-        printtm(self.term)
-
-    def visit_TmIsZero(self, ctx):
-        print("iszero ", end="")
-        printtm(self.term)
-
-    def visit_TmZero(self, ctx):
-        print("0", end="")
-
-    def visit_TmSucc(self, ctx):
+                + " in {" + " ".join(map(str, ctx)) + " }]\n")
+
+    def visit_TmAbs(self, ctx, out):
+        with mgr_pickfreshname(ctx, self.name) as name:
+            out.append("(lambda %s: " % name)
+            TypesPrinter.visit(self.type, out)
+            out.append(" . ")
+            TermsPrinter.visit(self.term, ctx, out)
+        out.append(")")
+
+    def visit_TmApp(self, ctx, out):
+        out.append("(")
+        TermsPrinter.visit(self.left, ctx, out)
+        out.append(" ")
+        TermsPrinter.visit(self.right, ctx, out)
+        out.append(")")
+
+    def visit_TmLet(self, ctx, out):
+        out.append("let %s = " % ctx.freshname(self.name))
+        TermsPrinter.visit(self.let_term, ctx, out)
+        out.append(" in ")
+        with mgr_pickfreshname(ctx, self.name):
+            TermsPrinter.visit(self.in_term, ctx, out)
+
+    def visit_TmTrue(self, ctx, out):
+        out.append("true")
+
+    def visit_TmFalse(self, ctx, out):
+        out.append("false")
+
+    def visit_TmIf(self, ctx, out):
+        out.append("if ")
+        TermsPrinter.visit(self.term_condition, ctx, out)
+        out.append(" then ")
+        TermsPrinter.visit(self.term_then, ctx, out)
+        out.append(" else ")
+        TermsPrinter.visit(self.term_else, ctx, out)
+
+    def visit_TmPred(self, ctx, out):
+        out.append("pred ")
+        TermsPrinter.visit(self.term, ctx, out)
+
+    def visit_TmIsZero(self, ctx, out):
+        out.append("iszero ")
+        TermsPrinter.visit(self.term, ctx, out)
+
+    def visit_TmZero(self, ctx, out):
+        out.append("0")
+
+    def visit_TmSucc(self, ctx, out):
         num = 1
         t = self
         while type(t.term) is TmSucc:
             num += 1
             t = t.term
         if type(t.term) is TmZero:
-            print(str(num), end="")
+            out.append(str(num))
         else:
-            print("(succ ", end="")
-            printtm(t.term, ctx)
-            print(")", end="")
-
-printtm = TermsPrinter.visit
+            out.append("(succ ")
+            TermsPrinter.visit(t.term, ctx, out)
+            out.append(")")
+
+def format_term(ctx, term):
+    out = []
+    TermsPrinter.visit(term, as_context(ctx), out)
+    return "".join(out)
+
+def printtm(term, ctx, out=None):
+    """
+    Append the text of 'term' to 'out', or write it to the standard
+    output at once when 'out' is not given
+    """
+    if out is None:
+        sys.stdout.write(format_term(ctx, term))
+    else:
+        TermsPrinter.visit(term, as_context(ctx), out)
@@ -13,3 +13,6 @@ lambda x:A. x;
 (lambda x:X. lambda y:X->X. y x);
 (lambda x:X->X. x 0) (lambda y:Nat. y);
 
+
+let twice = lambda g:G. lambda y:Y. g (g y) in
+  if twice (lambda b:Bool. b) true then twice (lambda n:Nat. succ n) 0 else 0;
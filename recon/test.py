@@ -3,6 +3,7 @@ from parser import Parser
 from lexer import Lexer
 import syntax
 import core
+import solver
 
 class ParserTestCase(unittest.TestCase):
     
@@ -138,5 +139,250 @@ class ReconstructionTestCase(unittest.TestCase):
         tyT = core.applysubst(unify_constr, tyT)
         self.assertIsInstance(tyT, syntax.TyNat)
 
+    def test_constraint_order(self):
+        """Constraints of a node precede the ones of its subterms"""
+        ast = self.parser.parse("lambda f:F. f (iszero (f 0));")
+        iuvargen = core.uvargen()
+        nextuvar = lambda: next(iuvargen)
+        constr = [(syntax.TyBool(), syntax.TyBool())]
+        tyT = core.reconstruct(
+            ast[0].term, [], nextuvar, constr, core.Substitution())
+        F = syntax.TyId("F")
+        X0 = syntax.TyId("?X0")
+        X1 = syntax.TyId("?X1")
+        self.assertEqual(constr, [
+            (syntax.TyBool(), syntax.TyBool()),
+            (F, syntax.TyArr(syntax.TyBool(), X1)),
+            (X0, syntax.TyNat()),
+            (F, syntax.TyArr(syntax.TyNat(), X0)),
+        ])
+        self.assertEqual(tyT, syntax.TyArr(F, X1))
+
+class SolverTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def reconstruct(self, source):
+        cmd = self.parser.parse(source)[-1]
+        iuvargen = core.uvargen()
+        nextuvar = lambda: next(iuvargen)
+        return core.recon(cmd.term, self.parser._ctx, nextuvar)
+
+    def canonical(self, tyT, names=None):
+        """'tyT' with its variables renamed in order of appearance"""
+        if names is None:
+            names = {}
+        if type(tyT) is syntax.TyArr:
+            return syntax.TyArr(
+                self.canonical(tyT.left, names),
+                self.canonical(tyT.right, names))
+        elif type(tyT) is syntax.TyId:
+            return syntax.TyId(names.setdefault(tyT.name, "T%d" % len(names)))
+        return tyT
+
+    def assertSameAsSubst(self, source):
+        """
+        Solutions may differ in which variable of a class of equal ones
+        is left unsolved
+        """
+        (tyT, constr) = self.reconstruct(source)
+        expected = core.applysubst(core.unify([], constr), tyT)
+        subst = solver.unify([], constr)
+        for (tyX, tyS) in subst:
+            self.assertIsInstance(tyX, syntax.TyId)
+        self.assertEqual(
+            self.canonical(core.applysubst(subst, tyT)),
+            self.canonical(expected))
+        return expected
+
+    def test_same_as_subst(self):
+        self.assertSameAsSubst("lambda x:A. x;")
+        self.assertSameAsSubst(
+            "(lambda x:Bool -> Bool. x true)(lambda y: Bool. y);")
+        self.assertSameAsSubst("(lambda x:X->X. x 0) (lambda y:Nat. y);")
+        self.assertSameAsSubst("lambda f:F. lambda x:X. f (f x);")
+        tyT = self.assertSameAsSubst(
+            "lambda f:F. lambda g:G. lambda x:X. if f x then g x else 0;")
+        self.assertEqual(
+            syntax.format_type([], tyT),
+            "X -> Bool -> X -> Nat -> X -> Nat")
+
+    def test_solved_variables(self):
+        (tyT, constr) = self.reconstruct(
+            "(lambda x:Bool -> Bool. x true)(lambda y: Bool. y);")
+        subst = dict(solver.unify([], constr))
+        # '?X1' is solved through '?X0'
+        self.assertIs(subst[syntax.TyId("?X0")], syntax.TyBool())
+        self.assertIs(subst[syntax.TyId("?X1")], syntax.TyBool())
+
+    def test_circular(self):
+        (tyT, constr) = self.reconstruct("lambda x:X. x x;")
+        with self.assertRaisesRegex(RuntimeError, "Circular"):
+            solver.unify([], constr)
+
+    def test_unsolvable(self):
+        (tyT, constr) = self.reconstruct("lambda x:X. if x then x 0 else 0;")
+        with self.assertRaisesRegex(RuntimeError, "Unsolvable"):
+            solver.unify([], constr)
+
+class StoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+        iuvargen = core.uvargen()
+        self.nextuvar = lambda: next(iuvargen)
+
+    def reconstruct(self, source):
+        cmd = self.parser.parse(source)[-1]
+        return core.recon(cmd.term, self.parser._ctx, self.nextuvar)
+
+    def test_incremental(self):
+        sources = [
+            "lambda f:F. lambda x:X. f (f x);",
+            "(lambda x:Bool -> Bool. x true)(lambda y: Bool. y);",
+            "lambda f:F. lambda g:G. lambda x:X. if f x then g x else 0;",
+        ]
+        store = solver.Solver()
+        types = []
+        constr = []
+        for source in sources:
+            (tyT, constr_cmd) = self.reconstruct(source)
+            store.solve(constr_cmd)
+            types.append(tyT)
+            constr += constr_cmd
+        subst = core.unify([], constr)
+        for tyT in types:
+            self.assertEqual(
+                syntax.format_type([], store.resolve(tyT)),
+                syntax.format_type([], core.applysubst(subst, tyT)))
+
+    def test_rollback(self):
+        for store in (solver.Solver(), core.Substitution()):
+            (tyT, constr) = self.reconstruct("lambda f:F. lambda x:X. f x;")
+            store.solve(constr)
+            expected = syntax.format_type([], store.resolve(tyT))
+
+            (tyS, constr) = self.reconstruct(
+                "lambda x:X. if x then x 0 else 0;")
+            store.checkpoint()
+            with self.assertRaisesRegex(RuntimeError, "Unsolvable"):
+                store.solve(constr)
+            store.rollback()
+            self.assertEqual(
+                syntax.format_type([], store.resolve(tyT)), expected)
+
+    def test_nested_checkpoints(self):
+        store = solver.Solver()
+        (tyT, constr) = self.reconstruct("lambda f:F. lambda x:X. f x;")
+        tyF = syntax.TyId("F")
+        store.checkpoint()
+        store.solve(constr)
+        store.checkpoint()
+        store.solve([(syntax.TyId("X"), syntax.TyNat())])
+        self.assertIs(
+            store.resolve(tyF),
+            syntax.TyArr(syntax.TyNat(), syntax.TyId("?X0")))
+        store.rollback()
+        self.assertIs(
+            store.resolve(tyF),
+            syntax.TyArr(syntax.TyId("X"), syntax.TyId("?X0")))
+        store.rollback()
+        self.assertIs(store.resolve(tyF), tyF)
+
+    def test_circular_unreachable(self):
+        # the circular class is not part of the type of the command
+        (tyT, constr) = self.reconstruct(
+            "(lambda f:F. 0) (lambda x:X. x x);")
+        with self.assertRaisesRegex(RuntimeError, "Circular"):
+            solver.Solver().solve(constr)
+
+class LetTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def infer(self, source, store):
+        cmd = self.parser.parse(source)[-1]
+        iuvargen = core.uvargen()
+        nextuvar = lambda: next(iuvargen)
+        constr = []
+        tyT = core.reconstruct(
+            cmd.term, self.parser._ctx, nextuvar, constr, store)
+        store.solve(constr)
+        return syntax.format_type([], store.resolve(tyT))
+
+    def assertInfers(self, source, expected):
+        for store in (core.Substitution(), solver.Solver()):
+            self.assertEqual(self.infer(source, store), expected)
+
+    def assertUnsolvable(self, source):
+        for store in (core.Substitution(), solver.Solver()):
+            with self.assertRaisesRegex(RuntimeError, "Unsolvable"):
+                self.infer(source, store)
+
+    def test_parse(self):
+        term = self.parser.parse("let x = true in x;")[0].term
+        self.assertIsInstance(term, syntax.TmLet)
+        self.assertIsInstance(term.let_term, syntax.TmTrue)
+        self.assertEqual(term.in_term.index, 0)
+        self.assertEqual(
+            syntax.format_term([], term), "let x = true in x")
+
+    def test_polymorphic(self):
+        self.assertInfers(
+            "let id = lambda x:X. x in if id true then id 0 else 0;", "Nat")
+        self.assertInfers(
+            "let twice = lambda f:F. lambda x:X. f (f x) in"
+            " if twice (lambda b:Bool. b) true"
+            " then twice (lambda n:Nat. succ n) 0 else 0;", "Nat")
+        # instances of a scheme are generalized again
+        self.assertInfers(
+            "let id = lambda x:X. x in let g = id in"
+            " if g true then g 0 else 0;", "Nat")
+
+    def test_escaping_variables(self):
+        # 'Y' is bound outside of the 'let' and stays monomorphic
+        self.assertInfers(
+            "lambda y:Y. let f = lambda x:X. y in"
+            " if f 0 then f true else false;", "Bool -> Bool")
+        self.assertUnsolvable(
+            "lambda y:Y. let f = y in if f 0 then 0 else f true;")
+        self.assertUnsolvable(
+            "lambda y:Y. let f = lambda x:X. if true then x else y in"
+            " if f true then f 0 else 0;")
+
+    def test_bound_term_checked(self):
+        self.assertUnsolvable("let x = succ true in 0;")
+
+    def test_recon_without_store(self):
+        # the constraint on 'y' is solved at the 'let' and still returned
+        cmd = self.parser.parse("lambda y:Y. let z = y 0 in z;")[0]
+        iuvargen = core.uvargen()
+        (tyT, constr) = core.recon(
+            cmd.term, self.parser._ctx, lambda: next(iuvargen))
+        tyT = core.applysubst(core.unify([], constr), tyT)
+        self.assertIsInstance(tyT.left, syntax.TyArr)
+        self.assertIsInstance(tyT.left.left, syntax.TyNat)
+        self.assertEqual(tyT.left.right, tyT.right)
+
+    def test_generalize_levels(self):
+        store = solver.Solver()
+        self.infer("lambda y:Y. let f = lambda x:X. y x in f;", store)
+        (name_x, name_y) = ("X", "Y")
+        self.assertEqual(store.variable(name_y).level, 0)
+        # 'X' is reached from 'Y' through 'Y = X -> ?X0'
+        self.assertEqual(store.find(store.variable(name_x)).level, 0)
+
+class EvaluateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def test_let(self):
+        term = self.parser.parse(
+            "let f = lambda x:X. x in f (iszero (f 0));")[0].term
+        self.assertIsInstance(core.evaluate([], term), syntax.TmTrue)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+Benchmarks for simplebool.
+
+    python bench.py suite --json results.json
+"""
+
+import argparse
+import sys
+
+from parser import Parser
+import syntax
+import core
+from common import benchmark
+
+def nested_if(depth):
+    """Source of 'depth' 'if's nested in the condition of one another"""
+    return "%strue%s;" % ("if " * depth, " then false else true" * depth)
+
+def applications(depth):
+    """Source of 'depth' nested applications of the negation"""
+    return "(lambda f:Bool->Bool. %strue%s) %s;" % (
+        "f (" * depth, ")" * depth,
+        "(lambda x:Bool. if x then false else true)")
+
+def checked(source, depth):
+    """
+    Workload type checking and evaluating 'source', whose terms are
+    nested 'depth' deep
+    """
+    (cmd,) = Parser().parse(source)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * depth + 100))
+
+    def run():
+        core.typeof(cmd.term, [])
+        return core.evaluate_steps([], cmd.term).steps
+    return run
+
+WORKLOADS = {
+    "if": (lambda size: checked(nested_if(size), size), (100, 200, 400)),
+    "apps": (
+        lambda size: checked(applications(size), size), (100, 200, 400)),
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("benchmark", choices=["suite"])
+    arg_parser.add_argument("--size", type=int)
+    arg_parser.add_argument("--number", type=int)
+    benchmark.add_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    if args.benchmark == "suite":
+        benchmark.main("simplebool", syntax, WORKLOADS, args)
+
+if __name__ == '__main__':
+    main()
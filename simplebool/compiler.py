@@ -0,0 +1,10 @@
+"""
+Closure-conversion backend for simplebool, see 'common.compiler'.
+"""
+
+import syntax
+import core
+from common.compiler import Compiler
+
+compiler = Compiler(syntax, core.evaluate)
+evaluate = compiler.evaluate
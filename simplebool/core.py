@@ -1,7 +1,6 @@
 from syntax import *
 
-class NoRuleApplies(RuntimeError):
-    pass
+from common.evaluation import NoRuleApplies, run
 
 # ------------------------   EVALUATION  ------------------------
 
@@ -31,7 +30,7 @@ class Evaluate(Visitor):
         elif isinstance(term.term_condition, TmFalse):
             return term.term_else
         else:
-            new_term_condition = evaluate(ctx, term.term_condition)
+            new_term_condition = evaluate1(term.term_condition, ctx)
             return TmIf(
                 term.info,
                 new_term_condition,
@@ -43,11 +42,11 @@ class Evaluate(Visitor):
 evaluate1 = Evaluate.visit
 
 
+def evaluate_steps(ctx, term, max_steps=None, stop=isval):
+    return run(lambda t: evaluate1(t, ctx), term, stop, max_steps)
+
 def evaluate(ctx, term):
-    try:
-        return evaluate(ctx, evaluate1(term, ctx))
-    except NoRuleApplies:
-        return term
+    return evaluate_steps(ctx, term).term
 
 # ------------------------   TYPING  ------------------------
 
@@ -68,7 +67,7 @@ class Typeof(Visitor):
         typeRight = typeof(term.right, ctx)
 
         if type(typeLeft) is TyArr:
-            if type(typeRight) == type(typeLeft.left):
+            if typeRight is typeLeft.left:
                 return typeLeft.right
             else:
                 raise RuntimeError(
@@ -87,7 +86,7 @@ class Typeof(Visitor):
         if type(typeCond) is TyBool:
             typeThen = typeof(term.term_then, ctx)
             typeElse = typeof(term.term_else, ctx)
-            if type(typeThen) == type(typeElse):
+            if typeThen is typeElse:
                 return typeThen
             else:
                 raise RuntimeError(
@@ -1,12 +1,22 @@
+import os
+import sys
 from collections import namedtuple
+from contextlib import contextmanager
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from common.context import Context, as_context
+from common.intern import internedtuple
+from common.substitution import substtop_onvar
+from common.visitor import Visitor
 
 # ----------------------------------------------------------------------
 # Datatypes
 
 # Types
 
-TyArr = namedtuple("TyArr", ["left", "right"])
-TyBool = namedtuple("TyBool", [])
+TyArr = internedtuple("TyArr", ["left", "right"])
+TyBool = internedtuple("TyBool", [])
 
 
 # Terms
@@ -39,16 +49,17 @@ def addname(ctx, name):
     return addbinding(ctx, name, NameBind())
 
 def isnamebound(ctx, name):
-    for ctx_name, _ in ctx:
-        if ctx_name == name:
-            return True
-    return False
+    return ctx.isnamebound(name)
 
-def pickfreshname(ctx, name):
-    new_name = str(name)
-    while isnamebound(ctx, new_name):
-        new_name += "'"
-    return ctx + [(new_name, NameBind())], new_name
+@contextmanager
+def mgr_pickfreshname(ctx, name):
+    """Bind a fresh variant of 'name' while the block runs"""
+    new_name = ctx.freshname(name)
+    addname(ctx, new_name)
+    try:
+        yield new_name
+    finally:
+        ctx.pop()
 
 def get_ctx_item(ctx, index):
     try:
@@ -63,10 +74,7 @@ def index2name(ctx, index):
     return name
 
 def name2index(ctx, name):
-    for index, (v, _) in enumerate(reversed(ctx)):
-        if name == v:
-            return index
-    raise ValueError("Identifier %s is unbound" % name)
+    return ctx.name2index(name)
 
 # ----------------------------------------------------------------------
 # Shifting
@@ -110,7 +118,8 @@ def termSubst(j, s, t):
     )
 
 def termSubstTop(s, t):
-    return termShift(-1, termSubst(0, termShift(1, s), t))
+    onvar = substtop_onvar(TmVar, termShift, s)
+    return tmmap(onvar, 0, t)
 
 # ----------------------------------------------------------------------
 # Context management (continued)
@@ -138,73 +147,86 @@ class Info(namedtuple("Info", ["filename", "lineno"])):
         return '<%s:%s>' % self
 
 
-class Visitor:
-
-    @classmethod
-    def visit(cls, term, *args, **kwargs):
-        method_name = 'visit_' + term.__class__.__name__
-        method = getattr(cls, method_name, getattr(cls, 'visit__', None))
-
-        if method is None:
-            raise AttributeError(
-                "type object '%s' has no attribute '%s'" %
-                (cls.__name__, method_name))
-        return method(term, *args, **kwargs)
-
-
 class TypesPrinter(Visitor):
+    """Appends the text of a type to the list of chunks 'out'"""
 
-    def visit_TyArr(self):
-        printty(self.left)
-        print(" -> ", end="")
-        printty(self.right)
+    def visit_TyArr(self, out):
+        TypesPrinter.visit(self.left, out)
+        out.append(" -> ")
+        TypesPrinter.visit(self.right, out)
 
-    def visit_TyBool(self):
-        print("Bool", end="")
+    def visit_TyBool(self, out):
+        out.append("Bool")
 
 
-printty = TypesPrinter.visit
+def format_type(ctx, tyT):
+    out = []
+    TypesPrinter.visit(tyT, out)
+    return "".join(out)
+
+def printty(tyT, out=None):
+    """
+    Append the text of 'tyT' to 'out', or write it to the standard
+    output at once when 'out' is not given
+    """
+    if out is None:
+        sys.stdout.write(format_type([], tyT))
+    else:
+        TypesPrinter.visit(tyT, out)
 
 
 class TermsPrinter(Visitor):
+    """Appends the text of a term to the list of chunks 'out'"""
 
-    def visit_TmVar(self, ctx):
+    def visit_TmVar(self, ctx, out):
         if len(ctx) == self.ctxlength:
-            print(index2name(ctx, self.index), end="")
+            out.append(index2name(ctx, self.index))
         else:
-            print(
+            out.append(
                 "[bad index: " + str(self.index) + "/" + str(self.ctxlength)
-                + " in {" + " ".join(map(str, ctx)) + " }]")
-
-    def visit_TmAbs(self, ctx):
-        (new_ctx, name) = pickfreshname(ctx, self.name)
-        print("(", end="")
-        print("lambda %s" % name, end="")
-        print(": ", end="")
-        printty(self.type)
-        print(" . ", end="")
-        printtm(self.term, new_ctx)
-        print(")", end="")
-
-    def visit_TmApp(self, ctx):
-        print("(", end="")
-        printtm(self.left, ctx)
-        print(" ", end="")
-        printtm(self.right, ctx)
-        print(")", end="")
-
-    def visit_TmTrue(self, ctx):
-        print("true", end="")
-
-    def visit_TmFalse(self, ctx):
-        print("false", end="")
-
-    def visit_TmIf(self):
-        print("if", end="")
-        printtm(self.term_condition)
-        print(" then ", end="")
-        printtm(self.term_then)
-        print(" else")
-
-
-printtm = TermsPrinter.visit
+                + " in {" + " ".join(map(str, ctx)) + " }]\n")
+
+    def visit_TmAbs(self, ctx, out):
+        with mgr_pickfreshname(ctx, self.name) as name:
+            out.append("(lambda %s: " % name)
+            TypesPrinter.visit(self.type, out)
+            out.append(" . ")
+            TermsPrinter.visit(self.term, ctx, out)
+        out.append(")")
+
+    def visit_TmApp(self, ctx, out):
+        out.append("(")
+        TermsPrinter.visit(self.left, ctx, out)
+        out.append(" ")
+        TermsPrinter.visit(self.right, ctx, out)
+        out.append(")")
+
+    def visit_TmTrue(self, ctx, out):
+        out.append("true")
+
+    def visit_TmFalse(self, ctx, out):
+        out.append("false")
+
+    def visit_TmIf(self, ctx, out):
+        out.append("if ")
+        TermsPrinter.visit(self.term_condition, ctx, out)
+        out.append(" then ")
+        TermsPrinter.visit(self.term_then, ctx, out)
+        out.append(" else ")
+        TermsPrinter.visit(self.term_else, ctx, out)
+
+
+def format_term(ctx, term):
+    out = []
+    TermsPrinter.visit(term, as_context(ctx), out)
+    return "".join(out)
+
+def printtm(term, ctx, out=None):
+    """
+    Append the text of 'term' to 'out', or write it to the standard
+    output at once when 'out' is not given
+    """
+    if out is None:
+        sys.stdout.write(format_term(ctx, term))
+    else:
+        TermsPrinter.visit(term, as_context(ctx), out)
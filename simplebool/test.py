@@ -2,6 +2,8 @@ import unittest
 from parser import Parser
 from lexer import Lexer
 import syntax
+import core
+import compiler
 
 class LexerTestCase(unittest.TestCase):
 
@@ -79,6 +81,80 @@ class ParserTestCase(unittest.TestCase):
         self.assertIsInstance(
             ast[0].term.term, syntax.TmVar)
 
+class EvaluateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def test_if_guard_steps(self):
+        ast = self.parser.parse(
+            "if (lambda x:Bool. x) true then false else true;")
+        term = ast[0].term
+
+        result = core.evaluate_steps([], term, max_steps=1)
+        self.assertFalse(result.done)
+        self.assertEqual(result.steps, 1)
+        self.assertIsInstance(result.term, syntax.TmIf)
+        self.assertIsInstance(result.term.term_condition, syntax.TmTrue)
+
+        result = core.evaluate_steps([], term)
+        self.assertTrue(result.done)
+        self.assertEqual(result.steps, 2)
+        self.assertIsInstance(result.term, syntax.TmFalse)
+
+class CompilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def assertSameAsSubst(self, source):
+        # evaluation never changes a term, both engines run the same one
+        ctx = []
+        ast = self.parser.parse(source)
+        for cmd in ast[:-1]:
+            syntax.addbinding(ctx, cmd.name, cmd.binding)
+        term = ast[-1].term
+        expected = core.evaluate(ctx, term)
+        result = compiler.evaluate(ctx, term)
+        self.assertEqual(result, expected)
+        return result
+
+    def test_abs_app(self):
+        self.assertSameAsSubst(
+            "(lambda f:Bool->Bool. lambda x:Bool. f (f x))"
+            "(lambda y:Bool. if y then false else true);")
+        self.assertSameAsSubst(
+            "(lambda f:Bool->Bool. lambda x:Bool. f (f x))"
+            "(lambda y:Bool. if y then false else true) true;")
+
+    def test_if(self):
+        result = self.assertSameAsSubst(
+            "if (lambda x:Bool. x) true then false else true;")
+        self.assertIsInstance(result, syntax.TmFalse)
+
+    def test_free_variable(self):
+        # variables are not values, so both engines leave it stuck
+        result = self.assertSameAsSubst("x:Bool; (lambda y:Bool. y) x;")
+        self.assertIsInstance(result, syntax.TmApp)
+
+class TypeOfTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def test_interned_types(self):
+        ty = syntax.TyArr(syntax.TyBool(), syntax.TyBool())
+        self.assertIs(ty, syntax.TyArr(syntax.TyBool(), syntax.TyBool()))
+        self.assertIsNot(ty, syntax.TyArr(ty, syntax.TyBool()))
+
+        ast = self.parser.parse("lambda x:Bool->Bool. x;")
+        ty_term = core.typeof(ast[0].term, [])
+        self.assertIs(ty_term, syntax.TyArr(ty, ty))
+
+    def test_arrow_mismatch(self):
+        ast = self.parser.parse("(lambda f:Bool->Bool. f) true;")
+        with self.assertRaises(RuntimeError):
+            core.typeof(ast[0].term, [])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+Micro-benchmarks for the untyped calculus.
+
+    python bench.py subst
+    python bench.py church --size 80
+    python bench.py suite --json results.json
+"""
+
+import argparse
+import timeit
+
+from parser import Parser
+from syntax import *
+import syntax
+import core
+import machine
+from common import benchmark
+
+def church(n):
+    body = "x"
+    for _ in range(n):
+        body = "f (%s)" % body
+    return "(lambda f. lambda x. %s)" % body
+
+def count_new(term, seen):
+    """Number of nodes of 'term' not yet in 'seen' (compared by identity)"""
+    count = 0
+    stack = [term]
+    while stack:
+        t = stack.pop()
+        if id(t) in seen:
+            continue
+        seen.add(id(t))
+        count += 1
+        if type(t) is TmAbs:
+            stack.append(t.term)
+        elif type(t) is TmApp:
+            stack.append(t.left)
+            stack.append(t.right)
+    return count
+
+def subst_unfused(s, t):
+    return termShift(-1, termSubst(0, termShift(1, s), t))
+
+def bench_subst(size, number):
+    """
+    Nodes allocated and time spent by a single beta step
+    '(lambda f. t) s' where both 't' and 's' are Church numerals
+    """
+    parser = Parser()
+    (cmd,) = parser.parse("%s;" % church(size))
+    t = cmd.term.term
+    s = cmd.term
+
+    seen = set()
+    count_new(s, seen)
+    count_new(t, seen)
+    s1 = termShift(1, s)
+    t1 = termSubst(0, s1, t)
+    t2 = termShift(-1, t1)
+    unfused = sum(count_new(x, seen) for x in (s1, t1, t2))
+
+    seen = set()
+    count_new(s, seen)
+    count_new(t, seen)
+    fused = count_new(termSubstTop(s, t), seen)
+
+    time_unfused = timeit.timeit(lambda: subst_unfused(s, t), number=number)
+    time_fused = timeit.timeit(lambda: termSubstTop(s, t), number=number)
+
+    print("term size: %d nodes" % count_new(cmd.term, set()))
+    print("nodes allocated per beta step: %d unfused, %d fused" %
+          (unfused, fused))
+    print("time per beta step: %.1f us unfused, %.1f us fused" %
+          (time_unfused / number * 1e6, time_fused / number * 1e6))
+
+def church_times(size):
+    """Source of 'times c<size> c<size>' applied to two identities"""
+    times = "(lambda m. lambda n. lambda f. m (n f))"
+    return "%s %s %s (lambda x. x) (lambda y. y);" % (
+        times, church(size), church(size))
+
+def bench_church(size, number):
+    """
+    Time to evaluate 'times c<size> c<size>' applied to two identities
+    with the substitution evaluator and with the CEK machine
+    """
+    parser = Parser()
+    (cmd,) = parser.parse(church_times(size))
+
+    for name, evaluate_steps in (("subst", core.evaluate_steps),
+                                 ("cek", machine.evaluate_steps)):
+        result = evaluate_steps([], cmd.term)
+        elapsed = timeit.timeit(
+            lambda: evaluate_steps([], cmd.term), number=number)
+        print("%s: %d steps, %.1f ms" %
+              (name, result.steps, elapsed / number * 1e3))
+
+# Church booleans, pairs and predecessor and the call-by-value fixpoint
+# combinator, written out in full as the calculus has no abbreviations
+TRU = "(lambda t. lambda f. t)"
+FLS = "(lambda t. lambda f. f)"
+ISZRO = "(lambda n. n (lambda x. %s) %s)" % (FLS, TRU)
+SCC = "(lambda n. lambda s. lambda z. s (n s z))"
+PAIR = "(lambda a. lambda b. lambda s. s a b)"
+PRD = "(lambda m. m (lambda p. %s (p %s) (%s (p %s))) (%s %s %s) %s)" % (
+    PAIR, FLS, SCC, FLS, PAIR, church(0), church(0), TRU)
+FIX = "(lambda f. (lambda x. f (lambda v. x x v)) (lambda x. f (lambda v. x x v)))"
+
+def countdown(size):
+    """
+    Source of a loop through the fixpoint combinator that counts
+    c<size> down to zero with the predecessor
+    """
+    loop = "(%s (lambda g. lambda n. %s n (lambda u. lambda y. y)" \
+        " (lambda u. g (%s n)) (lambda y. y)))" % (FIX, ISZRO, PRD)
+    return "%s %s;" % (loop, church(size))
+
+def evaluation(source):
+    """Workload evaluating 'source' with the substitution evaluator"""
+    (cmd,) = Parser().parse(source)
+    return lambda: core.evaluate_steps([], cmd.term).steps
+
+WORKLOADS = {
+    "church": (lambda size: evaluation(church_times(size)), (10, 20, 40)),
+    "fix": (lambda size: evaluation(countdown(size)), (5, 10, 20)),
+}
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("benchmark", choices=["subst", "church", "suite"])
+    arg_parser.add_argument("--size", type=int)
+    arg_parser.add_argument("--number", type=int)
+    benchmark.add_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    if args.benchmark == "subst":
+        bench_subst(args.size or 50, args.number or 200)
+    elif args.benchmark == "church":
+        bench_church(args.size or 50, args.number or 1)
+    elif args.benchmark == "suite":
+        benchmark.main("untyped", syntax, WORKLOADS, args)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,6 @@
 from syntax import *
 
-class NoRuleApplies(RuntimeError):
-    pass
+from common.evaluation import NoRuleApplies, run
 
 def isval(term):
     return isinstance(term, TmAbs)
@@ -19,8 +18,8 @@ def evaluate1(ctx, term):
     else:
         raise NoRuleApplies
 
+def evaluate_steps(ctx, term, max_steps=None, stop=isval):
+    return run(lambda t: evaluate1(ctx, t), term, stop, max_steps)
+
 def evaluate(ctx, term):
-    try:
-        return evaluate(ctx, evaluate1(ctx, term))
-    except NoRuleApplies:
-        return term
\ No newline at end of file
+    return evaluate_steps(ctx, term).term
\ No newline at end of file
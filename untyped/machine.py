@@ -0,0 +1,144 @@
+"""
+Environment-based evaluator (CEK machine) for the untyped calculus.
+
+Instead of rebuilding the term on every beta step, the machine keeps
+closures: a 'TmAbs' paired with an environment that holds the values of
+its free variables. The environment is a linked list, so extending it is
+O(1) and the body is never copied during evaluation. The final value is
+read back into an ordinary term once, at the end, so it can be shown by
+'printtm' exactly like the result of 'core.evaluate'.
+
+Evaluation order is the same as in 'core.evaluate1' (call-by-value, left
+to right). A free variable (bound in the top-level context) is stuck, and
+so is every application that needs its value, in which case the
+surrounding term is read back as is.
+"""
+
+from collections import namedtuple
+
+from syntax import *
+from common.evaluation import Evaluation
+
+# Values
+
+Closure = namedtuple("Closure", ["term", "env"])
+Neutral = namedtuple("Neutral", ["term"])
+
+# Environment: linked list of values, 'None' is the empty environment
+
+Env = namedtuple("Env", ["value", "next", "size"])
+
+def extend(env, value):
+    return Env(value, env, env.size + 1 if env else 1)
+
+def envsize(env):
+    return env.size if env else 0
+
+def lookup(env, index):
+    while index:
+        env = env.next
+        index -= 1
+    return env.value
+
+# Continuation frames
+
+EvalArg = namedtuple("EvalArg", ["term", "env"])
+ApplyFun = namedtuple("ApplyFun", ["term", "value"])
+
+# ----------------------------------------------------------------------
+# Read back
+
+def readback_term(ctxlength, term, env, c=0):
+    """
+    Term 'term' under environment 'env' and 'c' extra binders as a plain
+    term valid in a context of 'ctxlength' names
+    """
+    size = envsize(env)
+
+    def walk(c, t):
+        ty_t = type(t)
+        if ty_t is TmVar:
+            x = t.index
+            if x < c:
+                return TmVar(t.info, x, ctxlength + c)
+            elif x - c < size:
+                return termShift(c, readback(ctxlength, lookup(env, x - c)))
+            return TmVar(t.info, x - size, ctxlength + c)
+        elif ty_t is TmAbs:
+            return TmAbs(t.info, t.name, walk(c + 1, t.term))
+        elif ty_t is TmApp:
+            return TmApp(t.info, walk(c, t.left), walk(c, t.right))
+        raise NotImplementedError(t)
+
+    return walk(c, term)
+
+def readback(ctxlength, value):
+    if type(value) is Neutral:
+        return value.term
+    return readback_term(ctxlength, value.term, value.env)
+
+def unwind(ctxlength, term, stack):
+    """Plug 'term' into the pending continuation frames"""
+    while stack:
+        frame = stack.pop()
+        if type(frame) is EvalArg:
+            right = readback_term(ctxlength, frame.term, frame.env)
+            term = TmApp(frame.term.info, term, right)
+        else:
+            left = readback(ctxlength, frame.value)
+            term = TmApp(frame.term.info, left, term)
+    return term
+
+# ----------------------------------------------------------------------
+# Evaluation
+
+def evaluate_steps(ctx, term, max_steps=None):
+    """
+    Evaluate 'term' with the CEK machine, counting beta reductions as
+    steps. Returns the same 'Evaluation' record as 'core.evaluate_steps'
+    """
+    ctxlength = len(ctx)
+    stack = []
+    env = None
+    steps = 0
+    while True:
+        # Eval: descend into the control term
+        ty_t = type(term)
+        if ty_t is TmApp:
+            stack.append(EvalArg(term.right, env))
+            term = term.left
+            continue
+        elif ty_t is TmAbs:
+            value = Closure(term, env)
+        elif ty_t is TmVar:
+            if term.index < envsize(env):
+                value = lookup(env, term.index)
+            else:
+                value = Neutral(readback_term(ctxlength, term, env))
+        else:
+            raise NotImplementedError(term)
+
+        # Apply: return 'value' to the continuation
+        while stack:
+            if type(value) is Neutral:
+                result = unwind(ctxlength, value.term, stack)
+                return Evaluation(result, steps, True)
+            frame = stack.pop()
+            if type(frame) is EvalArg:
+                stack.append(ApplyFun(frame.term, value))
+                term, env = frame.term, frame.env
+                break
+            if max_steps is not None and steps >= max_steps:
+                stack.append(frame)
+                result = unwind(ctxlength, readback(ctxlength, value), stack)
+                return Evaluation(result, steps, False)
+            closure = frame.value
+            term = closure.term.term
+            env = extend(closure.env, value)
+            steps += 1
+            break
+        else:
+            return Evaluation(readback(ctxlength, value), steps, True)
+
+def evaluate(ctx, term):
+    return evaluate_steps(ctx, term).term
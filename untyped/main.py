@@ -1,36 +1,64 @@
 import argparse
+import functools
+import sys
 
 from parser import Parser
 import syntax
 import core
+from common import batch, stream, tables
+import machine
 
+engines = {
+    "subst": core.evaluate,
+    "cek": machine.evaluate,
+}
 
-def process_command(cmd, ctx):
+def process_command(cmd, ctx, evaluate=core.evaluate):
+    out = []
     if isinstance(cmd, syntax.Eval):
-        term = core.evaluate(ctx, cmd.term)
-        syntax.printtm(term, ctx)
-        print("")
+        term = evaluate(ctx, cmd.term)
+        syntax.printtm(term, ctx, out)
+        out.append("\n")
     elif isinstance(cmd, syntax.Bind):
-        print(cmd.name)
+        out.append(cmd.name + "\n")
         syntax.addbinding(ctx, cmd.name, cmd.binding)
+    sys.stdout.write("".join(out))
 
-def parse_file(f):
+def parse_file(f, parser=None):
     with open(f, 'r') as f:
         text = f.read()
-    parser = Parser()
+    if parser is None:
+        parser = Parser()
     return parser.parse(text, f)
 
-def process_file(f):
-    cmds = parse_file(f)
-    ctx = []
-    for cmd in cmds:
-        process_command(cmd, ctx)
+def process_file(f, evaluate=core.evaluate, parser=None):
+    if parser is None:
+        parser = Parser()
+    ctx = syntax.Context()
+    with stream.open_input(f) as lines:
+        for cmd in stream.parse_stream(parser, lines, f):
+            process_command(cmd, ctx, evaluate)
+            sys.stdout.flush()
+
+def check_file(args, f, parser):
+    """Process 'f' as requested by the command line options 'args'"""
+    process_file(f, engines[args.engine], parser=parser)
 
 def main():
     arg_parser = argparse.ArgumentParser()
-    arg_parser.add_argument("file", help="Input file")
-    args = arg_parser.parse_args()   
-    process_file(args.file)
+    batch.add_arguments(arg_parser)
+    arg_parser.add_argument(
+        "--engine", choices=sorted(engines), default="subst",
+        help="Evaluation engine: substitution-based small-step "
+             "evaluator or environment-based CEK machine")
+    tables.add_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    make_parser = functools.partial(tables.make_parser, Parser, args)
+    check = functools.partial(check_file, args)
+    if batch.requested(args):
+        failed = batch.run(check, args.files, make_parser, args.jobs)
+        sys.exit(1 if failed else 0)
+    check(args.files[0], make_parser())
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
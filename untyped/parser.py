@@ -3,11 +3,12 @@ import ply.yacc as yacc
 from lexer import Lexer
 
 import syntax
+from common import tables
 
 """
 Commands
             : Command SEMI
-            | Command SEMI Commands
+            | Commands Command SEMI
 
 Command
             : Term
@@ -32,14 +33,18 @@ ATerm
 
 class Parser:
 
-    def __init__(self, debug=False):
-        self.lexer = Lexer()
+    def __init__(self, debug=False, optimize=False):
+        if optimize:
+            lex_options, yacc_options = tables.options(Parser, Lexer)
+        else:
+            lex_options, yacc_options = {}, {}
+        self.lexer = Lexer(**lex_options)
         self.tokens = self.lexer.tokens
         self.debug = debug
-        self.parser = yacc.yacc(module=self, debug=debug)
+        self.parser = yacc.yacc(module=self, debug=debug, **yacc_options)
 
-    def parse(self, text, filename=""):
-        self._ctx = []
+    def parse(self, text, filename="", ctx=None):
+        self._ctx = syntax.Context() if ctx is None else ctx
         self.filename = filename
         return self.parser.parse(
             text, debug=self.debug, lexer=self.lexer.lexer, tracking=True)
@@ -51,9 +56,10 @@ class Parser:
         "Commands : Command SEMI"
         p[0] = [p[1]]
         
-    def p_Commands_Command_Commands(self, p):
-        "Commands : Command SEMI Commands"
-        p[0] = [p[1]] + p[3]
+    def p_Commands_Commands_Command(self, p):
+        "Commands : Commands Command SEMI"
+        p[1].append(p[2])
+        p[0] = p[1]
         
     def p_Command(self, p):
         "Command : LCID Binder"
@@ -1,4 +1,13 @@
+import os
+import sys
 from collections import namedtuple
+from contextlib import contextmanager
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from common.context import Context, as_context
+from common.substitution import substtop_onvar
+from common.visitor import Visitor
 
 # ----------------------------------------------------------------------
 # Datatypes
@@ -29,17 +38,17 @@ def addname(ctx, name):
     return addbinding(ctx, name, NameBind())
 
 def isnamebound(ctx, name):
-    for ctx_name, _ in ctx:
-        if ctx_name == name:
-            return True
-    return False
-
-def pickfreshname(ctx, name):
-    new_name = str(name)
-    while isnamebound(ctx, new_name):
-        new_name += "'"
-    return ctx + [(new_name, NameBind())], new_name
+    return ctx.isnamebound(name)
 
+@contextmanager
+def mgr_pickfreshname(ctx, name):
+    """Bind a fresh variant of 'name' while the block runs"""
+    new_name = ctx.freshname(name)
+    addname(ctx, new_name)
+    try:
+        yield new_name
+    finally:
+        ctx.pop()
 
 def index2name(ctx, index):
     try:
@@ -50,10 +59,7 @@ def index2name(ctx, index):
     return name
 
 def name2index(ctx, name):
-    for index, (v, _) in enumerate(reversed(ctx)):
-        if name == v:
-            return index
-    raise ValueError("Identifier %s is unbound" % name)
+    return ctx.name2index(name)
 
 # ----------------------------------------------------------------------
 # Shifting
@@ -87,7 +93,8 @@ def termSubst(j, s, t):
     )
 
 def termSubstTop(s, t):
-    return termShift(-1, termSubst(0, termShift(1, s), t))
+    onvar = substtop_onvar(TmVar, termShift, s)
+    return tmmap(onvar, 0, t)
 
 # ----------------------------------------------------------------------
 # Printing
@@ -98,57 +105,66 @@ class Info(namedtuple("Info", ["filename", "lineno"])):
         return '<%s:%s>' % self
 
 
-class Visitor:
-
-    @classmethod
-    def visit(cls, term, *args, **kwargs):
-        method_name = 'visit_' + term.__class__.__name__
-        method = getattr(cls, method_name)
-        return method(term, *args, **kwargs)
-
-
 class TermsPrinter(Visitor):
+    """Appends the text of a term to the list of chunks 'out'"""
 
-    def visit_TmVar(self, ctx):
+    def visit_TmVar(self, ctx, out):
         if len(ctx) == self.ctxlength:
-            print(index2name(ctx, term.index), end="")
+            out.append(index2name(ctx, self.index))
         else:
-            print(
+            out.append(
                 "[bad index: " + str(self.index) + "/" + str(self.ctxlength)
-                + " in {" + " ".join(map(str, ctx)) + " }]")
-
-    def visit_TmAbs(self, ctx):
-        (_ctx, _name) = pickfreshname(ctx, self.name)
-        print("(", end="")
-        print("lambda %s." % _name, end="")
-        printtm(self.term, _ctx)
-        print(")", end="")
-
-    def visit_TmApp(self, ctx):
-        print("(", end="")
-        printtm(self.left, ctx)
-        print(" ", end="")
-        printtm(self.right, ctx)
-        print(")", end="")
-
-printtm = TermsPrinter.visit
+                + " in {" + " ".join(map(str, ctx)) + " }]\n")
+
+    def visit_TmAbs(self, ctx, out):
+        with mgr_pickfreshname(ctx, self.name) as name:
+            out.append("(lambda %s." % name)
+            TermsPrinter.visit(self.term, ctx, out)
+        out.append(")")
+
+    def visit_TmApp(self, ctx, out):
+        out.append("(")
+        TermsPrinter.visit(self.left, ctx, out)
+        out.append(" ")
+        TermsPrinter.visit(self.right, ctx, out)
+        out.append(")")
+
+def format_term(ctx, term):
+    out = []
+    TermsPrinter.visit(term, as_context(ctx), out)
+    return "".join(out)
+
+def printtm(term, ctx, out=None):
+    """
+    Append the text of 'term' to 'out', or write it to the standard
+    output at once when 'out' is not given
+    """
+    if out is None:
+        sys.stdout.write(format_term(ctx, term))
+    else:
+        TermsPrinter.visit(term, as_context(ctx), out)
 
 class TermsNoNamePrinter(Visitor):
 
-    def visit_TmVar(self):
-        print(self.index, end="")
-
-    def visit_TmAbs(self):
-        print("(", end="")
-        print("lambda.", end="")
-        print_noname(self.term)
-        print(")", end="")
-
-    def visit_TmApp(self):
-        print("(", end="")
-        print_noname(self.left)
-        print(" ", end="")
-        print_noname(self.right)
-        print(")", end="")
-
-printtm_noname = TermsNoNamePrinter.visit
\ No newline at end of file
+    def visit_TmVar(self, out):
+        out.append(str(self.index))
+
+    def visit_TmAbs(self, out):
+        out.append("(lambda.")
+        TermsNoNamePrinter.visit(self.term, out)
+        out.append(")")
+
+    def visit_TmApp(self, out):
+        out.append("(")
+        TermsNoNamePrinter.visit(self.left, out)
+        out.append(" ")
+        TermsNoNamePrinter.visit(self.right, out)
+        out.append(")")
+
+def printtm_noname(term, out=None):
+    if out is None:
+        out = []
+        TermsNoNamePrinter.visit(term, out)
+        sys.stdout.write("".join(out))
+    else:
+        TermsNoNamePrinter.visit(term, out)
@@ -1,7 +1,17 @@
+import argparse
+import functools
+import io
+import os
+import tempfile
 import unittest
+from unittest import mock
 from parser import Parser
 import syntax
 import core
+import machine
+import main
+from common import batch, stream
+from common.context import Context
 
 class ParserTestCase(unittest.TestCase):
 
@@ -169,6 +179,235 @@ class EvaluateTestCase(unittest.TestCase):
 
         self.assertIsInstance(term.term.right, syntax.TmVar)
 
+    def test_step_budget(self):
+        # omega never reaches a normal form; the driver must stop on
+        # the budget without growing the Python stack
+        ast = self.parser.parse("(lambda x. x x) (lambda x. x x);")
+        result = core.evaluate_steps([], ast[0].term, max_steps=5000)
+        self.assertEqual(result.steps, 5000)
+        self.assertFalse(result.done)
+        self.assertIsInstance(result.term, syntax.TmApp)
+
+    def test_step_count(self):
+        c2 = "(lambda f. lambda x. f (f x))"
+        c3 = "(lambda f. lambda x. f (f (f x)))"
+        ast = self.parser.parse(
+            "(%s %s %s) (lambda x. x) (lambda y. y);" % (c3, c2, c2))
+        result = core.evaluate_steps([], ast[0].term)
+        self.assertTrue(result.done)
+        self.assertEqual(result.steps, 531)
+        self.assertIsInstance(result.term, syntax.TmAbs)
+        self.assertEqual(result.term.name, "y")
+
+
+class MachineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def assertSameAsSubst(self, source):
+        ast = self.parser.parse(source)
+        ctx = []
+        for cmd in ast[:-1]:
+            syntax.addbinding(ctx, cmd.name, cmd.binding)
+        expected = core.evaluate_steps(ctx, ast[-1].term)
+        result = machine.evaluate_steps(ctx, ast[-1].term)
+        self.assertEqual(result.term, expected.term)
+        self.assertEqual(result.steps, expected.steps)
+
+    def test_substitution(self):
+        self.assertSameAsSubst("a/; b/; (lambda x. a x b)(lambda y.y);")
+        self.assertSameAsSubst(
+            "a/; (lambda x. a (lambda y. a x))(lambda z. a z);")
+
+    def test_stuck(self):
+        self.assertSameAsSubst("a/; (lambda x. lambda y. x) a;")
+        self.assertSameAsSubst(
+            "a/; (lambda x. x) (a ((lambda q. q) (lambda r. r)));")
+
+    def test_church(self):
+        c2 = "(lambda f. lambda x. f (f x))"
+        c3 = "(lambda f. lambda x. f (f (f x)))"
+        self.assertSameAsSubst(
+            "(%s %s %s) (lambda x. x) (lambda y. y);" % (c3, c2, c2))
+        self.assertSameAsSubst("a/; (%s %s) a;" % (c3, c2))
+
+    def test_step_budget(self):
+        ast = self.parser.parse("(lambda x. x x) (lambda x. x x);")
+        result = machine.evaluate_steps([], ast[0].term, max_steps=1000)
+        self.assertEqual(result.steps, 1000)
+        self.assertFalse(result.done)
+        self.assertEqual(result.term, ast[0].term)
+
+
+class SubstitutionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def assertSameAsUnfused(self, s, t):
+        expected = syntax.termShift(
+            -1, syntax.termSubst(0, syntax.termShift(1, s), t))
+        self.assertEqual(syntax.termSubstTop(s, t), expected)
+
+    def test_subst_top(self):
+        ast = self.parser.parse(
+            "a/; b/;"
+            "lambda x. x (lambda y. y x a) (lambda z. lambda w. b x z);"
+            "lambda v. a v b;")
+        t = ast[2].term.term
+        s = ast[3].term
+        self.assertSameAsUnfused(s, t)
+        self.assertSameAsUnfused(ast[2].term, t)
+        self.assertSameAsUnfused(s, ast[3].term.term)
+
+
+class TablesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = tempfile.TemporaryDirectory()
+        self.environ = mock.patch.dict(
+            os.environ, {"TAPL_PLY_CACHE": self.cache.name})
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        self.cache.cleanup()
+
+    def test_optimize(self):
+        source = "a/; (lambda x. x a) (lambda y. y);"
+        expected = Parser().parse(source)
+
+        # the first parser writes the tables, the second one loads them
+        self.assertEqual(Parser(optimize=True).parse(source), expected)
+        files = sorted(os.listdir(self.cache.name))
+        self.assertTrue(any(f.startswith("lextab_") for f in files))
+        self.assertTrue(any(f.startswith("parsetab_") for f in files))
+        self.assertEqual(Parser(optimize=True).parse(source), expected)
+        self.assertEqual(sorted(os.listdir(self.cache.name)), files)
+
+
+class StreamTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def test_split_commands(self):
+        lines = [
+            "a/; /* b/;\n",
+            "*/ lambda x. // y;\n",
+            "  x a;\n",
+            "// trailing;\n",
+        ]
+        self.assertEqual(list(stream.split_commands(lines)), [
+            "a/;",
+            " /* b/;\n*/ lambda x. // y;\n  x a;",
+        ])
+
+    def test_parse_stream(self):
+        source = "a/;\n(lambda x. x)\n  a;\nlambda y. a y;\n"
+        expected = Parser().parse(source)
+        lines = io.StringIO(source)
+        self.assertEqual(
+            list(stream.parse_stream(self.parser, lines)), expected)
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        sources = {
+            "a.f": "a/; lambda x. x;\n(lambda x. x) (lambda y. y);\n",
+            "b.f": "(lambda x. x) b;\n",
+            "c.f": "c/;\nc;\n",
+        }
+        for (name, source) in sources.items():
+            with open(os.path.join(self.dir.name, name), "w") as f:
+                f.write(source)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_run(self):
+        args = argparse.Namespace(engine="subst")
+        out = io.StringIO()
+        with mock.patch("sys.stderr", io.StringIO()):
+            failed = batch.run(
+                functools.partial(main.check_file, args),
+                [os.path.join(self.dir.name, "*.f")], Parser, jobs=2,
+                out=out)
+        self.assertEqual(failed, 1)
+        # one header per file, in order, each followed by its output
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            [line.split(":")[0] for line in lines if line.startswith("==>")],
+            ["==> " + os.path.join(self.dir.name, name)
+             for name in ("a.f", "b.f", "c.f")])
+        self.assertEqual(lines[1:4], ["a", "(lambda x.x)", "(lambda y.y)"])
+        self.assertTrue(lines[5].startswith("error: "))
+        self.assertEqual(lines[7:], ["c", "c"])
+
+
+class ContextTestCase(unittest.TestCase):
+
+    def test_shadowing(self):
+        ctx = Context()
+        syntax.addname(ctx, "x")
+        syntax.addname(ctx, "y")
+        syntax.addname(ctx, "x")
+        self.assertEqual(syntax.name2index(ctx, "x"), 0)
+        self.assertEqual(syntax.name2index(ctx, "y"), 1)
+        self.assertEqual(syntax.index2name(ctx, 2), "x")
+        ctx.pop()
+        self.assertEqual(syntax.name2index(ctx, "x"), 1)
+        ctx.pop()
+        ctx.pop()
+        self.assertFalse(syntax.isnamebound(ctx, "x"))
+        self.assertRaises(ValueError, syntax.name2index, ctx, "x")
+
+    def test_pickfreshname(self):
+        ctx = Context([("x", syntax.NameBind()), ("x'", syntax.NameBind())])
+        with syntax.mgr_pickfreshname(ctx, "x") as name:
+            self.assertEqual(name, "x''")
+            self.assertEqual(syntax.name2index(ctx, "x''"), 0)
+        self.assertEqual(len(ctx), 2)
+        self.assertFalse(syntax.isnamebound(ctx, "x''"))
+
+    def test_memo(self):
+        ctx = Context()
+        syntax.addname(ctx, "x")
+        memo = ctx.memo(0)
+        memo[1] = "value"
+        syntax.addname(ctx, "y")
+        self.assertIs(ctx.memo(1), memo)
+        ctx.pop()
+        ctx.pop()
+        syntax.addname(ctx, "x")
+        self.assertEqual(ctx.memo(0), {})
+
+    def test_parser_context(self):
+        ast = Parser().parse("a/; lambda a. lambda b. a;")
+        term = ast[1].term.term.term
+        self.assertEqual((term.index, term.ctxlength), (1, 3))
+
+class PrinterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Parser()
+
+    def test_format_term(self):
+        ast = self.parser.parse("a/; lambda x. lambda x. x (x a);")
+        ctx = self.parser._ctx
+        self.assertEqual(
+            syntax.format_term(ctx, ast[1].term),
+            "(lambda x.(lambda x'.(x' (x' a))))")
+
+    def test_single_write(self):
+        ast = self.parser.parse("lambda x. lambda y. x (y x);")
+        stdout = io.StringIO()
+        with mock.patch("sys.stdout", stdout), \
+                mock.patch.object(stdout, "write", wraps=stdout.write) as write:
+            main.process_command(ast[0], [])
+        write.assert_called_once_with("(lambda x.(lambda y.(x (y x))))\n")
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file